@@ -155,6 +155,108 @@ MEDIA_ROOT = BASE_DIR / "media"
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 
+# Embeddings
+# "torch" runs sentence-transformers on PyTorch; "onnx" runs the same model as an
+# exported ONNX graph (needs `pip install optimum[onnxruntime]`), which is faster on CPU.
+# Compare the two with `python manage.py compare_embedding_backends`.
+EMBEDDING_BACKEND = "torch"
+EMBEDDING_ONNX_QUANTIZE = True  # Dynamic int8 quantization of the ONNX graph
+EMBEDDING_ONNX_DIR = BASE_DIR / "onnx_models"  # Exported graphs are cached here
+# Every embedded text is cached in memory (LRU) and on disk, keyed by a hash of the text,
+# except PDF chunks, whose vectors the chunk store keeps.
+EMBEDDING_CACHE_SIZE = 10000  # Vectors kept in memory per process
+EMBEDDING_CACHE_DIR = BASE_DIR / "embedding_cache"  # Set to None to disable the disk cache
+EMBEDDING_DISK_CACHE_SIZE = 200000  # Vectors kept on disk (~0.3 GB); least recently used go first
+# Concurrent cache misses are embedded together in micro-batches on one worker thread.
+EMBEDDING_MICRO_BATCHING = True
+EMBEDDING_BATCH_SIZE = 64  # Max texts per forward pass
+EMBEDDING_BATCH_WAIT_MS = 5  # Max time a request waits for others to join its batch
+
+# Recommendations
+# "exact" scores every candidate, "ivf" always uses the clustered ANN search,
+# "auto" switches to ANN once an index holds RECOMMENDATION_ANN_THRESHOLD vectors.
+RECOMMENDATION_INDEX_MODE = "auto"
+RECOMMENDATION_ANN_THRESHOLD = 50000
+RECOMMENDATION_ANN_NPROBE = 8  # Clusters scored per ANN query
+# Team/profile matrices are published as memory-mapped files that every worker
+# maps read-only, so they are resident once per host. Set to None to keep a
+# private in-memory index per process instead.
+RECOMMENDATION_SHARED_MATRIX_DIR = BASE_DIR / "recommendation_index"
+RECOMMENDATION_SHARED_MATRIX_DTYPE = "float32"  # "float16" halves the footprint
+# Two-stage ranking: a BM25 keyword index over skills/roles/looking_for shortlists
+# candidates, and only the shortlist is scored by embedding similarity.
+RECOMMENDATION_HYBRID = True
+RECOMMENDATION_SHORTLIST_SIZE = 300  # Candidates passed to the embedding stage
+RECOMMENDATION_DENSE_WEIGHT = 0.7  # Weight of the cosine similarity in the final score
+RECOMMENDATION_LEXICAL_WEIGHT = 0.3  # Weight of the (max-normalized) BM25 score
+# Indexes re-read rows stamped up to RECOMMENDATION_SYNC_OVERLAP seconds before
+# their last sync, since `updated` is set on save, not on commit. Every
+# RECOMMENDATION_SYNC_RECONCILE seconds all row versions are compared as well.
+RECOMMENDATION_SYNC_OVERLAP = 60
+RECOMMENDATION_SYNC_RECONCILE = 600
+# recommend-teams/ ranks RECOMMENDATION_OVERFETCH times as many teams as it needs,
+# then drops the ones the user can't join, widening the search if too few remain.
+RECOMMENDATION_OVERFETCH = 4
+# Ranked team IDs cached per user; recommend-teams/ pages through them with ?cursor=
+RECOMMENDATION_MAX_RESULTS = 100
+# Recommendation results are cached per user/team until the next team, profile,
+# skill or membership change. The cache must be shared by all workers for that
+# invalidation to reach every process, hence the file-based backend.
+RECOMMENDATION_CACHE_ALIAS = "recommendations"
+RECOMMENDATION_CACHE_TIMEOUT = 3600  # Seconds; upper bound on staleness
+
+# PDF chat
+# Where session chunks are indexed: "pinecone" (PINECONE_INDEX_NAME, one namespace
+# per ChatSession) or "local", an in-process store keeping each namespace as a
+# memory-mapped float32 matrix plus a chunk file under RAG_LOCAL_VECTOR_DIR.
+RAG_VECTOR_STORE = "pinecone"
+RAG_LOCAL_VECTOR_DIR = BASE_DIR / "vector_store"
+RAG_LOCAL_INDEX_MODE = "auto"  # Same modes as RECOMMENDATION_INDEX_MODE
+RAG_LOCAL_ANN_THRESHOLD = 50000  # Chunks per namespace before "auto" switches to ANN
+# Uploaded PDFs are ingested in the background by a thread pool in each server process.
+INGESTION_WORKERS = 2  # Concurrent ingestion jobs per process
+INGESTION_STALE_AFTER = 300  # Seconds without progress before a job is considered dead and retried
+# PDFs are parsed and chunked in page ranges on a process pool shared by all ingestion jobs.
+PDF_PARSE_WORKERS = None  # Processes; None uses every core, 1 parses in the ingestion thread
+PDF_PAGES_PER_TASK = 16  # Pages parsed per task
+# Chunks are embedded in batches; each batch is upserted on a worker thread
+# while the next is embedded.
+INGEST_BATCH_SIZE = 256  # Chunks per embedding / upsert batch
+INGEST_UPSERT_CONCURRENCY = 2  # Batches uploading at once
+INGEST_UPSERT_RETRIES = 3  # Further attempts for a failed batch
+INGEST_UPSERT_RETRY_DELAY = 0.5  # Seconds before the first retry, doubled after each
+# Retrieval: "mmr" over-fetches RAG_FETCH_K chunks and keeps RAG_RETRIEVAL_K diverse
+# ones ("similarity" keeps the top RAG_RETRIEVAL_K); the best of those are packed
+# into the prompt up to RAG_CONTEXT_TOKEN_BUDGET (estimated) tokens.
+RAG_SEARCH_TYPE = "mmr"
+RAG_RETRIEVAL_K = 15
+RAG_FETCH_K = 40
+RAG_MMR_LAMBDA = 0.7  # 1 ranks by relevance only, 0 by diversity only
+RAG_CONTEXT_TOKEN_BUDGET = 1200
+# Retriever + chain objects are kept per session in an LRU for follow-up questions.
+RAG_CHAIN_CACHE_SIZE = 256  # Sessions per process
+RAG_CHAIN_CACHE_IDLE_SECONDS = 1800  # Dropped after this long without a question
+# Answers are cached per session and reused for a question whose embedding is at
+# least this cosine-similar to an earlier one; adding or removing a PDF clears them.
+RAG_ANSWER_CACHE = True
+RAG_ANSWER_CACHE_THRESHOLD = 0.95
+RAG_ANSWER_CACHE_SIZE = 200  # Newest answers kept per session
+
+
+# Caches
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "recommendations": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": BASE_DIR / "cache" / "recommendations",
+    },
+}
+
+
 # CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_CREDENTIALS = True
 CORS_ALLOWED_ORIGINS = ["http://localhost:5173", "http://192.168.1.205:5173"]
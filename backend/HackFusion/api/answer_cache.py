@@ -0,0 +1,53 @@
+# api/answer_cache.py
+
+import numpy as np
+from django.conf import settings
+
+from . import metrics
+from .models import CachedAnswer
+from .vector_utils import normalize, vector_from_bytes, vector_to_bytes
+
+
+def enabled():
+    return getattr(settings, "RAG_ANSWER_CACHE", True)
+
+
+def lookup(session_id, question_vector):
+    """
+    Returns the cached answer of the session's most similar earlier question
+    if its cosine similarity reaches RAG_ANSWER_CACHE_THRESHOLD, else None.
+    """
+    entries = list(
+        CachedAnswer.objects.filter(session_id=session_id)
+        .order_by("-created")
+        .only("id", "vector", "answer", "sources")[: getattr(settings, "RAG_ANSWER_CACHE_SIZE", 200)]
+    )
+    if entries:
+        matrix = np.vstack([vector_from_bytes(entry.vector) for entry in entries])
+        scores = matrix @ normalize(question_vector)
+        best = int(np.argmax(scores))
+        if scores[best] >= getattr(settings, "RAG_ANSWER_CACHE_THRESHOLD", 0.95):
+            metrics.incr("rag_answer_cache_hits")
+            return entries[best]
+    metrics.incr("rag_answer_cache_misses")
+    return None
+
+
+def store(session_id, question, question_vector, answer, sources):
+    """Caches an answer, keeping the newest RAG_ANSWER_CACHE_SIZE entries of the session."""
+    CachedAnswer.objects.create(
+        session_id=session_id,
+        question=question,
+        vector=vector_to_bytes(normalize(question_vector)),
+        answer=answer,
+        sources=sources,
+    )
+    stale = CachedAnswer.objects.filter(session_id=session_id).order_by("-created").values_list("id", flat=True)[
+        getattr(settings, "RAG_ANSWER_CACHE_SIZE", 200):
+    ]
+    CachedAnswer.objects.filter(id__in=list(stale)).delete()
+
+
+def invalidate(session_id):
+    """Answers may change once the session's PDF set does."""
+    CachedAnswer.objects.filter(session_id=session_id).delete()
@@ -0,0 +1,72 @@
+# api/chain_cache.py
+
+import threading
+import time
+from collections import OrderedDict
+
+from . import metrics
+
+
+class ChainCache:
+    """
+    Bounded LRU of ready-to-use objects (retrievers, chains) keyed by chat
+    session, so follow-up questions skip building them again.
+
+    Entries not used for `idle_seconds` are dropped on the next access, and
+    the least recently used entry goes once `max_entries` is exceeded. Hits,
+    misses and evictions are counted under `<name>_*` in `api.metrics`.
+    """
+
+    def __init__(self, name, max_entries=256, idle_seconds=1800):
+        self.name = name
+        self.max_entries = max_entries
+        self.idle_seconds = idle_seconds
+        self._entries = OrderedDict()  # key -> (value, last used), least recently used first
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _evict_idle(self, now):
+        evicted = 0
+        while self._entries:
+            key, (_, last_used) = next(iter(self._entries.items()))
+            if now - last_used <= self.idle_seconds:
+                break
+            del self._entries[key]
+            evicted += 1
+        return evicted
+
+    def get_or_create(self, key, factory):
+        """Returns the cached value for `key`, building it with `factory()` on a miss."""
+        now = time.monotonic()
+        with self._lock:
+            evicted = self._evict_idle(now)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries[key] = (entry[0], now)
+                self._entries.move_to_end(key)
+        if evicted:
+            metrics.incr(f"{self.name}_evictions", evicted)
+        if entry is not None:
+            metrics.incr(f"{self.name}_hits")
+            return entry[0]
+
+        metrics.incr(f"{self.name}_misses")
+        # Built outside the lock; two concurrent misses for one key both
+        # build, and the later one is kept.
+        value = factory()
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            evicted = 0
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+        if evicted:
+            metrics.incr(f"{self.name}_evictions", evicted)
+        return value
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
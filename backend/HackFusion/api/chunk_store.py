@@ -0,0 +1,91 @@
+# api/chunk_store.py
+
+import hashlib
+
+import numpy as np
+from django.db import IntegrityError, transaction
+
+from .models import PDFChunkEmbeddings
+
+
+def file_sha256(file):
+    """SHA-256 of an uploaded or stored file, read in chunks; leaves the file rewound."""
+    digest = hashlib.sha256()
+    for block in file.chunks():
+        digest.update(block)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def _parts(sha256, chunk_size, chunk_overlap, embedding_model):
+    return PDFChunkEmbeddings.objects.filter(
+        sha256=sha256, chunk_size=chunk_size, chunk_overlap=chunk_overlap, embedding_model=embedding_model
+    )
+
+
+def has_chunk_set(sha256, chunk_size, chunk_overlap, embedding_model):
+    """Whether the file's chunks and embeddings are completely stored with these parameters."""
+    return _parts(sha256, chunk_size, chunk_overlap, embedding_model).filter(last=True).exists()
+
+
+def iter_chunk_set(sha256, chunk_size, chunk_overlap, embedding_model):
+    """Yields a stored file's (chunks, vectors) one part at a time, in file order."""
+    parts = _parts(sha256, chunk_size, chunk_overlap, embedding_model).order_by("part")
+    for part in parts.iterator(chunk_size=1):
+        vectors = np.frombuffer(bytes(part.vectors), dtype=np.float32).reshape(-1, part.dimensions or 1)
+        yield part.chunks, vectors[: len(part.chunks)]
+
+
+PART_SIZE = 256  # Chunks per stored part; fixed, so parts written by jobs with different batch sizes line up
+
+
+class ChunkSetWriter:
+    """
+    Stores a file's chunks ([{"text", "metadata"}]) and their vectors part by
+    part as they are embedded, so the whole file is never held at once.
+    Batches of any size are regrouped into PART_SIZE parts; the final part
+    is flagged `last`. A concurrent job storing the same file writes
+    identical parts; whichever comes first is kept.
+    """
+
+    def __init__(self, sha256, chunk_size, chunk_overlap, embedding_model):
+        self.key = {
+            "sha256": sha256,
+            "chunk_size": chunk_size,
+            "chunk_overlap": chunk_overlap,
+            "embedding_model": embedding_model,
+        }
+        self._part = 0
+        self._chunks = []
+        self._vectors = []
+
+    def add(self, chunks, vectors):
+        self._chunks.extend(chunks)
+        self._vectors.extend(np.asarray(vectors, dtype=np.float32))
+        # Keep at least one chunk back: the part holding the file's last
+        # chunk is only known to be last on `close`.
+        while len(self._chunks) > PART_SIZE:
+            self._save(self._chunks[:PART_SIZE], self._vectors[:PART_SIZE], last=False)
+            del self._chunks[:PART_SIZE], self._vectors[:PART_SIZE]
+
+    def close(self):
+        """Writes the final part (an empty one for a file without text)."""
+        vectors = np.vstack(self._vectors) if self._vectors else np.zeros((0, 0), dtype=np.float32)
+        self._save(self._chunks, vectors, last=True)
+        self._chunks, self._vectors = [], []
+
+    def _save(self, chunks, vectors, last):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        try:
+            with transaction.atomic():
+                PDFChunkEmbeddings.objects.create(
+                    **self.key,
+                    part=self._part,
+                    last=last,
+                    chunks=chunks,
+                    vectors=vectors.tobytes(),
+                    dimensions=vectors.shape[1] if vectors.ndim == 2 else 0,
+                )
+        except IntegrityError:
+            pass
+        self._part += 1
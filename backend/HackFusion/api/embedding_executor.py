@@ -0,0 +1,90 @@
+# api/embedding_executor.py
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class BatchingEmbedder:
+    """
+    Collects concurrent `embed_documents` calls into micro-batches.
+
+    Callers enqueue their texts and block on a future. A single dedicated
+    worker thread takes the first waiting request, keeps collecting requests
+    until `max_batch_size` texts are queued or `max_wait_ms` has passed, runs
+    one forward pass for all of them and hands each caller its slice back.
+    Many tiny concurrent calls therefore become a few larger batches instead
+    of competing for the same CPU cores.
+    """
+
+    def __init__(self, model, max_batch_size=64, max_wait_ms=5):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._worker = None
+        self._worker_pid = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, texts):
+        """Queues `texts` for embedding; the returned future resolves to their vectors."""
+        future = Future()
+        if not texts:
+            future.set_result([])
+            return future
+        self._ensure_worker()
+        self._queue.put((list(texts), future))
+        return future
+
+    def embed_documents(self, texts):
+        return self.submit(texts).result()
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    def _ensure_worker(self):
+        # Threads don't survive fork(), so a worker started before a server
+        # forked its workers must be restarted in each child.
+        if self._worker is not None and self._worker_pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._worker is None or self._worker_pid != os.getpid():
+                self._queue = queue.Queue()
+                self._worker = threading.Thread(
+                    target=self._run, name="embedding-batcher", daemon=True
+                )
+                self._worker_pid = os.getpid()
+                self._worker.start()
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        size = len(batch[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            texts = [text for request_texts, _ in batch for text in request_texts]
+            try:
+                vectors = self.model.embed_documents(texts)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            start = 0
+            for request_texts, future in batch:
+                future.set_result(vectors[start:start + len(request_texts)])
+                start += len(request_texts)
@@ -0,0 +1,228 @@
+# api/embeddings.py
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from langchain_core.embeddings import Embeddings
+
+from .embedding_executor import BatchingEmbedder
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+def normalize_text(text):
+    """Collapses whitespace so trivially different copies share a cache entry."""
+    return " ".join(text.split())
+
+
+class DiskEmbeddingCache:
+    """
+    SQLite-backed key -> float32 vector store shared by every worker on the
+    host. Holds at most `max_entries` vectors (no limit if None); past that,
+    the least recently used ones are pruned on write.
+    """
+
+    def __init__(self, path, max_entries=None):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.max_entries = max_entries
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings"
+            " (key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL DEFAULT 0)"
+        )
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(embeddings)")]
+        if "last_used" not in columns:  # Cache files written before the size limit
+            self._conn.execute("ALTER TABLE embeddings ADD COLUMN last_used REAL NOT NULL DEFAULT 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                )
+                hits = []
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+                    hits.append(key)
+                if hits and self.max_entries is not None:
+                    self._conn.execute(
+                        f"UPDATE embeddings SET last_used = ? WHERE key IN ({','.join('?' * len(hits))})",
+                        [time.time(), *hits],
+                    )
+            self._conn.commit()
+        return found
+
+    def set_many(self, items):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in items],
+            )
+            if self.max_entries is not None:
+                (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+                if count > self.max_entries:
+                    self._conn.execute(
+                        "DELETE FROM embeddings WHERE key IN"
+                        " (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                        (count - self.max_entries,),
+                    )
+            self._conn.commit()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    LangChain `Embeddings` wrapper that never embeds the same text twice.
+
+    Texts are keyed by a SHA-256 of the model name and the whitespace-normalized
+    text. Lookups go to an in-memory LRU first, then to the on-disk cache, and
+    only the remaining misses are sent to the underlying model in one batch.
+    """
+
+    def __init__(self, model, model_name, max_entries=10000, disk_cache=None):
+        self.model = model
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.disk_cache = disk_cache
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, text):
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key, vector):
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def embed_documents(self, texts):
+        texts = [normalize_text(text) for text in texts]
+        keys = [self._key(text) for text in texts]
+        vectors = {}
+
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    vectors[key] = self._memory[key]
+
+        missing = list(dict.fromkeys(key for key in keys if key not in vectors))
+        if missing and self.disk_cache is not None:
+            for key, vector in self.disk_cache.get_many(missing).items():
+                vectors[key] = vector
+                self._remember(key, vector)
+
+        to_embed = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                to_embed.setdefault(key, text)
+        if to_embed:
+            fresh = self.model.embed_documents(list(to_embed.values()))
+            new_items = []
+            for key, vector in zip(to_embed, fresh):
+                vector = np.asarray(vector, dtype=np.float32)
+                vectors[key] = vector
+                self._remember(key, vector)
+                new_items.append((key, vector))
+            if self.disk_cache is not None:
+                self.disk_cache.set_many(new_items)
+
+        return [vectors[key].tolist() for key in keys]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    def embed_documents_uncached(self, texts):
+        """
+        Embeds `texts` with the underlying model, neither reading nor filling
+        the caches. For text whose vectors are stored elsewhere, such as PDF
+        chunks in the chunk store, which would only crowd out other entries.
+        """
+        return [
+            np.asarray(vector, dtype=np.float32).tolist()
+            for vector in self.model.embed_documents([normalize_text(text) for text in texts])
+        ]
+
+def build_base_model(backend, quantize=None):
+    """
+    Returns (model, cache_name) for an embedding backend: "torch" runs the
+    sentence-transformers model as is, "onnx" runs its exported ONNX graph,
+    int8-quantized if `quantize` (by default, unless EMBEDDING_ONNX_QUANTIZE
+    is off). `cache_name` keys the cache, so vectors from different backends
+    are never mixed.
+    """
+    if backend == "torch":
+        # Imported here: pulling in sentence-transformers/torch costs seconds.
+        from langchain_huggingface import HuggingFaceEmbeddings
+
+        return HuggingFaceEmbeddings(model_name=MODEL_NAME), MODEL_NAME
+    if backend == "onnx":
+        from .onnx_embeddings import OnnxEmbeddings
+
+        if quantize is None:
+            quantize = getattr(settings, "EMBEDDING_ONNX_QUANTIZE", True)
+        model = OnnxEmbeddings(
+            MODEL_NAME,
+            model_dir=getattr(settings, "EMBEDDING_ONNX_DIR", settings.BASE_DIR / "onnx_models"),
+            quantize=quantize,
+        )
+        return model, f"{MODEL_NAME}:onnx{'-int8' if quantize else ''}"
+    raise ImproperlyConfigured(f"Unknown EMBEDDING_BACKEND '{backend}'.")
+
+
+def _build_embedding_model():
+    model, cache_name = build_base_model(getattr(settings, "EMBEDDING_BACKEND", "torch"))
+    cache_dir = getattr(settings, "EMBEDDING_CACHE_DIR", None)
+    disk_cache = (
+        DiskEmbeddingCache(
+            os.path.join(cache_dir, "embeddings.sqlite3"),
+            max_entries=getattr(settings, "EMBEDDING_DISK_CACHE_SIZE", 200000),
+        )
+        if cache_dir
+        else None
+    )
+    if getattr(settings, "EMBEDDING_MICRO_BATCHING", True):
+        model = BatchingEmbedder(
+            model,
+            max_batch_size=getattr(settings, "EMBEDDING_BATCH_SIZE", 64),
+            max_wait_ms=getattr(settings, "EMBEDDING_BATCH_WAIT_MS", 5),
+        )
+    return CachedEmbeddings(
+        model,
+        model_name=cache_name,
+        max_entries=getattr(settings, "EMBEDDING_CACHE_SIZE", 10000),
+        disk_cache=disk_cache,
+    )
+
+
+_embedding_model = None
+_embedding_model_lock = threading.Lock()
+
+
+def get_embedding_model():
+    """
+    Returns the one embedding model shared by the recommendation views and
+    the RAG pipeline, loading it on first use.
+    """
+    global _embedding_model
+    if _embedding_model is None:
+        with _embedding_model_lock:
+            if _embedding_model is None:
+                _embedding_model = _build_embedding_model()
+    return _embedding_model
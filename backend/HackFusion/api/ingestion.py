@@ -0,0 +1,142 @@
+# api/ingestion.py
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, reset_queries, transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .models import ChatSession, UploadedPDF
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    # Like the embedding batcher, the pool's threads don't survive fork(), so
+    # each server worker process starts its own pool on first use.
+    global _executor, _executor_pid
+    if _executor is not None and _executor_pid == os.getpid():
+        return _executor
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "INGESTION_WORKERS", 2),
+                thread_name_prefix="ingestion",
+            )
+            _executor_pid = os.getpid()
+    return _executor
+
+
+def enqueue_ingestion(session_id):
+    """
+    Schedules ingestion of the session's PDFs on the local worker pool once
+    the current transaction commits, so the job sees the uploaded rows.
+    """
+    session_id = str(session_id)
+    transaction.on_commit(lambda: _get_executor().submit(run_ingestion, session_id))
+
+
+def _stale_before():
+    return timezone.now() - timedelta(seconds=getattr(settings, "INGESTION_STALE_AFTER", 300))
+
+
+def _claim(session_id):
+    """
+    Atomically marks the session as INDEXING. Fails if another job (in any
+    process) owns it, unless that job stopped reporting progress for
+    INGESTION_STALE_AFTER seconds, e.g. because its worker was restarted.
+    """
+    claimable = Q(ingestion_status="PENDING") | Q(
+        ingestion_status="INDEXING", ingestion_heartbeat__lt=_stale_before()
+    )
+    return bool(
+        ChatSession.objects.filter(claimable, id=session_id).update(
+            ingestion_status="INDEXING",
+            ingestion_progress=0,
+            ingestion_error="",
+            ingestion_heartbeat=timezone.now(),
+        )
+    )
+
+
+def schedule_ingestion(session):
+    """
+    Queues ingestion of the session's PDFs that aren't indexed yet. A job
+    already running for the session picks them up before it finishes.
+    """
+    if not session.pdfs.filter(ingested_at__isnull=True).exists():
+        # Nothing left to index, e.g. the file that failed was removed.
+        ChatSession.objects.filter(
+            id=session.id, ingestion_status="FAILED", ingestion_completed_at__isnull=False
+        ).update(ingestion_status="READY", ingestion_progress=100, ingestion_error="")
+        return
+    ChatSession.objects.filter(id=session.id).exclude(ingestion_status="INDEXING").update(
+        ingestion_status="PENDING", ingestion_progress=0, ingestion_error="", ingestion_heartbeat=timezone.now()
+    )
+    enqueue_ingestion(session.id)
+
+
+def resume_stalled_ingestion(session):
+    """
+    Queues ingestion again for a session nobody is working on, and returns
+    whether it did. That is a session still PENDING or INDEXING whose job
+    was never queued (sessions from before background ingestion have no
+    heartbeat) or has given no sign of life for INGESTION_STALE_AFTER
+    seconds, e.g. because its worker process was restarted. Called from
+    the endpoints clients poll, so such sessions don't wait forever.
+    """
+    stalled = Q(ingestion_heartbeat__isnull=True) | Q(ingestion_heartbeat__lt=_stale_before())
+    # Restamping the heartbeat lets only one of several concurrent polls requeue it.
+    if ChatSession.objects.filter(stalled, id=session.id, ingestion_status__in=("PENDING", "INDEXING")).update(
+        ingestion_status="PENDING", ingestion_heartbeat=timezone.now()
+    ):
+        enqueue_ingestion(session.id)
+        session.refresh_from_db()
+        return True
+    return False
+
+
+def report_progress(session_id, percent):
+    # Pool threads get no request_started signal, which is what clears the
+    # DEBUG query log; ingestion queries carry whole vector batches.
+    reset_queries()
+    ChatSession.objects.filter(id=session_id).update(
+        ingestion_progress=max(0, min(100, int(percent))), ingestion_heartbeat=timezone.now()
+    )
+
+
+def run_ingestion(session_id):
+    """Parses, chunks, embeds and indexes the session's PDFs, recording the outcome on the session."""
+    from .rag_pipeline import process_pdfs_for_session
+
+    close_old_connections()
+    try:
+        if not _claim(session_id):
+            return
+        while True:
+            try:
+                process_pdfs_for_session(session_id, progress=lambda percent: report_progress(session_id, percent))
+            except Exception as e:
+                print(f"Ingestion failed for session {session_id}: {e}")
+                ChatSession.objects.filter(id=session_id).update(
+                    ingestion_status="FAILED", ingestion_error=str(e), ingestion_heartbeat=timezone.now()
+                )
+                return
+            # Only READY if no PDF was added while this pass ran; otherwise
+            # index those too. (Uploads commit their rows before enqueueing.)
+            unindexed = UploadedPDF.objects.filter(session_id=OuterRef("pk"), ingested_at__isnull=True)
+            if ChatSession.objects.filter(~Exists(unindexed), id=session_id, ingestion_status="INDEXING").update(
+                ingestion_status="READY", ingestion_progress=100, ingestion_heartbeat=timezone.now()
+            ):
+                return
+            if not ChatSession.objects.filter(id=session_id, ingestion_status="INDEXING").exists():
+                return  # Taken over by another job
+    finally:
+        # Pool threads outlive the job; don't leave its connection open.
+        connection.close()
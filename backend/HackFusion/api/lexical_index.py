@@ -0,0 +1,91 @@
+# api/lexical_index.py
+
+import heapq
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+
+_TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9+#.]*")
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is",
+    "it", "of", "on", "or", "our", "the", "to", "we", "with", "who", "looking", "need",
+}
+
+
+def tokenize(text):
+    """Lower-cased skill/role tokens; keeps `c++`, `c#`, `node.js` intact."""
+    tokens = (token.rstrip(".") for token in _TOKEN_RE.findall((text or "").lower()))
+    return [token for token in tokens if token and token not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Inverted index from tokens to document IDs, scored with Okapi BM25.
+
+    Documents are added, replaced and removed incrementally; each carries a
+    caller supplied version so a sync can skip unchanged documents.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._postings = defaultdict(dict)  # token -> {doc id: term frequency}
+        self._doc_terms = {}  # doc id -> Counter of its tokens
+        self._doc_lengths = {}
+        self._versions = {}
+        self._total_length = 0
+
+    def __len__(self):
+        return len(self._doc_terms)
+
+    def ids(self):
+        with self._lock:
+            return list(self._doc_terms)
+
+    def version(self, doc_id):
+        return self._versions.get(doc_id)
+
+    def add(self, doc_id, tokens, version=None):
+        with self._lock:
+            self.remove([doc_id])
+            terms = Counter(tokens)
+            self._doc_terms[doc_id] = terms
+            self._doc_lengths[doc_id] = sum(terms.values())
+            self._versions[doc_id] = version
+            self._total_length += self._doc_lengths[doc_id]
+            for token, tf in terms.items():
+                self._postings[token][doc_id] = tf
+
+    def remove(self, doc_ids):
+        with self._lock:
+            for doc_id in doc_ids:
+                terms = self._doc_terms.pop(doc_id, None)
+                if terms is None:
+                    continue
+                self._versions.pop(doc_id, None)
+                self._total_length -= self._doc_lengths.pop(doc_id)
+                for token in terms:
+                    postings = self._postings[token]
+                    postings.pop(doc_id, None)
+                    if not postings:
+                        del self._postings[token]
+
+    def search(self, tokens, limit=300):
+        """Returns up to `limit` (doc id, BM25 score) pairs sharing a token with the query, best first."""
+        with self._lock:
+            n_docs = len(self._doc_terms)
+            if not n_docs:
+                return []
+            avg_length = self._total_length / n_docs or 1.0
+            scores = defaultdict(float)
+            for token in set(tokens):
+                postings = self._postings.get(token)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[doc_id] / avg_length)
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
@@ -0,0 +1,65 @@
+import time
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.test import APIClient
+
+from api.models import ChatSession
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares time-to-first-byte and total time of the blocking ask endpoint "
+        "and its server-sent-events variant on an ingested chat session."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("session_id")
+        parser.add_argument("--question", default="What is this document about?")
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--username", help="User to ask as (default: the first superuser).")
+
+    def _timed(self, client, url, question, stream):
+        start = time.perf_counter()
+        response = client.post(url, {"question": question}, format="json")
+        if response.status_code != 200:
+            raise CommandError(f"{url} answered {response.status_code}: {getattr(response, 'data', '')}")
+        if not stream:
+            # The blocking view has produced nothing before the whole answer is ready.
+            elapsed = time.perf_counter() - start
+            return elapsed, elapsed
+        ttfb = None
+        for _ in response.streaming_content:
+            if ttfb is None:
+                ttfb = time.perf_counter() - start
+        return ttfb, time.perf_counter() - start
+
+    def handle(self, *args, **options):
+        try:
+            session = ChatSession.objects.get(id=options["session_id"])
+        except ChatSession.DoesNotExist:
+            raise CommandError("Session not found.")
+        if session.ingestion_status != "READY":
+            raise CommandError(f"Session is {session.ingestion_status}, not READY.")
+
+        if options["username"]:
+            user = User.objects.get(username=options["username"])
+        else:
+            user = User.objects.filter(is_superuser=True).first()
+            if user is None:
+                raise CommandError("No superuser found; pass --username.")
+        client = APIClient()
+        client.force_authenticate(user)
+
+        base = f"/api/pdf-chat/{session.id}/ask/"
+        for name, url, stream in (("blocking", base, False), ("streaming", base + "stream/", True)):
+            # One unmeasured call builds the session's chain so both variants start warm.
+            self._timed(client, url, options["question"], stream)
+            timings = np.array([
+                self._timed(client, url, options["question"], stream) for _ in range(options["repeat"])
+            ]) * 1000
+            self.stdout.write(
+                f"{name:<10} TTFB p50 {np.percentile(timings[:, 0], 50):8.1f} ms   "
+                f"total p50 {np.percentile(timings[:, 1], 50):8.1f} ms"
+            )
@@ -0,0 +1,86 @@
+import random
+import string
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.embedding_executor import BatchingEmbedder
+from api.embeddings import MODEL_NAME
+
+
+def _random_text(rng):
+    words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9))) for _ in range(rng.randint(4, 24))]
+    return " ".join(words)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares per-call embedding against micro-batched embedding under "
+        "concurrent load and reports throughput and latency percentiles."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=16, help="Concurrent callers.")
+        parser.add_argument("--calls", type=int, default=50, help="Calls per thread.")
+        parser.add_argument("--texts-per-call", type=int, default=2, help="Texts per embed call.")
+
+    def _run(self, model, threads, calls, texts_per_call):
+        latencies = []
+        lock = threading.Lock()
+
+        def caller(seed):
+            rng = random.Random(seed)
+            own = []
+            for _ in range(calls):
+                texts = [_random_text(rng) for _ in range(texts_per_call)]
+                start = time.perf_counter()
+                model.embed_documents(texts)
+                own.append(time.perf_counter() - start)
+            with lock:
+                latencies.extend(own)
+
+        workers = [threading.Thread(target=caller, args=(seed,)) for seed in range(threads)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+
+        latencies_ms = np.array(latencies) * 1000
+        return {
+            "texts/s": threads * calls * texts_per_call / elapsed,
+            "p50 ms": np.percentile(latencies_ms, 50),
+            "p99 ms": np.percentile(latencies_ms, 99),
+        }
+
+    def handle(self, *args, **options):
+        from langchain_huggingface import HuggingFaceEmbeddings
+
+        model = HuggingFaceEmbeddings(model_name=MODEL_NAME)
+        model.embed_query("warmup")
+        # Random texts never repeat, so the embedding cache is deliberately
+        # left out: this measures the model path only.
+        runs = [
+            ("per-call", model),
+            (
+                "micro-batched",
+                BatchingEmbedder(
+                    model,
+                    max_batch_size=getattr(settings, "EMBEDDING_BATCH_SIZE", 64),
+                    max_wait_ms=getattr(settings, "EMBEDDING_BATCH_WAIT_MS", 5),
+                ),
+            ),
+        ]
+        self.stdout.write(
+            f"{options['threads']} threads x {options['calls']} calls x {options['texts_per_call']} texts"
+        )
+        for name, embedder in runs:
+            result = self._run(embedder, options["threads"], options["calls"], options["texts_per_call"])
+            self.stdout.write(
+                f"{name:<14} {result['texts/s']:8.1f} texts/s   "
+                f"p50 {result['p50 ms']:7.1f} ms   p99 {result['p99 ms']:7.1f} ms"
+            )
@@ -0,0 +1,127 @@
+import os
+import random
+import resource
+import time
+import tracemalloc
+import uuid
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from api.chunk_store import file_sha256
+from api.models import ChatSession, PDFChunkEmbeddings, UploadedPDF
+from api.rag_pipeline import get_vector_backend, process_pdfs_for_session
+
+WORDS = (
+    "patient skin acne cream doctor water sleep diet cure symptom treatment "
+    "infection chronic dose clinic therapy allergy vitamin fever pain"
+).split()
+
+
+def write_synthetic_pdf(path, pages, lines_per_page=60, seed=0):
+    """
+    Writes a text-only PDF page by page, without a PDF library and without
+    holding the document in memory. Objects: 1 catalog, 2 page tree, 3 font,
+    then a content stream and a page object per page.
+    """
+    rng = random.Random(seed)
+    offsets = []
+    with open(path, "wb") as out:
+        def write_object(body):
+            offsets.append(out.tell())
+            out.write(b"%d 0 obj\n" % len(offsets) + body + b"\nendobj\n")
+
+        out.write(b"%PDF-1.4\n")
+        write_object(b"<< /Type /Catalog /Pages 2 0 R >>")
+        kids = b" ".join(b"%d 0 R" % (5 + 2 * page) for page in range(pages))
+        write_object(b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, pages))
+        write_object(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+        for page in range(pages):
+            lines = (" ".join(rng.choice(WORDS) for _ in range(14)) for _ in range(lines_per_page))
+            stream = b"BT /F1 9 Tf 40 800 Td 12 TL " + b" ".join(b"(%s) '" % line.encode() for line in lines) + b" ET"
+            write_object(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+            write_object(
+                b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents %d 0 R "
+                b"/Resources << /Font << /F1 3 0 R >> >> >>" % (4 + 2 * page)
+            )
+        xref = out.tell()
+        out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(offsets) + 1))
+        out.write(b"".join(b"%010d 00000 n \n" % offset for offset in offsets))
+        out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(offsets) + 1, xref))
+
+
+class _DiscardingBackend:
+    """Accepts every upsert without keeping it, to measure the pipeline apart from the store."""
+
+    def __init__(self):
+        self.count = 0
+
+    def vector_count(self, namespace):
+        return 0
+
+    def upsert(self, namespace, ids, vectors, texts, metadatas):
+        self.count += len(ids)
+
+    def fetch_ids(self, namespace, ids):
+        return set(ids)
+
+    def delete_namespace(self, namespace):
+        pass
+
+    def bulk(self, namespace):
+        return nullcontext()
+
+
+class Command(BaseCommand):
+    help = (
+        "Ingests synthetic PDFs of growing page counts and reports the peak memory "
+        "allocated by the ingestion pipeline, which should stay flat as pages grow."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pages", type=int, nargs="+", default=[250, 1000, 4000])
+        parser.add_argument(
+            "--discard-vectors",
+            action="store_true",
+            help="Drop vectors instead of writing them to the configured store. The local "
+            "store keeps a namespace in memory while writing it, which grows with its size.",
+        )
+
+    def handle(self, *args, **options):
+        os.makedirs(os.path.join(settings.MEDIA_ROOT, "pdfs"), exist_ok=True)
+        self.stdout.write(f"{'pages':>7} {'chunks':>8} {'seconds':>8} {'pages/s':>8} {'peak MiB':>9}")
+        for pages in options["pages"]:
+            name = f"pdfs/bench-{uuid.uuid4().hex}.pdf"
+            path = os.path.join(settings.MEDIA_ROOT, name)
+            write_synthetic_pdf(path, pages, seed=pages)
+            session = ChatSession.objects.create()
+            pdf = UploadedPDF.objects.create(session=session, file=name)
+            with pdf.file.open("rb"):
+                pdf.sha256 = file_sha256(pdf.file)
+            pdf.save(update_fields=["sha256"])
+            backend = _DiscardingBackend() if options["discard_vectors"] else get_vector_backend()
+            try:
+                # Traces allocations of this process only: the parsing pool's
+                # workers each hold one page range at a time. DEBUG is off as in
+                # production, where queries (with whole vector batches as
+                # parameters) aren't kept.
+                tracemalloc.start()
+                start = time.perf_counter()
+                with override_settings(DEBUG=False):
+                    process_pdfs_for_session(str(session.id), backend=backend)
+                elapsed = time.perf_counter() - start
+                peak = tracemalloc.get_traced_memory()[1]
+                chunks = ChatSession.objects.get(id=session.id).chunk_count
+            finally:
+                tracemalloc.stop()
+                backend.delete_namespace(str(session.id))
+                PDFChunkEmbeddings.objects.filter(sha256=pdf.sha256).delete()
+                session.delete()
+                os.remove(path)
+            self.stdout.write(
+                f"{pages:>7} {chunks:>8} {elapsed:>8.1f} {pages / elapsed:>8.1f} {peak / 2**20:>9.1f}"
+            )
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.stdout.write(f"Max RSS of this process over all runs: {max_rss:.0f} MiB")
@@ -0,0 +1,47 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.pdf_parsing import parse_tasks, plan_tasks
+
+
+class Command(BaseCommand):
+    help = (
+        "Times parsing and chunking of the given PDFs with different numbers of "
+        "worker processes, to check that ingestion scales with the cores available."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+", help="PDF files to parse.")
+        parser.add_argument(
+            "--workers",
+            type=int,
+            nargs="+",
+            default=sorted({1, os.cpu_count() or 1}),
+            help="Process counts to compare (default: 1 and every core).",
+        )
+        parser.add_argument("--pages-per-task", type=int, default=16)
+
+    def handle(self, *args, **options):
+        missing = [path for path in options["paths"] if not os.path.exists(path)]
+        if missing:
+            raise CommandError(f"Not found: {', '.join(missing)}")
+
+        tasks = plan_tasks(options["paths"], options["pages_per_task"])
+        pages = sum(stop - start for _, start, stop in tasks)
+        self.stdout.write(f"{len(options['paths'])} files, {pages} pages, {len(tasks)} tasks")
+
+        baseline = None
+        for workers in options["workers"]:
+            # Start the pool outside the timing: it is created once per server process.
+            if workers > 1:
+                list(parse_tasks(tasks[:workers], max_workers=workers))
+            start = time.perf_counter()
+            chunks = sum(len(task_chunks) for task_chunks in parse_tasks(tasks, max_workers=workers))
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            self.stdout.write(
+                f"{workers:>3} workers  {elapsed:8.2f} s  {pages / elapsed:8.1f} pages/s  "
+                f"{chunks} chunks  speedup {baseline / elapsed:5.2f}x"
+            )
@@ -0,0 +1,83 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from api.embeddings import build_base_model
+from api.models import Team, UserProfile
+from api.recommendations import profile_text, team_text
+from api.vector_utils import normalize
+
+SAMPLE_TEXTS = [
+    "frontend developer react javascript tailwind",
+    "backend developer django python postgresql rest api",
+    "data scientist machine learning pandas pytorch",
+    "ui/ux designer figma prototyping user research",
+    "mobile developer flutter kotlin swift",
+    "devops engineer docker kubernetes aws ci/cd",
+    "looking for a designer and a frontend dev to build a hackathon health app",
+    "we are building an ai study assistant that summarizes lecture pdfs",
+    "blockchain team needs a solidity developer for a defi dashboard",
+    "game developer unity c# 3d modelling",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Checks that the ONNX backend ranks like the PyTorch one (cosine parity "
+        "and top-k agreement) and compares their throughput."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--no-quantize", action="store_true", help="Compare the fp32 ONNX graph instead of int8.")
+        parser.add_argument("--min-cosine", type=float, default=0.98, help="Fail if any vector pair is less similar.")
+        parser.add_argument("--top-k", type=int, default=5, help="Ranking depth compared between backends.")
+        parser.add_argument("--repeat", type=int, default=5, help="Passes over the corpus for the timing run.")
+
+    def _corpus(self):
+        texts = list(SAMPLE_TEXTS)
+        texts += [team_text(team) for team in Team.objects.all()[:200]]
+        for profile in UserProfile.objects.prefetch_related("skills")[:200]:
+            texts.append(profile_text(profile, [skill.skill_name for skill in profile.skills.all()]))
+        return [text for text in texts if text.strip()]
+
+    def _throughput(self, model, texts, repeat):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            model.embed_documents(texts)
+        return repeat * len(texts) / (time.perf_counter() - start)
+
+    def handle(self, *args, **options):
+        torch_model, _ = build_base_model("torch")
+        onnx_model, onnx_name = build_base_model("onnx", quantize=not options["no_quantize"])
+
+        texts = self._corpus()
+        reference = normalize(torch_model.embed_documents(texts))
+        candidate = normalize(onnx_model.embed_documents(texts))
+
+        pair_cosines = np.sum(reference * candidate, axis=1)
+        self.stdout.write(
+            f"{len(texts)} texts, {onnx_name}: pairwise cosine "
+            f"min {pair_cosines.min():.4f}  mean {pair_cosines.mean():.4f}"
+        )
+
+        # Every text as a query against all the others: do the top-k sets agree?
+        k = min(options["top_k"], len(texts) - 1)
+        overlaps = []
+        for i in range(len(texts)):
+            ref_scores = reference @ reference[i]
+            cand_scores = candidate @ candidate[i]
+            ref_scores[i] = cand_scores[i] = -np.inf
+            ref_top = set(np.argsort(-ref_scores)[:k])
+            cand_top = set(np.argsort(-cand_scores)[:k])
+            overlaps.append(len(ref_top & cand_top) / k)
+        self.stdout.write(f"top-{k} overlap: mean {np.mean(overlaps):.3f}  min {np.min(overlaps):.3f}")
+
+        for name, model in (("torch", torch_model), ("onnx", onnx_model)):
+            self.stdout.write(f"{name:<6} {self._throughput(model, texts, options['repeat']):8.1f} texts/s")
+
+        if pair_cosines.min() < options["min_cosine"]:
+            raise CommandError(
+                f"Parity check failed: min cosine {pair_cosines.min():.4f} < {options['min_cosine']}."
+            )
+        self.stdout.write(self.style.SUCCESS("Parity check passed."))
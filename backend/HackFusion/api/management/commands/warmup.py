@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from api.warmup import warmup
+
+
+class Command(BaseCommand):
+    help = "Preloads the embedding model and RAG clients and reports how long each took."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--skip-rag",
+            action="store_true",
+            help="Only load the embedding model, not the Pinecone/Gemini clients.",
+        )
+
+    def handle(self, *args, **options):
+        timings = warmup(include_rag=not options["skip_rag"])
+        for step, seconds in timings:
+            self.stdout.write(f"{step:<20} {seconds * 1000:10.1f} ms")
+        total = sum(seconds for _, seconds in timings)
+        self.stdout.write(self.style.SUCCESS(f"{'total':<20} {total * 1000:10.1f} ms"))
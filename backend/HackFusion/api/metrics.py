@@ -0,0 +1,29 @@
+# api/metrics.py
+
+import threading
+from collections import Counter
+
+_counters = Counter()
+_lock = threading.Lock()
+
+
+def incr(name, amount=1):
+    """Increments a named counter of this process."""
+    with _lock:
+        _counters[name] += amount
+
+
+def snapshot():
+    """
+    Returns all counters of this process, plus a `<name>_hit_rate` for every
+    `<name>_hits` / `<name>_misses` pair.
+    """
+    with _lock:
+        counters = dict(_counters)
+    rates = {}
+    for name, hits in counters.items():
+        if name.endswith("_hits"):
+            prefix = name[: -len("_hits")]
+            total = hits + counters.get(f"{prefix}_misses", 0)
+            rates[f"{prefix}_hit_rate"] = hits / total if total else None
+    return {**counters, **rates}
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.5 on 2026-10-18 10:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_chatsession_uploadedpdf_session'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TeamEmbedding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(help_text='SHA-256 of the text the vector was computed from', max_length=64)),
+                ('vector', models.BinaryField()),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('team', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='embedding', to='api.team')),
+            ],
+        ),
+    ]
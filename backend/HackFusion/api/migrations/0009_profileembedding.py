@@ -0,0 +1,24 @@
+# Generated by Django 5.1.5 on 2026-10-18 10:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_teamembedding'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfileEmbedding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('vector', models.BinaryField(blank=True, null=True)),
+                ('stale', models.BooleanField(default=True, help_text='Set when the role or skills change')),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('user_profile', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='embedding', to='api.userprofile')),
+            ],
+        ),
+    ]
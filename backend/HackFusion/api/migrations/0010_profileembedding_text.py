@@ -0,0 +1,24 @@
+# Generated by Django 5.1.5 on 2026-10-18 10:59
+
+from django.db import migrations, models
+
+
+def mark_all_stale(apps, schema_editor):
+    # Existing rows have no text yet; the next refresh recomputes it.
+    apps.get_model('api', 'ProfileEmbedding').objects.update(stale=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_profileembedding'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profileembedding',
+            name='text',
+            field=models.TextField(blank=True, help_text='Role + skills text the vector was computed from'),
+        ),
+        migrations.RunPython(mark_all_stale, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.5 on 2026-10-18 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_profileembedding_text'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatsession',
+            name='ingestion_error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='chatsession',
+            name='ingestion_heartbeat',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='chatsession',
+            name='ingestion_progress',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='chatsession',
+            name='ingestion_status',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('INDEXING', 'Indexing'), ('READY', 'Ready'), ('FAILED', 'Failed')], default='PENDING', max_length=8),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.5 on 2026-10-18 11:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_chatsession_ingestion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatsession',
+            name='chunk_count',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='chatsession',
+            name='ingestion_completed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='chatsession',
+            name='vector_count',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
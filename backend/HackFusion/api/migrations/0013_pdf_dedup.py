@@ -0,0 +1,35 @@
+# Generated by Django 5.1.5 on 2026-10-18 11:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_chatsession_ingestion_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadedpdf',
+            name='sha256',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.CreateModel(
+            name='PDFChunkEmbeddings',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64)),
+                ('chunk_size', models.PositiveIntegerField()),
+                ('chunk_overlap', models.PositiveIntegerField()),
+                ('embedding_model', models.CharField(max_length=200)),
+                ('chunks', models.JSONField()),
+                ('vectors', models.BinaryField()),
+                ('dimensions', models.PositiveIntegerField()),
+                ('created', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('sha256', 'chunk_size', 'chunk_overlap', 'embedding_model'), name='unique_pdf_chunk_embeddings')],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.5 on 2026-10-18 11:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_pdf_dedup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CachedAnswer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('question', models.TextField()),
+                ('vector', models.BinaryField()),
+                ('answer', models.TextField()),
+                ('sources', models.JSONField(default=list)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cached_answers', to='api.chatsession')),
+            ],
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.5 on 2026-10-18 11:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_cachedanswer'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadedpdf',
+            name='chunk_ids',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='uploadedpdf',
+            name='ingested_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='uploadedpdf',
+            name='vector_ids',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
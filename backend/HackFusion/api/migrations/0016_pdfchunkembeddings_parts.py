@@ -0,0 +1,31 @@
+# Generated by Django 5.1.5 on 2026-10-18 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_uploadedpdf_manifest'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='pdfchunkembeddings',
+            name='unique_pdf_chunk_embeddings',
+        ),
+        migrations.AddField(
+            model_name='pdfchunkembeddings',
+            name='last',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='pdfchunkembeddings',
+            name='part',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddConstraint(
+            model_name='pdfchunkembeddings',
+            constraint=models.UniqueConstraint(fields=('sha256', 'chunk_size', 'chunk_overlap', 'embedding_model', 'part'), name='unique_pdf_chunk_embeddings_part'),
+        ),
+    ]
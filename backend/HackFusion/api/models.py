@@ -54,6 +54,25 @@ class UserSkill(models.Model):
         return f"{self.user_profile.full_name} - {self.skill_name} ({'Verified' if self.verified else 'Not Verified'})"
 
 
+class ProfileEmbedding(models.Model):
+    """Stored embedding of a profile's `role` + skill names, refreshed when stale"""
+
+    user_profile = models.OneToOneField(
+        UserProfile, on_delete=models.CASCADE, related_name="embedding"
+    )
+    vector = models.BinaryField(null=True, blank=True)  # L2-normalized float32 vector
+    text = models.TextField(
+        blank=True, help_text="Role + skills text the vector was computed from"
+    )
+    stale = models.BooleanField(
+        default=True, help_text="Set when the role or skills change"
+    )
+    updated = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f"Embedding for {self.user_profile.full_name}"
+
+
 class UserProject(models.Model):
     """Model for users to showcase their projects"""
 
@@ -95,7 +114,7 @@ class Team(models.Model):
     members_limit = models.PositiveIntegerField(default=5)  # Max members allowed
     team_type = models.CharField(max_length=7, choices=TEAM_TYPES, default="PUBLIC")
     created = models.DateTimeField(auto_now_add=True)
-    updated = models.DateTimeField(auto_now=True)
+    updated = models.DateTimeField(auto_now=True, db_index=True)
 
     def save(self, *args, **kwargs):
         """Override save method to auto-create a chatroom for the team."""
@@ -118,6 +137,22 @@ class Team(models.Model):
         return self.name
 
 
+class TeamEmbedding(models.Model):
+    """Stored embedding of a team's `looking_for` + `description` text"""
+
+    team = models.OneToOneField(
+        Team, on_delete=models.CASCADE, related_name="embedding"
+    )
+    content_hash = models.CharField(
+        max_length=64, help_text="SHA-256 of the text the vector was computed from"
+    )
+    vector = models.BinaryField()  # L2-normalized float32 vector
+    updated = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f"Embedding for {self.team.name}"
+
+
 class Invitation(models.Model):
     sender = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name="sent_invitations"
@@ -202,8 +237,23 @@ class UploadedPDF(models.Model):
 
 class ChatSession(models.Model):
     """Represents a single PDF chat session."""
+    INGESTION_STATUSES = [
+        ("PENDING", "Pending"),
+        ("INDEXING", "Indexing"),
+        ("READY", "Ready"),
+        ("FAILED", "Failed"),
+    ]
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Background ingestion of the session's PDFs (see api/ingestion.py)
+    ingestion_status = models.CharField(max_length=8, choices=INGESTION_STATUSES, default="PENDING")
+    ingestion_progress = models.PositiveSmallIntegerField(default=0)  # Percent
+    ingestion_error = models.TextField(blank=True)
+    ingestion_heartbeat = models.DateTimeField(null=True, blank=True)  # When the job was queued or last reported progress
+    # Recorded once the session's chunks are indexed and confirmed readable
+    chunk_count = models.PositiveIntegerField(null=True, blank=True)
+    vector_count = models.PositiveIntegerField(null=True, blank=True)
+    ingestion_completed_at = models.DateTimeField(null=True, blank=True)
     
     def __str__(self):
         return f"ChatSession {self.id}"
@@ -212,4 +262,54 @@ class ChatSession(models.Model):
 class UploadedPDF(models.Model):
     session = models.ForeignKey(ChatSession, related_name='pdfs', on_delete=models.CASCADE, null=True, blank=True)
     file = models.FileField(upload_to="pdfs/")
-    uploaded_at = models.DateTimeField(auto_now_add=True)
\ No newline at end of file
+    uploaded_at = models.DateTimeField(auto_now_add=True)
+    sha256 = models.CharField(max_length=64, blank=True, db_index=True)  # Of the file content
+    # Ingestion manifest: set once the file's vectors are in the session's namespace
+    ingested_at = models.DateTimeField(null=True, blank=True)
+    chunk_ids = models.JSONField(default=list, blank=True)  # "<sha256>:<n>", the file's chunks in PDFChunkEmbeddings
+    vector_ids = models.JSONField(default=list, blank=True)  # IDs of its vectors in the namespace
+
+
+class PDFChunkEmbeddings(models.Model):
+    """
+    Chunks and embeddings of one PDF file, keyed by its content hash and the
+    chunking/embedding setup, so every session uploading the same file reuses them.
+    A file is stored in consecutive parts of one embedding batch each; it is
+    complete once its `last` part exists.
+    """
+
+    sha256 = models.CharField(max_length=64)
+    chunk_size = models.PositiveIntegerField()
+    chunk_overlap = models.PositiveIntegerField()
+    embedding_model = models.CharField(max_length=200)
+    part = models.PositiveIntegerField(default=0)
+    last = models.BooleanField(default=True)
+    chunks = models.JSONField()  # [{"text": ..., "metadata": {...}}] in file order
+    vectors = models.BinaryField()  # float32 (len(chunks), dimensions) matrix
+    dimensions = models.PositiveIntegerField()
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["sha256", "chunk_size", "chunk_overlap", "embedding_model", "part"],
+                name="unique_pdf_chunk_embeddings_part",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.sha256[:12]} part {self.part} ({len(self.chunks)} chunks)"
+
+
+class CachedAnswer(models.Model):
+    """An answered question of a chat session, reused for semantically equivalent questions"""
+
+    session = models.ForeignKey(ChatSession, related_name="cached_answers", on_delete=models.CASCADE)
+    question = models.TextField()
+    vector = models.BinaryField()  # L2-normalized float32 embedding of the question
+    answer = models.TextField()
+    sources = models.JSONField(default=list)  # Retrieved chunks: id, file, page, snippet
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.question[:50]
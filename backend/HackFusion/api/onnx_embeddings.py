@@ -0,0 +1,84 @@
+# api/onnx_embeddings.py
+
+import os
+
+import numpy as np
+from django.core.exceptions import ImproperlyConfigured
+
+
+class OnnxEmbeddings:
+    """
+    Runs a sentence-transformers model through an exported ONNX graph.
+
+    The graph is exported once into `model_dir` (and optionally dynamically
+    quantized to int8) and reused on later boots. Pooling matches the
+    sentence-transformers pipeline of all-MiniLM-L6-v2: mean over the
+    attention mask followed by L2 normalization.
+
+    Requires the optional `optimum[onnxruntime]` package.
+    """
+
+    def __init__(self, model_name, model_dir, quantize=True, max_length=256, batch_size=32):
+        try:
+            import onnxruntime
+            from transformers import AutoTokenizer
+        except ImportError as e:
+            raise ImproperlyConfigured(
+                "EMBEDDING_BACKEND = 'onnx' requires `pip install optimum[onnxruntime]`."
+            ) from e
+
+        self.max_length = max_length
+        self.batch_size = batch_size
+        export_dir = os.path.join(model_dir, model_name.replace("/", "__"))
+        model_path = self._export(model_name, export_dir, quantize)
+
+        self.tokenizer = AutoTokenizer.from_pretrained(export_dir)
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(
+            model_path, options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    @staticmethod
+    def _export(model_name, export_dir, quantize):
+        model_path = os.path.join(export_dir, "model.onnx")
+        if not os.path.exists(model_path):
+            from optimum.onnxruntime import ORTModelForFeatureExtraction
+            from transformers import AutoTokenizer
+
+            ORTModelForFeatureExtraction.from_pretrained(model_name, export=True).save_pretrained(export_dir)
+            AutoTokenizer.from_pretrained(model_name).save_pretrained(export_dir)
+        if not quantize:
+            return model_path
+
+        quantized_path = os.path.join(export_dir, "model_int8.onnx")
+        if not os.path.exists(quantized_path):
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            quantize_dynamic(model_path, quantized_path, weight_type=QuantType.QInt8)
+        return quantized_path
+
+    def _embed_batch(self, texts):
+        encoded = self.tokenizer(
+            texts, padding=True, truncation=True, max_length=self.max_length, return_tensors="np"
+        )
+        inputs = {
+            name: encoded[name].astype(np.int64) for name in self.input_names if name in encoded
+        }
+        if "token_type_ids" in self.input_names and "token_type_ids" not in inputs:
+            inputs["token_type_ids"] = np.zeros_like(inputs["input_ids"])
+        token_embeddings = self.session.run(None, inputs)[0]
+
+        mask = encoded["attention_mask"][..., None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def embed_documents(self, texts):
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            vectors.extend(self._embed_batch(list(texts[start:start + self.batch_size])).tolist())
+        return vectors
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
@@ -0,0 +1,101 @@
+# api/pdf_parsing.py
+#
+# Runs in the parsing worker processes as well, so it must stay importable
+# without Django being configured.
+
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
+
+_pool = None
+_pool_key = None  # (pid, max_workers)
+_pool_lock = threading.Lock()
+
+
+def plan_tasks(pdf_paths, pages_per_task):
+    """Splits every PDF into (path, first page, end page) ranges, in file and page order."""
+    from pypdf import PdfReader
+
+    tasks = []
+    for path in pdf_paths:
+        with open(path, "rb") as file, PdfReader(file) as reader:
+            page_count = len(reader.pages)
+        for start in range(0, page_count, pages_per_task):
+            tasks.append((path, start, min(start + pages_per_task, page_count)))
+    return tasks
+
+
+def parse_page_range(path, start, stop, chunk_size, chunk_overlap):
+    """
+    Extracts pages [start, stop) of one PDF and splits them into chunks.
+    Page documents carry the same metadata as langchain's PyPDFLoader.
+    """
+    from pypdf import PdfReader
+
+    # Reading from an open file (not a path) keeps pypdf from loading the
+    # whole file into memory. Closing the reader frees its parsed objects
+    # right away; they form reference cycles that would otherwise wait for
+    # the garbage collector, several page ranges' worth at a time.
+    with open(path, "rb") as file, PdfReader(file) as reader:
+        total_pages = len(reader.pages)
+        pages = [
+            Document(
+                page_content=reader.pages[number].extract_text(extraction_mode="plain").strip(),
+                metadata={
+                    "source": path,
+                    "total_pages": total_pages,
+                    "page": number,
+                    "page_label": reader.page_labels[number],
+                },
+            )
+            for number in range(start, stop)
+        ]
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    return splitter.split_documents(pages)
+
+
+def _get_pool(max_workers):
+    # "spawn" rather than fork: ingestion runs on a thread of a multi-threaded
+    # server process, which is not safe to fork.
+    global _pool, _pool_key
+    key = (os.getpid(), max_workers)
+    with _pool_lock:
+        if _pool is None or _pool_key != key:
+            if _pool is not None and _pool_key[0] == key[0]:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers, mp_context=multiprocessing.get_context("spawn"))
+            _pool_key = key
+        return _pool
+
+
+def parse_tasks(tasks, chunk_size=500, chunk_overlap=50, max_workers=None):
+    """
+    Parses and chunks `tasks` (see `plan_tasks`) on a process pool and yields
+    each task's chunks in task order as soon as they are ready. At most two
+    tasks per worker are in flight, so parsed chunks never pile up far ahead
+    of the consumer. With one worker the tasks run inline.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    if max_workers <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            yield parse_page_range(*task, chunk_size, chunk_overlap)
+        return
+
+    pool = _get_pool(max_workers)
+    pending = deque()
+    remaining = iter(tasks)
+    for task in remaining:
+        pending.append(pool.submit(parse_page_range, *task, chunk_size, chunk_overlap))
+        if len(pending) >= 2 * max_workers:
+            break
+    while pending:
+        chunks = pending.popleft().result()
+        next_task = next(remaining, None)
+        if next_task is not None:
+            pending.append(pool.submit(parse_page_range, *next_task, chunk_size, chunk_overlap))
+        yield chunks
@@ -1,26 +1,39 @@
 # base/rag_pipeline.py
 
 import os
+import threading
 import time
-import django
-
-# --- Setup Django Environment for standalone script ---
-# This allows us to run this file directly and still use Django models.
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'HackFusion.settings')
-django.setup()
-# ----------------------------------------------------
-
-from langchain_community.document_loaders import PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_google_genai import GoogleGenerativeAI
-from langchain.chains import create_retrieval_chain
+from collections import Counter
+from itertools import islice
+
+import numpy as np
+
+if __name__ == '__main__':
+    # --- Setup Django Environment for standalone script ---
+    # This allows us to run this file directly and still use Django models.
+    # Only done when run as a script: importing this module from the views
+    # must not (re)configure Django.
+    import django
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'HackFusion.settings')
+    django.setup()
+    # ----------------------------------------------------
+
 from langchain.chains.combine_documents import create_stuff_documents_chain
 from langchain_core.prompts import ChatPromptTemplate
-from pinecone import Pinecone
-from langchain_pinecone import PineconeVectorStore
+from langchain_core.runnables import RunnablePassthrough
 from django.conf import settings
-from .models import ChatSession
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from . import answer_cache, metrics
+from .chain_cache import ChainCache
+from .chunk_store import ChunkSetWriter, file_sha256, has_chunk_set, iter_chunk_set
+from .models import ChatSession, UploadedPDF
+from .embeddings import MODEL_NAME, get_embedding_model
+from .pdf_parsing import parse_tasks, plan_tasks
+from .vector_stores import BatchUpserter, LocalVectorBackend, PineconeVectorBackend
 
 from dotenv import load_dotenv
 from pathlib import Path
@@ -30,35 +43,85 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # Load environment variables from .env file in the project root
 load_dotenv(os.path.join(BASE_DIR, '.env'))
 
-# --- Initialize APIs & Constants ---
+# --- APIs & Constants ---
 PINECONE_API_KEY = os.environ.get('PINECONE_API_KEY')
 GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
 INDEX_NAME = os.environ.get('PINECONE_INDEX_NAME')
 
-MODEL_NAME_384_DIM = 'sentence-transformers/all-MiniLM-L6-v2'
+# Clients are created on first use (or by `manage.py warmup`), not at import
+# time, so migrate/check and worker boot don't pay for them.
+_clients = {}
+_clients_lock = threading.Lock()
 
-pc = Pinecone(api_key=PINECONE_API_KEY)
-embeddings_model = HuggingFaceEmbeddings(model_name=MODEL_NAME_384_DIM)
-llm = GoogleGenerativeAI(model="gemini-1.5-flash", google_api_key=GEMINI_API_KEY, temperature=0.2)
 
-# --- RAG LOGIC USING LANGCHAIN'S ABSTRACTION CHAIN ---
+def _get_client(name, factory):
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                client = _clients[name] = factory()
+    return client
 
-def get_answer_from_rag(session_id: str, question: str):
+
+def get_pinecone():
+    def factory():
+        from pinecone import Pinecone
+        return Pinecone(api_key=PINECONE_API_KEY)
+    return _get_client("pinecone", factory)
+
+
+def get_llm():
+    def factory():
+        from langchain_google_genai import GoogleGenerativeAI
+        return GoogleGenerativeAI(model="gemini-1.5-flash", google_api_key=GEMINI_API_KEY, temperature=0.2)
+    return _get_client("llm", factory)
+
+
+def get_vector_backend():
     """
-    Generates an answer using the LangChain Retrieval Chain, based on the old code's logic.
+    The vector store holding the PDF chunks, one namespace per ChatSession:
+    Pinecone, or the in-process memory-mapped store (see RAG_VECTOR_STORE).
     """
-    print(f"\n--- Starting RAG Chain for Session: {session_id} ---")
+    def factory():
+        backend = getattr(settings, "RAG_VECTOR_STORE", "pinecone")
+        if backend == "pinecone":
+            return PineconeVectorBackend(lambda: get_pinecone().Index(INDEX_NAME))
+        if backend == "local":
+            return LocalVectorBackend(
+                settings.RAG_LOCAL_VECTOR_DIR,
+                {
+                    "mode": getattr(settings, "RAG_LOCAL_INDEX_MODE", "auto"),
+                    "ann_threshold": getattr(settings, "RAG_LOCAL_ANN_THRESHOLD", 50000),
+                },
+            )
+        raise ImproperlyConfigured(f"Unknown RAG_VECTOR_STORE '{backend}'.")
+    return _get_client("vector_backend", factory)
 
+# --- RAG LOGIC USING LANGCHAIN'S ABSTRACTION CHAIN ---
+
+# Ready-to-use chains per session, so follow-up questions skip the setup below.
+chain_cache = ChainCache(
+    "rag_chain_cache",
+    max_entries=getattr(settings, "RAG_CHAIN_CACHE_SIZE", 256),
+    idle_seconds=getattr(settings, "RAG_CHAIN_CACHE_IDLE_SECONDS", 1800),
+)
+
+
+def build_rag_chain(session_id: str):
+    """Builds the retriever and retrieval chain of one session (see `get_answer_from_rag`)."""
     # 1. Initialize Vector Store and Retriever
     # The namespace is crucial for multi-tenancy in a web app context.
     print(f"Step 1: Initializing retriever for namespace '{session_id}'...")
-    vectorstore = PineconeVectorStore.from_existing_index(
-        index_name=INDEX_NAME,
-        embedding=embeddings_model,
-        namespace=session_id
-    )
-    # Using 'k=3' as specified in the old code's logic.
-    retriever = vectorstore.as_retriever(search_kwargs={"k": 15})
+    vectorstore = get_vector_backend().store(session_id, get_embedding_model())
+    # Over-fetch RAG_FETCH_K candidates and keep RAG_RETRIEVAL_K of them chosen by
+    # maximal marginal relevance, so near-duplicate chunks don't crowd the prompt.
+    search_kwargs = {"k": getattr(settings, "RAG_RETRIEVAL_K", 15)}
+    search_type = getattr(settings, "RAG_SEARCH_TYPE", "mmr")
+    if search_type == "mmr":
+        search_kwargs["fetch_k"] = getattr(settings, "RAG_FETCH_K", 40)
+        search_kwargs["lambda_mult"] = getattr(settings, "RAG_MMR_LAMBDA", 0.7)
+    retriever = vectorstore.as_retriever(search_type=search_type, search_kwargs=search_kwargs)
 
     # 2. Define Prompt Template (from old code)
     # This prompt template structures how the retrieved documents and the question
@@ -80,66 +143,398 @@ def get_answer_from_rag(session_id: str, question: str):
         ]
     )
 
-    # 3. Create and Invoke the RAG Chain (from old code)
+    # 3. Create the RAG Chain (as create_retrieval_chain does, plus a packing step)
     # This chain automatically handles:
     #   a. Taking the input question.
-    #   b. Passing it to the retriever to get relevant documents.
-    #   c. "Stuffing" the document content into the {context} part of the prompt.
-    #   d. Passing the final prompt to the LLM to get an answer.
-    print(f"Step 2: Creating and invoking the RAG chain for question: '{question}'")
-    question_answer_chain = create_stuff_documents_chain(llm, prompt)
-    rag_chain = create_retrieval_chain(retriever, question_answer_chain)
+    #   b. Passing it to the retriever to get relevant documents ("candidates").
+    #   c. Packing the best of them into the token budget ("context").
+    #   d. "Stuffing" the packed content into the {context} part of the prompt.
+    #   e. Passing the final prompt to the LLM to get an answer.
+    question_answer_chain = create_stuff_documents_chain(get_llm(), prompt)
+    budget = getattr(settings, "RAG_CONTEXT_TOKEN_BUDGET", 1200)
+    return (
+        RunnablePassthrough.assign(candidates=(lambda x: x["input"]) | retriever)
+        .assign(context=lambda x: pack_context(x["candidates"], budget))
+        .assign(retrieved_at=lambda x: time.perf_counter())
+        .assign(answer=question_answer_chain)
+    )
+
+
+def estimate_tokens(text):
+    """Rough LLM token count (about four characters per token); no tokenizer call."""
+    return max(1, len(text) // 4)
+
+
+def pack_context(documents, budget):
+    """The leading `documents` that fit in `budget` tokens (always at least one)."""
+    packed, used = [], 0
+    for document in documents:
+        tokens = estimate_tokens(document.page_content)
+        if packed and used + tokens > budget:
+            break
+        packed.append(document)
+        used += tokens
+    return packed
+
+
+_seconds_per_prompt_token = None  # Running estimate, turns tokens saved into time saved
+
+
+def _log_context_budget(question, candidates, context, llm_seconds):
+    """Reports what the token budget kept out of the prompt for one question."""
+    global _seconds_per_prompt_token
+    sent = estimate_tokens(question) + sum(estimate_tokens(doc.page_content) for doc in context)
+    saved = sum(estimate_tokens(doc.page_content) for doc in candidates[len(context):])
+    estimate = llm_seconds / sent
+    if _seconds_per_prompt_token is not None:
+        estimate = 0.8 * _seconds_per_prompt_token + 0.2 * estimate
+    _seconds_per_prompt_token = estimate
+    metrics.incr("rag_context_tokens_sent", sent)
+    metrics.incr("rag_context_tokens_saved", saved)
+    print(
+        f"Context: {len(context)}/{len(candidates)} chunks, ~{sent} tokens sent, ~{saved} tokens saved; "
+        f"LLM {llm_seconds * 1000:.0f} ms, ~{saved * estimate * 1000:.0f} ms saved (est.)"
+    )
+
+
+NO_ANSWER = "I'm sorry, I could not find an answer in the provided documents."
+
+
+def describe_sources(documents):
+    """The retrieved chunks as sent to clients and kept in the answer cache."""
+    return [
+        {
+            "id": document.id,
+            "file": os.path.basename(document.metadata.get("source", "")),
+            "page": document.metadata.get("page"),
+            "snippet": document.page_content[:200],
+        }
+        for document in documents
+    ]
 
-    # The chain expects a dictionary with the key "input".
-    response = rag_chain.invoke({"input": question})
 
-    # The final answer is in the "answer" key of the response dictionary.
-    answer = response.get("answer", "I'm sorry, I could not find an answer in the provided documents.")
-    
+def _cached_answer(session_id, question):
+    """
+    Returns (cached answer or None, question vector). The vector is None when
+    the answer cache is off; the retriever embeds the question again, which
+    the embedding cache serves from memory.
+    """
+    if not answer_cache.enabled():
+        return None, None
+    question_vector = get_embedding_model().embed_query(question)
+    return answer_cache.lookup(session_id, question_vector), question_vector
+
+
+def _from_cache(hit):
+    print("Step 2: Answered from the session's answer cache.")
+    return {"answer": hit.answer, "sources": hit.sources, "cached": True}
+
+
+def _from_chain(question, response):
+    """The answer dict of a chain `response`; logs how the context budget was spent."""
+    answer = response.get("answer", NO_ANSWER)
+    _log_context_budget(
+        question, response["candidates"], response["context"], time.perf_counter() - response["retrieved_at"]
+    )
     print("Step 3: RAG chain finished. Returning answer.")
-    return answer
+    return {"answer": answer, "sources": describe_sources(response.get("context", [])), "cached": False}
 
-# --- Helper function for one-time processing ---
-# This is called by the view on first question, or by the main script for testing.
-# THIS FUNCTION REMAINS UNCHANGED as it's already robust.
-def process_pdfs_for_session(session_id: str):
-    index = pc.Index(INDEX_NAME)
-    index_stats = index.describe_index_stats()
-    if session_id in index_stats.get('namespaces', {}):
-        print(f"Namespace '{session_id}' already exists. Skipping processing.")
+
+def answer_question(session_id: str, question: str):
+    """
+    Returns {"answer", "sources", "cached"}: from the session's answer cache
+    when an equivalent question was answered before, otherwise from the RAG chain.
+    """
+    print(f"\n--- Starting RAG Chain for Session: {session_id} ---")
+    hit, question_vector = _cached_answer(session_id, question)
+    if hit is not None:
+        return _from_cache(hit)
+
+    rag_chain = chain_cache.get_or_create(session_id, lambda: build_rag_chain(session_id))
+
+    print(f"Step 2: Invoking the RAG chain for question: '{question}'")
+    # The chain expects a dictionary with the key "input".
+    result = _from_chain(question, rag_chain.invoke({"input": question}))
+    if question_vector is not None:
+        answer_cache.store(session_id, question, question_vector, result["answer"], result["sources"])
+    return result
+
+
+def get_answer_from_rag(session_id: str, question: str):
+    """
+    Generates an answer using the LangChain Retrieval Chain, based on the old code's logic.
+    """
+    return answer_question(session_id, question)["answer"]
+
+
+def stream_answer_from_rag(session_id: str, question: str):
+    """
+    Streaming variant of `answer_question`. Yields ("sources", sources) as
+    soon as retrieval is done, then ("token", text) for every piece of the
+    answer as the LLM produces it, then ("done", {"cached": ...}). A cached
+    answer comes as a single token.
+    """
+    print(f"\n--- Streaming RAG Chain for Session: {session_id} ---")
+    hit, question_vector = _cached_answer(session_id, question)
+    if hit is not None:
+        yield "sources", hit.sources
+        yield "token", hit.answer
+        yield "done", {"cached": True}
         return
 
-    print(f"Namespace '{session_id}' not found. Processing and embedding PDFs...")
+    rag_chain = chain_cache.get_or_create(session_id, lambda: build_rag_chain(session_id))
+    sources, tokens = [], []
+    candidates = context = []
+    retrieved_at = time.perf_counter()
+    for chunk in rag_chain.stream({"input": question}):
+        if "candidates" in chunk:
+            candidates = chunk["candidates"]
+        if "context" in chunk:
+            context = chunk["context"]
+            retrieved_at = time.perf_counter()
+            sources = describe_sources(context)
+            yield "sources", sources
+        if chunk.get("answer"):
+            tokens.append(chunk["answer"])
+            yield "token", chunk["answer"]
+    _log_context_budget(question, candidates, context, time.perf_counter() - retrieved_at)
+    if question_vector is not None and tokens:
+        answer_cache.store(session_id, question, question_vector, "".join(tokens), sources)
+    yield "done", {"cached": False}
+
+# --- Helper function for one-time processing ---
+# This is run by the background ingestion job (api/ingestion.py) right after
+# upload, or by the main script for testing. `progress`, if given, is called
+# with the completed percentage.
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 50
+EMBED_BATCH_SIZE = 256  # Default chunks embedded and upserted per batch, see INGEST_BATCH_SIZE
+
+
+def vector_id(pdf_id, position):
+    """Deterministic vector ID of a PDF's chunk, so a write can be checked with a targeted fetch."""
+    return f"{pdf_id}:{position}"
+
+
+def process_pdfs_for_session(session_id: str, progress=None, backend=None):
+    """
+    Indexes the session's PDFs that have no ingestion manifest yet; files
+    already in the namespace are left alone. Records each new file's
+    manifest and the session's totals.
+    """
+    progress = progress or (lambda percent: None)
     session = ChatSession.objects.get(id=session_id)
-    all_docs = []
-    for pdf_record in session.pdfs.all():
-        pdf_path = os.path.join(settings.MEDIA_ROOT, pdf_record.file.name)
-        loader = PyPDFLoader(pdf_path)
-        documents = loader.load()
-        all_docs.extend(documents)
-
-    if not all_docs:
+    pdf_records = list(session.pdfs.order_by("uploaded_at", "id"))
+    if not pdf_records:
         raise Exception("No documents found for this session.")
+    pending = [pdf_record for pdf_record in pdf_records if pdf_record.ingested_at is None]
+    if not pending:
+        print(f"Every PDF of session '{session_id}' is already ingested. Skipping processing.")
+        return
 
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-    text_chunks = text_splitter.split_documents(all_docs)
-
-    print(f"Embedding {len(text_chunks)} text chunks into Pinecone under namespace '{session_id}'...")
-    PineconeVectorStore.from_documents(
-        documents=text_chunks, index_name=INDEX_NAME,
-        embedding=embeddings_model, namespace=session_id
+    backend = backend or get_vector_backend()
+    # Sessions ingested before per-file manifests were kept have vectors under
+    # session-wide IDs that can't be told apart; start them over.
+    if len(pending) == len(pdf_records) and backend.vector_count(session_id):
+        print(f"Namespace '{session_id}' has untracked vectors. Re-ingesting it.")
+        backend.delete_namespace(session_id)
+
+    print(f"Processing and embedding {len(pending)} new PDFs for namespace '{session_id}'...")
+    for pdf_record in pending:
+        if not pdf_record.sha256:  # Uploaded before hashes were recorded
+            with pdf_record.file.open("rb"):
+                pdf_record.sha256 = file_sha256(pdf_record.file)
+            pdf_record.save(update_fields=["sha256"])
+
+    # Pages are read lazily, in page-range tasks on the parsing pool, chunked
+    # as they arrive, and embedded INGEST_BATCH_SIZE chunks at a time; each
+    # batch is upserted on a worker thread while the next one is embedded,
+    # so memory stays flat however many pages the session has. Files seen
+    # before (in any session) stream their stored chunks and vectors
+    # instead; only new content is parsed and embedded.
+    batch_size = getattr(settings, "INGEST_BATCH_SIZE", EMBED_BATCH_SIZE)
+    stage_seconds = Counter()  # Time each stage kept the ingestion thread busy
+    stage_chunks = Counter()
+    embedding_model = get_embedding_model()
+    model_name = getattr(embedding_model, "model_name", MODEL_NAME)
+    # Chunk vectors are kept by the chunk store, so they bypass the embedding caches.
+    embed_chunks = getattr(embedding_model, "embed_documents_uncached", embedding_model.embed_documents)
+    store_key = (CHUNK_SIZE, CHUNK_OVERLAP, model_name)
+    parse_owner = {}  # sha256 -> id of the upload whose file gets parsed
+    for pdf_record in pending:
+        if pdf_record.sha256 in parse_owner or has_chunk_set(pdf_record.sha256, *store_key):
+            metrics.incr("pdf_dedup_hits")
+        else:
+            metrics.incr("pdf_dedup_misses")
+            parse_owner[pdf_record.sha256] = pdf_record.id
+    paths = [
+        os.path.join(settings.MEDIA_ROOT, pdf_record.file.name)
+        for pdf_record in pending
+        if parse_owner.get(pdf_record.sha256) == pdf_record.id
+    ]
+    tasks = plan_tasks(paths, getattr(settings, "PDF_PAGES_PER_TASK", 16))
+    task_counts = Counter(path for path, _, _ in tasks)
+    parsed = iter(
+        parse_tasks(tasks, CHUNK_SIZE, CHUNK_OVERLAP, max_workers=getattr(settings, "PDF_PARSE_WORKERS", None))
     )
-
-    # Verification Loop to ensure data is indexed before proceeding
-    max_retries = 30
-    print("Verifying vector indexing in Pinecone...")
-    for i in range(max_retries):
-        stats = index.describe_index_stats()
-        if session_id in stats.get('namespaces', {}) and stats['namespaces'][session_id]['vector_count'] > 0:
-            print(f"Success! Confirmed {stats['namespaces'][session_id]['vector_count']} vectors in Pinecone for namespace '{session_id}'.")
+    # Progress: one unit per parsed page range and per file copied from the store.
+    units_total = len(tasks) + len(pending) - len(paths)
+    units_done = 0
+
+    def parsed_chunks(path):
+        nonlocal units_done
+        for _ in range(task_counts[path]):
+            start = time.perf_counter()
+            chunks = next(parsed)
+            stage_seconds["parse"] += time.perf_counter() - start
+            stage_chunks["parse"] += len(chunks)
+            units_done += 1
+            yield from chunks
+
+    def file_batches(pdf_record, path):
+        """Yields (texts, metadatas, vectors) of one file, a batch at a time."""
+        nonlocal units_done
+        if parse_owner.get(pdf_record.sha256) != pdf_record.id:
+            stored = iter_chunk_set(pdf_record.sha256, *store_key)
+            while True:
+                start = time.perf_counter()
+                part = next(stored, None)
+                stage_seconds["load"] += time.perf_counter() - start
+                if part is None:
+                    break
+                stored_chunks, vectors = part
+                stage_chunks["load"] += len(stored_chunks)
+                texts = [chunk["text"] for chunk in stored_chunks]
+                yield texts, [chunk["metadata"] for chunk in stored_chunks], vectors
+            units_done += 1
             return
-        time.sleep(1) # Wait for 1 second before retrying
-    raise Exception(f"Timeout: Failed to verify vector indexing in Pinecone for namespace '{session_id}'.")
+        writer = ChunkSetWriter(pdf_record.sha256, *store_key)
+        for batch in _batched(parsed_chunks(path), batch_size):
+            texts = [chunk.page_content for chunk in batch]
+            metadatas = [
+                {key: value for key, value in chunk.metadata.items() if key != "source"} for chunk in batch
+            ]
+            start = time.perf_counter()
+            vectors = np.asarray(embed_chunks(texts), dtype=np.float32)
+            stage_seconds["embed"] += time.perf_counter() - start
+            stage_chunks["embed"] += len(texts)
+            writer.add([{"text": text, "metadata": metadata} for text, metadata in zip(texts, metadatas)], vectors)
+            yield texts, metadatas, vectors
+        writer.close()
+
+    # Copy each new file's vectors into the session namespace, in upload order.
+    print(f"Upserting text chunks into the vector store under namespace '{session_id}'...")
+    manifests = {}  # pdf id -> (chunk ids, vector ids)
+    started = time.perf_counter()
+    upserter = BatchUpserter(
+        backend,
+        session_id,
+        concurrency=getattr(settings, "INGEST_UPSERT_CONCURRENCY", 2),
+        retries=getattr(settings, "INGEST_UPSERT_RETRIES", 3),
+        retry_delay=getattr(settings, "INGEST_UPSERT_RETRY_DELAY", 0.5),
+    )
+    # The local store publishes the whole load as one snapshot when the
+    # upserter is done, rather than rewriting the namespace per batch.
+    with backend.bulk(session_id), upserter:
+        for pdf_record in pending:
+            source = os.path.join(settings.MEDIA_ROOT, pdf_record.file.name)
+            pdf_ids = []
+            for texts, metadatas, vectors in file_batches(pdf_record, source):
+                # Stored parts needn't match the batch size.
+                for start in range(0, len(texts), batch_size):
+                    stop = start + batch_size
+                    ids = [vector_id(pdf_record.id, len(pdf_ids) + n) for n in range(len(texts[start:stop]))]
+                    sourced = [{**metadata, "source": source} for metadata in metadatas[start:stop]]
+                    upserter.submit(ids, vectors[start:stop], texts[start:stop], sourced)
+                    pdf_ids.extend(ids)
+                progress(100 * units_done / max(units_total, 1))
+            manifests[pdf_record.id] = ([f"{pdf_record.sha256}:{n}" for n in range(len(pdf_ids))], pdf_ids)
+    new_ids = [pdf_ids for _, pdf_ids in manifests.values() if pdf_ids]
+    added = sum(len(pdf_ids) for _, pdf_ids in manifests.values())
+    _log_ingestion_throughput(added, time.perf_counter() - started, stage_seconds, stage_chunks, upserter)
+    indexed_before = sum(len(pdf_record.vector_ids) for pdf_record in pdf_records if pdf_record.ingested_at)
+    if not added and not indexed_before:
+        raise Exception("No text could be extracted from this session's PDFs.")
+
+    # Read-your-writes check: fetch the first and last new vector by ID
+    # rather than polling index-wide stats.
+    expected = {new_ids[0][0], new_ids[-1][-1]} if new_ids else set()
+    print("Verifying vector indexing...")
+    for i in range(30):
+        if backend.fetch_ids(session_id, expected) == expected:
+            break
+        time.sleep(0.5)
+    else:
+        raise Exception(f"Timeout: Failed to verify vector indexing for namespace '{session_id}'.")
+
+    # A file deleted while it was being ingested had no vector IDs yet for
+    # the delete signal to remove: skip its manifest and drop its vectors
+    # here. The row locks keep the remaining files until the manifests are in.
+    now = timezone.now()
+    with transaction.atomic():
+        remaining = set(
+            UploadedPDF.objects.select_for_update()
+            .filter(id__in=[pdf_record.id for pdf_record in pending])
+            .values_list("id", flat=True)
+        )
+        ingested = [pdf_record for pdf_record in pending if pdf_record.id in remaining]
+        for pdf_record in ingested:
+            pdf_record.chunk_ids, pdf_record.vector_ids = manifests[pdf_record.id]
+            pdf_record.ingested_at = now
+        UploadedPDF.objects.bulk_update(ingested, ["chunk_ids", "vector_ids", "ingested_at"])
+        recorded = sum(len(pdf_record.vector_ids) for pdf_record in ingested)
+        session_totals = ChatSession.objects.filter(id=session_id)
+        if len(pending) == len(pdf_records):  # Indexed from scratch: the totals start over
+            session_totals.update(chunk_count=recorded, vector_count=recorded, ingestion_completed_at=now)
+        else:
+            # Add to the totals rather than overwrite them, so files removed
+            # meanwhile stay subtracted.
+            session_totals.update(
+                chunk_count=Coalesce(F("chunk_count"), 0) + recorded,
+                vector_count=Coalesce(F("vector_count"), 0) + recorded,
+                ingestion_completed_at=now,
+            )
+    orphaned = [
+        vector for pdf_id, (_, pdf_ids) in manifests.items() if pdf_id not in remaining for vector in pdf_ids
+    ]
+    if orphaned:
+        backend.delete(session_id, orphaned)
+        print(f"Dropped {len(orphaned)} vectors of {len(pending) - len(ingested)} PDFs deleted during ingestion.")
+    print(f"Success! Confirmed {recorded} new vectors for namespace '{session_id}'.")
+
+
+def _log_ingestion_throughput(chunks, seconds, stage_seconds, stage_chunks, upserter):
+    """Reports chunks per second overall and per stage (per upsert thread for upserts)."""
+    stages = [
+        f"{stage} {stage_chunks[stage] / stage_seconds[stage]:.0f}/s"
+        for stage in ("parse", "load", "embed")
+        if stage_chunks[stage] and stage_seconds[stage]
+    ]
+    if chunks and upserter.seconds:
+        stages.append(f"upsert {chunks / upserter.seconds:.0f}/s per thread x {upserter.concurrency}")
+    retried = f", {upserter.retried} upserts retried" if upserter.retried else ""
+    print(
+        f"Ingested {chunks} chunks in {seconds:.1f} s ({chunks / max(seconds, 1e-9):.0f} chunks/s): "
+        f"{', '.join(stages) or 'nothing to do'}{retried}"
+    )
+
+
+def _batched(iterable, size):
+    """Lists of `size` items from `iterable` (the last may be shorter)."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def remove_pdf_vectors(session_id, vector_ids):
+    """Deletes one PDF's vectors from its session's namespace and takes them off the session's totals."""
+    if not vector_ids:
+        return
+    get_vector_backend().delete(str(session_id), vector_ids)
+    ChatSession.objects.filter(id=session_id, vector_count__gte=len(vector_ids)).update(
+        chunk_count=F("chunk_count") - len(vector_ids), vector_count=F("vector_count") - len(vector_ids)
+    )
+    print(f"Removed {len(vector_ids)} vectors from namespace '{session_id}'.")
 
 
 # --- STANDALONE TEST SCRIPT ---
@@ -193,7 +588,7 @@ if __name__ == '__main__':
             print(f"Cleaned up test session {session_id_to_test}.")
             # Optional: Clean up the namespace in Pinecone
             # try:
-            #     index = pc.Index(INDEX_NAME)
+            #     index = get_pinecone().Index(INDEX_NAME)
             #     index.delete(namespace=session_id_to_test, delete_all=True)
             #     print(f"Cleaned up Pinecone namespace '{session_id_to_test}'.")
             # except Exception as pe:
@@ -0,0 +1,51 @@
+# api/recommendation_cache.py
+
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import metrics
+
+EPOCH_KEY = "recommendations:epoch"
+
+
+def _cache():
+    return caches[getattr(settings, "RECOMMENDATION_CACHE_ALIAS", "default")]
+
+
+def get_epoch():
+    """The current recommendation epoch; every cache key embeds it."""
+    return _cache().get_or_set(EPOCH_KEY, uuid.uuid4().hex, None)
+
+
+def bump_epoch():
+    """
+    Invalidates every cached recommendation at once. A random token rather
+    than a counter, so concurrent bumps from different workers can't collide.
+    """
+    _cache().set(EPOCH_KEY, uuid.uuid4().hex, None)
+
+
+def make_key(kind, object_id, k=5, epoch=None):
+    return f"recommendations:{epoch or get_epoch()}:{kind}:{object_id}:{k}"
+
+
+def get_many(keys):
+    """Returns {key: cached result} for the keys that hit and records hits/misses."""
+    found = _cache().get_many(keys) if keys else {}
+    metrics.incr("recommendation_cache_hits", len(found))
+    metrics.incr("recommendation_cache_misses", len(keys) - len(found))
+    return found
+
+
+def get(key):
+    return get_many([key]).get(key)
+
+
+def set_many(results):
+    _cache().set_many(results, timeout=getattr(settings, "RECOMMENDATION_CACHE_TIMEOUT", 3600))
+
+
+def set(key, result):
+    set_many({key: result})
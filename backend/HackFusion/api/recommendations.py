@@ -0,0 +1,523 @@
+# api/recommendations.py
+
+import base64
+import binascii
+import hashlib
+import json
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, F, Max, Q
+from django.utils import timezone
+
+from .lexical_index import BM25Index, tokenize
+from .models import ProfileEmbedding, Team, TeamEmbedding, UserProfile, UserSkill
+from .shared_matrix import SharedMatrix
+from .vector_index import VectorIndex, top_k
+from .vector_utils import normalize, vector_from_bytes, vector_to_bytes
+
+
+def _index_options():
+    return {
+        "mode": getattr(settings, "RECOMMENDATION_INDEX_MODE", "auto"),
+        "ann_threshold": getattr(settings, "RECOMMENDATION_ANN_THRESHOLD", 50000),
+        "nprobe": getattr(settings, "RECOMMENDATION_ANN_NPROBE", 8),
+    }
+
+
+def _new_index():
+    return VectorIndex(**_index_options())
+
+
+def shared_matrix(name):
+    """
+    Returns the memory-mapped snapshot named `name` in
+    RECOMMENDATION_SHARED_MATRIX_DIR, or None when snapshots are disabled.
+    Settings are read on every call, so overriding them (e.g. in tests)
+    takes effect immediately; one SharedMatrix is kept per location.
+    """
+    directory = getattr(settings, "RECOMMENDATION_SHARED_MATRIX_DIR", None)
+    if not directory:
+        return None
+    dtype = getattr(settings, "RECOMMENDATION_SHARED_MATRIX_DTYPE", "float32")
+    key = (str(directory), name, dtype)
+    if key not in _shared_matrices:
+        _shared_matrices[key] = SharedMatrix(directory, name, dtype=dtype)
+    return _shared_matrices[key]
+
+
+# Per-process indexes, kept in sync incrementally with the embedding tables.
+# Used when the shared, memory-mapped snapshots below are disabled.
+team_index = _new_index()
+profile_index = _new_index()
+
+# Memory-mapped snapshots shared by all worker processes on the host,
+# created on first use by shared_matrix().
+_shared_matrices = {}  # (directory, name, dtype) -> SharedMatrix
+_shared_indexes = {}  # SharedMatrix -> (version, VectorIndex over the mapped matrix)
+
+# Lexical first stage: teams by `looking_for`, profiles by role + skill names.
+team_lexical_index = BM25Index()
+profile_lexical_index = BM25Index()
+
+
+def team_text(team):
+    """Text used to embed a team: what it is looking for plus its description."""
+    return (team.looking_for or "").lower() + " " + (team.description or "").lower()
+
+
+def profile_text(profile, skill_names):
+    """Text used to embed a profile: its role followed by its skill names."""
+    return (profile.role or "").lower() + " " + " ".join(
+        skill_name.lower() for skill_name in skill_names
+    )
+
+
+def content_hash(text):
+    """SHA-256 hex digest of the text an embedding was computed from."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def refresh_team_embeddings(teams, embedding_model):
+    """
+    Makes sure every team in `teams` has an up-to-date stored embedding.
+
+    `teams` should be fetched with `select_related("embedding")`. Only teams
+    without a stored embedding, or whose text changed since it was stored,
+    are embedded (in a single batch) and saved back.
+    """
+    texts = [team_text(team) for team in teams]
+    hashes = [content_hash(text) for text in texts]
+
+    stale, unchanged = [], []
+    for i, team in enumerate(teams):
+        stored = getattr(team, "embedding", None)
+        if stored is None or stored.content_hash != hashes[i]:
+            stale.append(i)
+        elif team.updated > stored.updated:
+            unchanged.append(stored.pk)
+
+    if unchanged:
+        # Edited, but not in its text: only mark the stored vector as current.
+        TeamEmbedding.objects.filter(pk__in=unchanged).update(updated=timezone.now())
+
+    if stale:
+        fresh = normalize(embedding_model.embed_documents([texts[i] for i in stale]))
+        to_create, to_update = [], []
+        for row, i in enumerate(stale):
+            team = teams[i]
+            stored = getattr(team, "embedding", None)
+            if stored is None:
+                stored = TeamEmbedding(team=team)
+                to_create.append(stored)
+            else:
+                to_update.append(stored)
+            stored.content_hash = hashes[i]
+            stored.vector = vector_to_bytes(fresh[row])
+            stored.updated = timezone.now()  # bulk_update skips auto_now
+            team.embedding = stored
+        if to_create:
+            TeamEmbedding.objects.bulk_create(to_create)
+        if to_update:
+            TeamEmbedding.objects.bulk_update(to_update, ["content_hash", "vector", "updated"])
+
+
+def mark_profile_stale(profile_id):
+    """Flags a profile's stored embedding for recomputation."""
+    ProfileEmbedding.objects.filter(user_profile_id=profile_id).update(stale=True)
+
+
+def refresh_profile_embeddings(profiles, embedding_model):
+    """
+    Makes sure every profile in `profiles` has a fresh stored embedding.
+
+    `profiles` should be fetched with `select_related("embedding")`. Profiles
+    without an embedding, or whose embedding is marked stale, have their
+    skills loaded in a single query and are re-embedded in one batch.
+    """
+    stale = [
+        i
+        for i, profile in enumerate(profiles)
+        if getattr(profile, "embedding", None) is None or profile.embedding.stale
+    ]
+
+    if stale:
+        stale_ids = [profiles[i].id for i in stale]
+        skills_by_profile = {profile_id: [] for profile_id in stale_ids}
+        for profile_id, skill_name in (
+            UserSkill.objects.filter(user_profile_id__in=stale_ids)
+            .order_by("id")
+            .values_list("user_profile_id", "skill_name")
+        ):
+            skills_by_profile[profile_id].append(skill_name)
+
+        texts = [profile_text(profiles[i], skills_by_profile[profiles[i].id]) for i in stale]
+        fresh = normalize(embedding_model.embed_documents(texts))
+        to_create, to_update = [], []
+        for row, i in enumerate(stale):
+            profile = profiles[i]
+            stored = getattr(profile, "embedding", None)
+            if stored is None:
+                stored = ProfileEmbedding(user_profile=profile)
+                to_create.append(stored)
+            else:
+                to_update.append(stored)
+            stored.vector = vector_to_bytes(fresh[row])
+            stored.text = texts[row]
+            stored.stale = False
+            stored.updated = timezone.now()
+            profile.embedding = stored
+        if to_create:
+            ProfileEmbedding.objects.bulk_create(to_create)
+        if to_update:
+            ProfileEmbedding.objects.bulk_update(to_update, ["vector", "text", "stale", "updated"])
+
+
+def _vectors_of(objects):
+    """
+    Stacks the stored vectors of `objects`. Querysets usually defer the
+    `vector` column; deferred ones are loaded in bulk rather than one by one.
+    """
+    embeddings = [obj.embedding for obj in objects]
+    deferred = [e.pk for e in embeddings if "vector" in e.get_deferred_fields()]
+    loaded = {}
+    if deferred:
+        model = type(embeddings[0])
+        for start in range(0, len(deferred), 900):
+            loaded.update(
+                model.objects.filter(pk__in=deferred[start:start + 900]).values_list("pk", "vector")
+            )
+    return np.vstack(
+        [vector_from_bytes(loaded[e.pk] if e.pk in loaded else e.vector) for e in embeddings]
+    )
+
+
+# index -> (state of its source table at its last sync, time of its last reconcile)
+_synced = {}
+
+# IDs per query when re-reading specific rows, well below SQLite's variable limit
+_ID_BATCH = 500
+
+
+def _sync_overlap():
+    return timedelta(seconds=getattr(settings, "RECOMMENDATION_SYNC_OVERLAP", 60))
+
+
+def _table_state(rows, now=None):
+    """
+    Row count and latest `updated` of `rows`, computed in the database, and
+    whether that latest stamp is settled. `updated` is stamped when a row is
+    saved, not when its transaction commits, so a row stamped before the
+    latest one may still become visible. Once the latest stamp is
+    RECOMMENDATION_SYNC_OVERLAP seconds old, every such row has committed;
+    the state changes when that happens, which forces one more read.
+    """
+    state = rows.aggregate(count=Count("pk"), latest=Max("updated"))
+    latest = state["latest"]
+    settled = latest is None or (now or timezone.now()) - latest >= _sync_overlap()
+    return state["count"], latest, settled
+
+
+def _remove_deleted(index, present_ids):
+    present = set(present_ids)
+    index.remove([object_id for object_id in index.ids() if object_id not in present])
+
+
+def _reconcile(index, rows, id_field, add_changed):
+    """Compares every row's `updated` with the index's version of it."""
+    current = dict(rows.values_list(id_field, "updated"))
+    changed = [object_id for object_id, updated in current.items() if index.version(object_id) != updated]
+    for start in range(0, len(changed), _ID_BATCH):
+        add_changed(rows.filter(**{f"{id_field}__in": changed[start : start + _ID_BATCH]}))
+    _remove_deleted(index, current)
+
+
+def _sync_changes(index, rows, id_field, add_changed):
+    """
+    Mirrors `rows`, a queryset with an indexed `updated` column, into
+    `index` without reading the whole table. The table state (see
+    `_table_state`) is compared with that of the last sync; if it moved,
+    only rows updated since RECOMMENDATION_SYNC_OVERLAP seconds before the
+    previous latest stamp are passed to `add_changed`, and IDs are listed
+    only when rows were deleted.
+
+    As a backstop for transactions that outlast the overlap, every
+    RECOMMENDATION_SYNC_RECONCILE seconds the version of every row is
+    compared with the index's, and rows that differ are re-read.
+    """
+    now = timezone.now()
+    state = _table_state(rows, now)
+    previous, reconciled = _synced.get(index, (None, None))
+    reconcile_every = timedelta(seconds=getattr(settings, "RECOMMENDATION_SYNC_RECONCILE", 600))
+    if previous is not None and now - reconciled >= reconcile_every:
+        _reconcile(index, rows, id_field, add_changed)
+        _synced[index] = (state, now)
+        return
+    if state == previous:
+        return
+    if previous is not None and previous[1] is not None:
+        add_changed(rows.filter(updated__gte=previous[1] - _sync_overlap()))
+    else:
+        add_changed(rows)
+        reconciled = now
+    # Every row is in the index now, so any surplus belongs to deleted ones.
+    if len(index) > state[0]:
+        _remove_deleted(index, rows.values_list(id_field, flat=True))
+    _synced[index] = (state, reconciled)
+
+
+def sync_index(index, embeddings, id_field):
+    """
+    Pushes new or re-embedded vectors from `embeddings` (a queryset of
+    `TeamEmbedding` or `ProfileEmbedding` rows, keyed by `id_field`) into
+    `index` and drops IDs that are no longer present.
+    """
+
+    def add_changed(changed):
+        rows = [
+            (object_id, vector, updated)
+            for object_id, vector, updated in changed.values_list(id_field, "vector", "updated")
+            if index.version(object_id) != updated
+        ]
+        if rows:
+            index.add(
+                [object_id for object_id, _, _ in rows],
+                np.vstack([vector_from_bytes(vector) for _, vector, _ in rows]),
+                versions=[updated for _, _, updated in rows],
+            )
+
+    _sync_changes(index, embeddings, id_field, add_changed)
+
+
+def _publish_snapshot(shared, version, embeddings, id_field):
+    rows = list(embeddings.order_by(id_field).values_list(id_field, "vector"))
+    if rows:
+        shared.publish(
+            version,
+            [object_id for object_id, _ in rows],
+            np.vstack([vector_from_bytes(vector) for _, vector in rows]),
+        )
+    else:
+        shared.publish(version, [], np.zeros((0, 1), dtype=np.float32))
+
+
+def shared_index(shared, embeddings, id_field, fallback):
+    """
+    Returns an index over the memory-mapped snapshot of `embeddings`'
+    vectors, publishing a new snapshot first if the current one is out of
+    date. Every worker maps the same file, so the matrix is resident only
+    once per host. Whether it is out of date is decided from the table
+    state (see `_table_state`), so a snapshot published while writes may
+    still be committing is published again once they have settled.
+
+    If no snapshot can be read even after republishing (e.g. the directory
+    was wiped underneath us), `fallback`, a per-process index, is synced and
+    returned instead so the request still gets an answer.
+    """
+    count, latest, settled = _table_state(embeddings)
+    version = f"{count}:{latest.isoformat()}:{'settled' if settled else 'pending'}" if count else "empty"
+    if shared.version() != version:
+        _publish_snapshot(shared, version, embeddings, id_field)
+
+    snapshot = shared.load()
+    if snapshot is None:
+        _publish_snapshot(shared, version, embeddings, id_field)
+        snapshot = shared.load()
+    if snapshot is None:
+        print(f"Shared matrix '{shared.name}' is unreadable; using the per-process index.")
+        sync_index(fallback, embeddings, id_field)
+        return fallback
+
+    cached = _shared_indexes.get(shared)
+    if cached is not None and cached[0] == snapshot[0]:
+        return cached[1]
+    snapshot_version, ids, matrix = snapshot
+    index = VectorIndex.from_matrix(ids, matrix, **_index_options())
+    _shared_indexes[shared] = (snapshot_version, index)
+    return index
+
+
+def get_team_index(embedding_model):
+    """
+    Refreshes stale team embeddings and returns an up-to-date team index.
+    Only teams without an embedding or edited since it was stored are read.
+    """
+    stale = Team.objects.filter(Q(embedding__isnull=True) | Q(updated__gt=F("embedding__updated")))
+    refresh_team_embeddings(list(stale.select_related("embedding")), embedding_model)
+    embeddings = TeamEmbedding.objects.all()
+    shared = shared_matrix("teams")
+    if shared is not None:
+        return shared_index(shared, embeddings, "team_id", fallback=team_index)
+    sync_index(team_index, embeddings, "team_id")
+    return team_index
+
+
+def get_team_vectors(teams, embedding_model):
+    """Refreshes stale team embeddings and returns them as a (len(teams), dim) matrix."""
+    refresh_team_embeddings(teams, embedding_model)
+    return _vectors_of(teams)
+
+
+def get_profile_index(embedding_model):
+    """
+    Refreshes stale profile embeddings and returns an up-to-date profile
+    index. Only profiles without an embedding or marked stale are read.
+    """
+    stale = UserProfile.objects.filter(Q(embedding__isnull=True) | Q(embedding__stale=True))
+    refresh_profile_embeddings(list(stale.select_related("embedding")), embedding_model)
+    embeddings = ProfileEmbedding.objects.filter(vector__isnull=False)
+    shared = shared_matrix("profiles")
+    if shared is not None:
+        return shared_index(shared, embeddings, "user_profile_id", fallback=profile_index)
+    sync_index(profile_index, embeddings, "user_profile_id")
+    return profile_index
+
+
+def _sync_lexical(index, rows, id_field, text_field):
+    def add_changed(changed):
+        for doc_id, text, updated in changed.values_list(id_field, text_field, "updated"):
+            if index.version(doc_id) != updated:
+                index.add(doc_id, tokenize(text), version=updated)
+
+    _sync_changes(index, rows, id_field, add_changed)
+
+
+def get_team_lexical_index():
+    """Syncs and returns the BM25 index over the teams' `looking_for` field."""
+    _sync_lexical(team_lexical_index, Team.objects.all(), "id", "looking_for")
+    return team_lexical_index
+
+
+def get_profile_lexical_index():
+    """
+    Syncs and returns the BM25 index over profile role + skill names. Call it
+    after `get_profile_index`, which stores that text.
+    """
+    _sync_lexical(profile_lexical_index, ProfileEmbedding.objects.all(), "user_profile_id", "text")
+    return profile_lexical_index
+
+
+def hybrid_rank_many(index, lexical_index, query_vectors, query_texts, k=5):
+    """
+    Two-stage ranking, one result list of (object id, score) per query.
+
+    Stage one shortlists candidates that share a skill/role token with the
+    query, by BM25. Stage two scores only the shortlisted vectors (all
+    queries at once over the union of the shortlists) and blends cosine
+    similarity with the max-normalized BM25 score. A query with fewer than
+    `k` lexical matches is topped up from a dense search over every candidate.
+    """
+    shortlist_size = getattr(settings, "RECOMMENDATION_SHORTLIST_SIZE", 300)
+    dense_weight = getattr(settings, "RECOMMENDATION_DENSE_WEIGHT", 0.7)
+    lexical_weight = getattr(settings, "RECOMMENDATION_LEXICAL_WEIGHT", 0.3)
+
+    query_vectors = normalize(np.atleast_2d(query_vectors))
+    shortlists = [
+        [(object_id, score) for object_id, score in lexical_index.search(tokenize(text), shortlist_size)
+         if object_id in index]
+        for text in query_texts
+    ]
+    union = sorted({object_id for shortlist in shortlists for object_id, _ in shortlist})
+    dense = index.score_ids(union, query_vectors) if union else None
+    position = {object_id: row for row, object_id in enumerate(union)}
+
+    results = []
+    for column, (query_vector, shortlist) in enumerate(zip(query_vectors, shortlists)):
+        if not shortlist:
+            results.append(index.search(query_vector, k))
+            continue
+        dense_scores = dense[[position[object_id] for object_id, _ in shortlist], column]
+        lexical_scores = np.array([score for _, score in shortlist], dtype=np.float32)
+        lexical_scores /= lexical_scores.max() or 1.0
+        blended = dense_weight * dense_scores + lexical_weight * lexical_scores
+        ranked = [(shortlist[i][0], float(blended[i])) for i in top_k(blended, k)]
+        if len(ranked) < k:
+            # Too few keyword matches: top up with the best dense-only candidates.
+            seen = {object_id for object_id, _ in ranked}
+            extra = [
+                (object_id, dense_weight * score)
+                for object_id, score in index.search(query_vector, k + len(ranked))
+                if object_id not in seen
+            ]
+            ranked += extra[: k - len(ranked)]
+        results.append(ranked)
+    return results
+
+
+def hybrid_enabled():
+    return getattr(settings, "RECOMMENDATION_HYBRID", True)
+
+
+def rank_many(index, lexical_index, query_vectors, query_texts, k=5):
+    """Hybrid ranking when a lexical index is given, plain dense search otherwise."""
+    if lexical_index is None:
+        return index.search_many(query_vectors, k)
+    return hybrid_rank_many(index, lexical_index, query_vectors, query_texts, k)
+
+
+def rank(index, lexical_index, query_vector, query_text, k=5):
+    return rank_many(index, lexical_index, [query_vector], [query_text], k)[0]
+
+
+def rank_filtered(index, lexical_index, query_vector, query_text, k, keep_ids):
+    """
+    `rank` restricted to the IDs that `keep_ids(candidate_ids)` returns.
+
+    Rather than scoring an explicit allow-list, which would mean listing
+    and gathering every allowed row on each request, RECOMMENDATION_OVERFETCH
+    times `k` results are ranked as usual (the ANN path included) and then
+    filtered. If fewer than `k` survive, the fetch is widened until the
+    index is exhausted.
+    """
+    fetch = k * getattr(settings, "RECOMMENDATION_OVERFETCH", 4)
+    while True:
+        ranked = rank(index, lexical_index, query_vector, query_text, k=fetch)
+        kept = keep_ids([object_id for object_id, _ in ranked])
+        results = [(object_id, score) for object_id, score in ranked if object_id in kept]
+        if len(results) >= k or len(ranked) < fetch or fetch >= len(index):
+            return results[:k]
+        fetch *= 4
+
+
+def eligible_teams_for(user, include_private=False):
+    """
+    Teams `user` could join: not full, not already a member or the admin,
+    and public unless `include_private`.
+    """
+    teams = (
+        Team.objects.annotate(member_count=Count("members", distinct=True))
+        .filter(member_count__lt=F("members_limit"))
+        .exclude(members=user)
+        .exclude(admin=user)
+    )
+    if not include_private:
+        teams = teams.filter(team_type="PUBLIC")
+    return teams
+
+
+def eligible_team_ids(user, team_ids, include_private=False):
+    """The subset of `team_ids` that `user` could join, checked in the database."""
+    teams = eligible_teams_for(user, include_private)
+    eligible = set()
+    for start in range(0, len(team_ids), _ID_BATCH):
+        eligible.update(teams.filter(id__in=team_ids[start : start + _ID_BATCH]).values_list("id", flat=True))
+    return eligible
+
+
+def encode_cursor(offset):
+    """Opaque cursor for the next page of a cached ranking."""
+    return base64.urlsafe_b64encode(json.dumps({"offset": offset}).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Returns the offset stored in `cursor`; raises ValueError if it is malformed."""
+    if not cursor:
+        return 0
+    try:
+        offset = json.loads(base64.urlsafe_b64decode(cursor.encode()))["offset"]
+    except (TypeError, KeyError, binascii.Error, UnicodeError, json.JSONDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(offset, int) or offset < 0:
+        raise ValueError("Invalid cursor")
+    return offset
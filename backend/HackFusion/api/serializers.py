@@ -11,6 +11,8 @@ from .models import (
     UserProject,
     UploadedPDF,
 )
+from .recommendation_cache import bump_epoch
+from .recommendations import mark_profile_stale
 
 class CreateJoinRequestSerializer(serializers.ModelSerializer):
     """
@@ -127,6 +129,9 @@ class UserProfileSerializer(serializers.ModelSerializer):
                     )
                 )
             UserSkill.objects.bulk_create(skills)
+            # bulk_create bypasses the UserSkill signals
+            mark_profile_stale(instance.id)
+            bump_epoch()
 
         return instance
 
@@ -223,7 +228,7 @@ class PDFSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = UploadedPDF
-        fields = ["id", "filename", "url", "uploaded_at"]
+        fields = ["id", "filename", "url", "uploaded_at", "ingested_at"]
 
     def get_url(self, obj):
         request = self.context.get('request')
@@ -0,0 +1,110 @@
+# api/shared_matrix.py
+
+import json
+import os
+import threading
+import uuid
+
+import numpy as np
+
+from .file_lock import file_lock
+
+
+class SharedMatrix:
+    """
+    A float16/float32 matrix plus an ID sidecar, shared read-only between
+    worker processes through memory-mapped `.npy` files.
+
+    Each publish writes a new pair of files and then atomically swaps a small
+    JSON manifest to point at them, so readers always see a complete
+    snapshot. Pages of the mapped files live once in the OS page cache no
+    matter how many workers map them.
+    """
+
+    def __init__(self, directory, name, dtype="float32"):
+        self.directory = str(directory)
+        self.name = name
+        self.dtype = np.dtype(dtype)
+        self._manifest_path = os.path.join(self.directory, f"{name}.json")
+        self._lock_path = os.path.join(self.directory, f"{name}.lock")
+        self._loaded = None  # (version, ids, matrix)
+        self._lock = threading.Lock()
+
+    def _read_manifest(self):
+        try:
+            with open(self._manifest_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def version(self):
+        manifest = self._read_manifest()
+        return manifest["version"] if manifest else None
+
+    def publish(self, version, ids, matrix):
+        """
+        Writes a new snapshot and makes it current with an atomic rename.
+        Publishers on the host take turns under a file lock, and a publish
+        that finds `version` already current (because another worker got
+        there first) writes nothing.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with file_lock(self._lock_path):
+            previous = self._read_manifest()
+            if previous is not None and previous["version"] == version:
+                return
+            stem = f"{self.name}.{uuid.uuid4().hex}"
+            matrix_file, ids_file = f"{stem}.npy", f"{stem}.ids.npy"
+            np.save(os.path.join(self.directory, matrix_file), np.asarray(matrix, dtype=self.dtype))
+            np.save(os.path.join(self.directory, ids_file), np.asarray(ids, dtype=np.int64))
+
+            tmp_manifest = os.path.join(self.directory, f"{stem}.json.tmp")
+            with open(tmp_manifest, "w") as f:
+                json.dump({"version": version, "matrix": matrix_file, "ids": ids_file}, f)
+            os.replace(tmp_manifest, self._manifest_path)
+            self._remove_stale_files(previous, keep={matrix_file, ids_file})
+
+    def _remove_stale_files(self, previous, keep):
+        # Only snapshots older than the one just replaced go: a reader that
+        # read the previous manifest a moment ago may still be opening its
+        # files. Workers that already mapped an old snapshot keep a valid
+        # mapping after the unlink; new readers only ever follow the manifest.
+        if previous is None:
+            return
+        keep = keep | {previous["matrix"], previous["ids"]}
+        try:
+            cutoff = os.path.getmtime(os.path.join(self.directory, previous["matrix"]))
+        except FileNotFoundError:
+            return
+        prefix = f"{self.name}."
+        for filename in os.listdir(self.directory):
+            if not filename.startswith(prefix) or not filename.endswith(".npy") or filename in keep:
+                continue
+            path = os.path.join(self.directory, filename)
+            try:
+                if os.path.getmtime(path) <= cutoff:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def load(self):
+        """
+        Returns (version, ids, matrix) of the current snapshot, memory-mapped
+        read-only, or None if nothing was published yet. The mapping is reused
+        until the manifest points to a newer snapshot.
+        """
+        for _ in range(3):
+            manifest = self._read_manifest()
+            if manifest is None:
+                return None
+            with self._lock:
+                if self._loaded is not None and self._loaded[0] == manifest["version"]:
+                    return self._loaded
+                try:
+                    matrix = np.load(os.path.join(self.directory, manifest["matrix"]), mmap_mode="r")
+                    ids = np.load(os.path.join(self.directory, manifest["ids"]), mmap_mode="r")
+                except FileNotFoundError:
+                    continue  # Swapped out by a concurrent publish, re-read the manifest
+                self._loaded = (manifest["version"], ids, matrix)
+                return self._loaded
+        return None
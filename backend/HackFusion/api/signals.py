@@ -0,0 +1,69 @@
+# api/signals.py
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import answer_cache
+from .models import Team, UploadedPDF, UserProfile, UserSkill
+from .recommendation_cache import bump_epoch
+from .recommendations import mark_profile_stale
+
+
+@receiver(post_save, sender=UserSkill)
+@receiver(post_delete, sender=UserSkill)
+def invalidate_profile_embedding_on_skill_change(sender, instance, **kwargs):
+    """Any skill created, edited or removed changes the profile's text."""
+    mark_profile_stale(instance.user_profile_id)
+
+
+@receiver(pre_save, sender=UserProfile)
+def invalidate_profile_embedding_on_role_change(sender, instance, **kwargs):
+    """Only a change of `role` affects the embedding, other profile edits don't."""
+    if instance.pk is None:
+        return
+    old_role = (
+        UserProfile.objects.filter(pk=instance.pk).values_list("role", flat=True).first()
+    )
+    if old_role != instance.role:
+        mark_profile_stale(instance.pk)
+
+
+@receiver(post_save, sender=Team)
+@receiver(post_delete, sender=Team)
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+@receiver(post_save, sender=UserSkill)
+@receiver(post_delete, sender=UserSkill)
+def invalidate_recommendations(sender, **kwargs):
+    """Teams, profiles and skills feed every recommendation: start a new epoch."""
+    bump_epoch()
+
+
+@receiver(m2m_changed, sender=Team.members.through)
+@receiver(m2m_changed, sender=UserProfile.teams.through)
+def invalidate_recommendations_on_membership_change(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        bump_epoch()
+
+
+@receiver(post_save, sender=UploadedPDF)
+@receiver(post_delete, sender=UploadedPDF)
+def invalidate_answers_on_pdf_change(sender, instance, **kwargs):
+    """Cached answers of a session only hold for the PDF set they were given on."""
+    if kwargs.get("created") is False:
+        return  # An edit of an existing row (e.g. its hash) doesn't change the set
+    if instance.session_id is not None:
+        answer_cache.invalidate(instance.session_id)
+
+
+@receiver(post_delete, sender=UploadedPDF)
+def remove_vectors_on_pdf_delete(sender, instance, **kwargs):
+    """Only the deleted file's vectors leave the namespace; the others stay indexed."""
+    if instance.session_id is not None and instance.vector_ids:
+        # Imported here: the RAG pipeline pulls in LangChain and torch, which
+        # every process would otherwise load at startup.
+        from .rag_pipeline import remove_pdf_vectors
+
+        session_id, vector_ids = instance.session_id, list(instance.vector_ids)
+        transaction.on_commit(lambda: remove_pdf_vectors(session_id, vector_ids))
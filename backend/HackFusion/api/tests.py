@@ -1,3 +1,1495 @@
-from django.test import TestCase
+import importlib.util
+import itertools
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+import zlib
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from langchain_core.documents import Document
+from rest_framework.test import APIClient
+
+from . import (
+    answer_cache,
+    chain_cache,
+    embeddings,
+    ingestion,
+    metrics,
+    pdf_parsing,
+    rag_pipeline,
+    recommendation_cache,
+    recommendations,
+    views,
+)
+from .chain_cache import ChainCache
+from .chunk_store import ChunkSetWriter, has_chunk_set, iter_chunk_set
+from .embedding_executor import BatchingEmbedder
+from .embeddings import MODEL_NAME, build_base_model
+from .management.commands.bench_ingest_memory import write_synthetic_pdf
+from .management.commands.compare_embedding_backends import SAMPLE_TEXTS
+from .lexical_index import BM25Index, tokenize
+from .models import ChatSession, ProfileEmbedding, Team, TeamEmbedding, UploadedPDF, UserProfile, UserSkill
+from .recommendations import decode_cursor, encode_cursor
+from .serializers import UserProfileSerializer
+from .shared_matrix import SharedMatrix
+from .vector_index import VectorIndex
+from .vector_stores import BatchUpserter, LocalVectorBackend
+from .vector_utils import normalize, vector_to_bytes
+
+
+def _embedding_model_cached():
+    """Whether both embedding backends can load MODEL_NAME without a download."""
+    if not all(importlib.util.find_spec(name) for name in ("sentence_transformers", "onnxruntime", "optimum")):
+        return False
+    from huggingface_hub import try_to_load_from_cache
+
+    return isinstance(try_to_load_from_cache(MODEL_NAME, "config.json"), str)
+
+
+@unittest.skipUnless(_embedding_model_cached(), f"{MODEL_NAME} is not in the local Hugging Face cache")
+class EmbeddingBackendParityTests(SimpleTestCase):
+    def test_onnx_vectors_match_torch(self):
+        with tempfile.TemporaryDirectory() as onnx_dir, override_settings(EMBEDDING_ONNX_DIR=onnx_dir):
+            torch_model, _ = build_base_model("torch")
+            for quantize, min_cosine in ((False, 0.999), (True, 0.98)):
+                onnx_model, cache_name = build_base_model("onnx", quantize=quantize)
+                self.assertEqual(cache_name.endswith("-int8"), quantize)
+                reference = normalize(torch_model.embed_documents(SAMPLE_TEXTS))
+                candidate = normalize(onnx_model.embed_documents(SAMPLE_TEXTS))
+                self.assertGreaterEqual(np.sum(reference * candidate, axis=1).min(), min_cosine)
+
+
+class FakeEmbeddings:
+    """Deterministic vectors derived from each text, with no model to load."""
+
+    model_name = "fake-embeddings"
+
+    def __init__(self):
+        self.embedded = 0
+
+    def embed_documents(self, texts):
+        self.embedded += len(texts)
+        return [np.random.default_rng(zlib.crc32(text.encode())).standard_normal(16).tolist() for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class KeywordEmbeddings(FakeEmbeddings):
+    """Bag-of-words vectors, so texts sharing words are similar as with a real model."""
+
+    def embed_documents(self, texts):
+        self.embedded += len(texts)
+        vectors = []
+        for text in texts:
+            vector = np.zeros(256)
+            for token in text.lower().split():
+                vector += np.random.default_rng(zlib.crc32(token.encode())).standard_normal(256)
+            vectors.append(vector.tolist())
+        return vectors
+
+
+TEST_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "recommendations": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "recommendations-tests",
+    },
+}
+
+
+@override_settings(
+    CACHES=TEST_CACHES,
+    RECOMMENDATION_SHARED_MATRIX_DIR=None,
+    PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+)
+class RecommendationTestCase(TestCase):
+    """Fresh per-process indexes and caches, and keyword embeddings instead of the model."""
+
+    def setUp(self):
+        caches["recommendations"].clear()
+        self.model = KeywordEmbeddings()
+        patches = (
+            mock.patch.object(embeddings, "_embedding_model", self.model),
+            mock.patch.object(recommendations, "team_index", recommendations._new_index()),
+            mock.patch.object(recommendations, "profile_index", recommendations._new_index()),
+            mock.patch.object(recommendations, "team_lexical_index", BM25Index()),
+            mock.patch.object(recommendations, "profile_lexical_index", BM25Index()),
+            mock.patch.dict(recommendations._synced, clear=True),
+        )
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.client = APIClient()
+
+    def make_user(self, username, role="", skills=()):
+        user = User.objects.create_user(username, password="secret")
+        profile = UserProfile.objects.create(user=user, full_name=username, role=role)
+        for skill_name in skills:
+            UserSkill.objects.create(user_profile=profile, skill_name=skill_name)
+        return user
+
+    def make_team(self, name, looking_for, description="", admin=None, **fields):
+        return Team.objects.create(
+            name=name,
+            admin=admin or self.make_user(f"{name.lower()}-admin"),
+            looking_for=looking_for,
+            description=description,
+            **fields,
+        )
+
+
+class IngestionTests(TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.temp_dir = temp_dir.name
+        settings_override = override_settings(
+            MEDIA_ROOT=os.path.join(self.temp_dir, "media"),
+            PDF_PARSE_WORKERS=1,
+            INGEST_BATCH_SIZE=8,
+            INGEST_UPSERT_RETRY_DELAY=0,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.model = FakeEmbeddings()
+        self.backend = LocalVectorBackend(os.path.join(self.temp_dir, "vectors"))
+        patches = (
+            mock.patch.object(embeddings, "_embedding_model", self.model),
+            mock.patch.dict(rag_pipeline._clients, {"vector_backend": self.backend}),
+        )
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.session = ChatSession.objects.create()
+        self.namespace = str(self.session.id)
+
+    def add_pdf(self, seed, pages=2):
+        path = os.path.join(self.temp_dir, f"source-{seed}.pdf")
+        write_synthetic_pdf(path, pages, lines_per_page=20, seed=seed)
+        with open(path, "rb") as f:
+            upload = SimpleUploadedFile(f"doc-{seed}.pdf", f.read(), content_type="application/pdf")
+        return UploadedPDF.objects.create(session=self.session, file=upload)
+
+    def ingest(self):
+        rag_pipeline.process_pdfs_for_session(self.namespace)
+        self.session.refresh_from_db()
+
+    def test_each_file_gets_its_own_manifest(self):
+        pdfs = [self.add_pdf(seed) for seed in (1, 2)]
+        self.ingest()
+
+        total = 0
+        for pdf in pdfs:
+            pdf.refresh_from_db()
+            self.assertIsNotNone(pdf.ingested_at)
+            self.assertTrue(pdf.vector_ids)
+            self.assertEqual(pdf.vector_ids, [f"{pdf.id}:{n}" for n in range(len(pdf.vector_ids))])
+            self.assertEqual(pdf.chunk_ids, [f"{pdf.sha256}:{n}" for n in range(len(pdf.vector_ids))])
+            total += len(pdf.vector_ids)
+        self.assertEqual(self.session.vector_count, total)
+        self.assertEqual(self.session.chunk_count, total)
+        self.assertEqual(self.backend.vector_count(self.namespace), total)
+
+    def test_added_file_is_ingested_alone(self):
+        first = self.add_pdf(1)
+        self.ingest()
+        first.refresh_from_db()
+        manifest, embedded = list(first.vector_ids), self.model.embedded
+
+        second = self.add_pdf(2)
+        self.ingest()
+        first.refresh_from_db()
+        second.refresh_from_db()
+
+        self.assertEqual(first.vector_ids, manifest)
+        self.assertEqual(self.model.embedded - embedded, len(second.vector_ids))
+        self.assertEqual(self.session.vector_count, len(manifest) + len(second.vector_ids))
+        self.assertEqual(self.backend.vector_count(self.namespace), self.session.vector_count)
+
+    def test_known_file_is_copied_from_the_chunk_store(self):
+        self.add_pdf(1)
+        self.ingest()
+        embedded = self.model.embedded
+
+        copy = self.add_pdf(1)
+        self.ingest()
+        copy.refresh_from_db()
+
+        self.assertEqual(self.model.embedded, embedded)
+        self.assertTrue(copy.vector_ids)
+        self.assertEqual(self.backend.vector_count(self.namespace), self.session.vector_count)
+
+    def test_deleting_a_file_removes_only_its_vectors(self):
+        kept, deleted = self.add_pdf(1), self.add_pdf(2)
+        self.ingest()
+        kept.refresh_from_db()
+        deleted.refresh_from_db()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            deleted.delete()
+        self.session.refresh_from_db()
+
+        self.assertEqual(self.backend.fetch_ids(self.namespace, deleted.vector_ids), set())
+        self.assertEqual(self.backend.fetch_ids(self.namespace, kept.vector_ids), set(kept.vector_ids))
+        self.assertEqual(self.session.vector_count, len(kept.vector_ids))
+
+    def test_file_deleted_during_ingestion_leaves_no_vectors(self):
+        kept = self.add_pdf(1)
+        self.ingest()
+        kept.refresh_from_db()
+        doomed = self.add_pdf(2)
+
+        fetch_ids = self.backend.fetch_ids
+
+        def delete_then_fetch(namespace, ids):
+            UploadedPDF.objects.filter(id=doomed.id).delete()
+            return fetch_ids(namespace, ids)
+
+        with mock.patch.object(self.backend, "fetch_ids", delete_then_fetch):
+            self.ingest()
+
+        self.assertEqual(self.backend.vector_count(self.namespace), len(kept.vector_ids))
+        self.assertEqual(self.session.vector_count, len(kept.vector_ids))
+
+
+class PdfParsingTests(SimpleTestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.paths = []
+        for seed, pages in ((1, 5), (2, 2)):
+            path = os.path.join(temp_dir.name, f"doc-{seed}.pdf")
+            write_synthetic_pdf(path, pages, lines_per_page=20, seed=seed)
+            self.paths.append(path)
+
+    @staticmethod
+    def contents(chunks):
+        return [(chunk.metadata["source"], chunk.metadata["page"], chunk.page_content) for chunk in chunks]
+
+    def test_tasks_cover_every_page_in_order(self):
+        self.assertEqual(
+            pdf_parsing.plan_tasks(self.paths, 2),
+            [(self.paths[0], 0, 2), (self.paths[0], 2, 4), (self.paths[0], 4, 5), (self.paths[1], 0, 2)],
+        )
+
+    def test_page_ranges_chunk_like_the_whole_file(self):
+        whole = pdf_parsing.parse_page_range(self.paths[0], 0, 5, 500, 50)
+        ranges = [pdf_parsing.parse_page_range(*task, 500, 50) for task in pdf_parsing.plan_tasks(self.paths[:1], 2)]
+        self.assertEqual(self.contents(itertools.chain(*ranges)), self.contents(whole))
+        self.assertEqual({chunk.metadata["total_pages"] for chunk in whole}, {5})
+        self.assertEqual(sorted({chunk.metadata["page"] for chunk in whole}), list(range(5)))
+
+    def test_worker_pool_yields_tasks_in_order(self):
+        tasks = pdf_parsing.plan_tasks(self.paths, 1)
+        inline = list(pdf_parsing.parse_tasks(tasks, max_workers=1))
+        pooled = list(pdf_parsing.parse_tasks(tasks, max_workers=2))
+        self.assertEqual(len(pooled), len(tasks))
+        self.assertEqual([self.contents(chunks) for chunks in pooled], [self.contents(chunks) for chunks in inline])
+
+
+class ChunkSetWriterTests(TestCase):
+    key = ("0" * 64, 500, 50, "fake-embeddings")
+
+    def write(self, batch_sizes):
+        writer = ChunkSetWriter(*self.key)
+        position = 0
+        for size in batch_sizes:
+            chunks = [{"text": f"chunk {position + n}", "metadata": {}} for n in range(size)]
+            vectors = np.arange(position, position + size, dtype=np.float32)[:, None].repeat(3, axis=1)
+            writer.add(chunks, vectors)
+            position += size
+        self.assertFalse(has_chunk_set(*self.key))
+        writer.close()
+        return position
+
+    @mock.patch("api.chunk_store.PART_SIZE", 4)
+    def test_batches_are_regrouped_into_fixed_parts(self):
+        total = self.write([3, 5, 2])
+
+        parts = list(iter_chunk_set(*self.key))
+        self.assertTrue(has_chunk_set(*self.key))
+        self.assertEqual([len(chunks) for chunks, _ in parts], [4, 4, 2])
+        texts = [chunk["text"] for chunks, _ in parts for chunk in chunks]
+        self.assertEqual(texts, [f"chunk {n}" for n in range(total)])
+        vectors = np.vstack([vectors for _, vectors in parts])
+        np.testing.assert_array_equal(vectors[:, 0], np.arange(total, dtype=np.float32))
+
+    @mock.patch("api.chunk_store.PART_SIZE", 4)
+    def test_exact_multiple_keeps_the_last_part_non_empty(self):
+        self.write([8])
+        self.assertEqual([len(chunks) for chunks, _ in iter_chunk_set(*self.key)], [4, 4])
+
+    def test_file_without_text_is_stored_as_an_empty_set(self):
+        self.write([])
+        self.assertTrue(has_chunk_set(*self.key))
+        self.assertEqual([len(chunks) for chunks, _ in iter_chunk_set(*self.key)], [0])
+
+
+class FlakyBackend:
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+        self.stored = []
+
+    def upsert(self, namespace, ids, vectors, texts, metadatas):
+        self.calls += 1
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("backend unavailable")
+        self.stored.extend(ids)
+
+
+class BatchUpserterTests(SimpleTestCase):
+    def submit_batches(self, backend, retries):
+        with BatchUpserter(backend, "ns", concurrency=2, retries=retries, retry_delay=0) as upserter:
+            for start in range(0, 6, 2):
+                ids = [str(start), str(start + 1)]
+                upserter.submit(ids, np.zeros((2, 3)), ["text"] * 2, [{}] * 2)
+        return upserter
+
+    def test_failed_batches_are_retried(self):
+        backend = FlakyBackend(failures=2)
+        upserter = self.submit_batches(backend, retries=3)
+        self.assertEqual(sorted(backend.stored), [str(n) for n in range(6)])
+        self.assertEqual(upserter.retried, 2)
+        self.assertEqual(backend.calls, 5)
+
+    def test_last_failure_is_raised(self):
+        backend = FlakyBackend(failures=100)
+        with self.assertRaises(ConnectionError):
+            self.submit_batches(backend, retries=2)
+        self.assertEqual(backend.stored, [])
+
+
+class CursorTests(SimpleTestCase):
+    def test_round_trip(self):
+        for offset in (0, 5, 1000):
+            self.assertEqual(decode_cursor(encode_cursor(offset)), offset)
+
+    def test_no_cursor_starts_at_zero(self):
+        self.assertEqual(decode_cursor(None), 0)
+        self.assertEqual(decode_cursor(""), 0)
+
+    def test_malformed_cursors_are_rejected(self):
+        for cursor in ("not base64!", "e30=", encode_cursor(-1), encode_cursor("5"), "bnVsbA=="):
+            with self.subTest(cursor=cursor), self.assertRaises(ValueError):
+                decode_cursor(cursor)
+
+
+class SharedMatrixTests(SimpleTestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.directory = temp_dir.name
+
+    def matrix_files(self):
+        return sorted(name for name in os.listdir(self.directory) if name.endswith(".npy"))
+
+    def test_nothing_published(self):
+        self.assertIsNone(SharedMatrix(self.directory, "teams").load())
+
+    def test_publish_and_load(self):
+        shared = SharedMatrix(self.directory, "teams")
+        matrix = np.arange(6, dtype=np.float32).reshape(3, 2)
+        shared.publish("v1", [7, 8, 9], matrix)
+
+        version, ids, loaded = SharedMatrix(self.directory, "teams").load()
+        self.assertEqual(version, "v1")
+        self.assertEqual(list(ids), [7, 8, 9])
+        np.testing.assert_array_equal(loaded, matrix)
+        self.assertFalse(loaded.flags.writeable)
+
+    def test_current_version_is_not_written_again(self):
+        shared = SharedMatrix(self.directory, "teams")
+        shared.publish("v1", [1], np.ones((1, 2)))
+        files = self.matrix_files()
+        shared.publish("v1", [1], np.ones((1, 2)))
+        self.assertEqual(self.matrix_files(), files)
+
+    def test_previous_snapshot_is_kept_and_older_ones_removed(self):
+        shared = SharedMatrix(self.directory, "teams")
+        for version in ("v1", "v2", "v3"):
+            shared.publish(version, [1], np.ones((1, 2)))
+        # Matrix and IDs of v3 and v2 only.
+        self.assertEqual(len(self.matrix_files()), 4)
+        self.assertEqual(shared.load()[0], "v3")
+
+    def test_concurrent_publishes_leave_a_loadable_snapshot(self):
+        errors = []
+
+        def publish_and_load(worker):
+            try:
+                shared = SharedMatrix(self.directory, "teams")
+                for n in range(20):
+                    shared.publish(f"{worker}-{n}", [worker], np.full((1, 4), worker, dtype=np.float32))
+                    if SharedMatrix(self.directory, "teams").load() is None:
+                        errors.append(f"no snapshot after {worker}-{n}")
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=publish_and_load, args=(worker,)) for worker in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        version, ids, matrix = SharedMatrix(self.directory, "teams").load()
+        self.assertEqual(matrix[0, 0], ids[0])
+
+
+class SharedIndexTests(RecommendationTestCase):
+    def setUp(self):
+        super().setUp()
+        admin = User.objects.create_user("admin", password="secret")
+        self.team = Team.objects.create(name="Pixel", admin=admin, description="react app", looking_for="designer")
+
+    def test_snapshot_follows_overridden_directory(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(RECOMMENDATION_SHARED_MATRIX_DIR=directory):
+            index = recommendations.get_team_index(FakeEmbeddings())
+            self.assertEqual(recommendations.shared_matrix("teams").directory, directory)
+            self.assertTrue(os.path.exists(os.path.join(directory, "teams.json")))
+            self.assertIn(self.team.id, index)
+
+    def test_disabled_snapshots_use_the_process_index(self):
+        with override_settings(RECOMMENDATION_SHARED_MATRIX_DIR=None):
+            self.assertIsNone(recommendations.shared_matrix("teams"))
+            index = recommendations.get_team_index(FakeEmbeddings())
+        self.assertIs(index, recommendations.team_index)
+        self.assertIn(self.team.id, index)
+
+
+class IndexSyncTests(RecommendationTestCase):
+    def setUp(self):
+        super().setUp()
+        admin = User.objects.create_user("admin", password="secret")
+        self.embeddings = []
+        for n in range(3):
+            team = Team.objects.create(name=f"Team {n}", admin=admin, description="app", looking_for="designer")
+            self.embeddings.append(
+                TeamEmbedding.objects.create(team=team, content_hash="", vector=vector_to_bytes(np.ones(4)))
+            )
+        self.index = recommendations._new_index()
+
+    def sync(self, now=None):
+        with mock.patch.object(recommendations.timezone, "now", return_value=now or timezone.now()):
+            recommendations.sync_index(self.index, TeamEmbedding.objects.all(), "team_id")
+
+    def backdate(self, embedding, updated):
+        """A save whose transaction committed after rows stamped later than it."""
+        TeamEmbedding.objects.filter(pk=embedding.pk).update(vector=vector_to_bytes(np.full(4, 2.0)), updated=updated)
+        return updated
+
+    def test_late_commit_is_read_once_the_state_settles(self):
+        self.sync()
+        latest = max(embedding.updated for embedding in self.embeddings)
+        updated = self.backdate(self.embeddings[0], latest - timedelta(seconds=1))
+
+        self.sync()  # Same count and latest stamp as before
+        self.assertNotEqual(self.index.version(self.embeddings[0].team_id), updated)
+        self.sync(now=latest + timedelta(seconds=61))
+        self.assertEqual(self.index.version(self.embeddings[0].team_id), updated)
+
+    @override_settings(RECOMMENDATION_SYNC_RECONCILE=600)
+    def test_reconcile_catches_changes_older_than_the_overlap(self):
+        start = timezone.now()
+        self.sync(now=start)
+        self.sync(now=start + timedelta(seconds=120))
+        updated = self.backdate(self.embeddings[1], start - timedelta(hours=1))
+
+        self.sync(now=start + timedelta(seconds=300))
+        self.assertNotEqual(self.index.version(self.embeddings[1].team_id), updated)
+        self.sync(now=start + timedelta(seconds=601))
+        self.assertEqual(self.index.version(self.embeddings[1].team_id), updated)
+
+    def test_deleted_rows_leave_the_index(self):
+        self.sync()
+        self.embeddings[2].team.delete()
+        self.sync()
+        self.assertEqual(sorted(self.index.ids()), sorted(e.team_id for e in self.embeddings[:2]))
+
+
+class DiskEmbeddingCacheTests(SimpleTestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.path = os.path.join(temp_dir.name, "embeddings.sqlite3")
+        clock = mock.patch.object(embeddings.time, "time", side_effect=itertools.count())
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def test_least_recently_used_entries_are_pruned(self):
+        cache = embeddings.DiskEmbeddingCache(self.path, max_entries=3)
+        cache.set_many([("a", [1.0]), ("b", [2.0]), ("c", [3.0])])
+        cache.get_many(["a"])
+        cache.set_many([("d", [4.0])])
+        self.assertEqual(sorted(cache.get_many(["a", "b", "c", "d"])), ["a", "c", "d"])
+
+    def test_cache_file_without_last_used_is_upgraded(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute("CREATE TABLE embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        conn.execute("INSERT INTO embeddings VALUES ('old', ?)", (np.ones(2, dtype=np.float32).tobytes(),))
+        conn.commit()
+        conn.close()
+
+        cache = embeddings.DiskEmbeddingCache(self.path, max_entries=1)
+        np.testing.assert_array_equal(cache.get_many(["old"])["old"], np.ones(2))
+        cache.set_many([("new", [2.0, 2.0])])
+        self.assertEqual(list(cache.get_many(["old", "new"])), ["new"])
+
+
+class CachedIngestionTests(IngestionTests):
+    """Ingestion through the cached model: chunk vectors skip both caches."""
+
+    def setUp(self):
+        super().setUp()
+        self.disk_cache = embeddings.DiskEmbeddingCache(os.path.join(self.temp_dir, "cache", "embeddings.sqlite3"))
+        self.cached_model = embeddings.CachedEmbeddings(self.model, "fake-embeddings", disk_cache=self.disk_cache)
+        patch = mock.patch.object(embeddings, "_embedding_model", self.cached_model)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_chunks_are_not_cached(self):
+        self.add_pdf(1)
+        self.ingest()
+        self.assertGreater(self.session.vector_count, 0)
+        self.assertEqual(len(self.cached_model._memory), 0)
+        (count,) = self.disk_cache._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        self.assertEqual(count, 0)
+
+
+class FilteredRankingTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.index = VectorIndex(mode="exact")
+        self.index.add(list(range(64)), rng.standard_normal((64, 8)))
+        self.query = rng.standard_normal(8)
+        self.order = [object_id for object_id, _ in self.index.search(self.query, 64)]
+
+    def rank(self, allowed, k=3):
+        calls = []
+
+        def keep_ids(ids):
+            calls.append(len(ids))
+            return set(ids) & allowed
+
+        with override_settings(RECOMMENDATION_OVERFETCH=4):
+            ranked = recommendations.rank_filtered(self.index, None, self.query, "", k, keep_ids)
+        return [object_id for object_id, _ in ranked], calls
+
+    def test_only_an_overfetched_prefix_is_checked(self):
+        ranked, calls = self.rank(set(self.order[::2]))
+        self.assertEqual(ranked, self.order[:6:2])
+        self.assertEqual(calls, [12])
+
+    def test_search_widens_until_enough_survive(self):
+        ranked, calls = self.rank(set(self.order[-3:]))
+        self.assertEqual(ranked, self.order[-3:])
+        self.assertEqual(calls, [12, 48, 64])
+
+    def test_fewer_eligible_than_k(self):
+        ranked, _ = self.rank({self.order[5]})
+        self.assertEqual(ranked, [self.order[5]])
+
+
+class IngestionStatusTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user("reader", password="secret"))
+        patch = mock.patch.object(ingestion, "enqueue_ingestion")
+        self.enqueue = patch.start()
+        self.addCleanup(patch.stop)
+
+    def status_of(self, session):
+        return self.client.get(reverse("pdf-status", args=[session.id]))
+
+    def test_session_without_heartbeat_is_queued(self):
+        session = ChatSession.objects.create()  # As left by migration 0011
+        UploadedPDF.objects.create(session=session, file="pdfs/legacy.pdf")
+
+        response = self.status_of(session)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["status"], "PENDING")
+        self.enqueue.assert_called_once_with(session.id)
+
+        self.status_of(session)  # Queued now: not again on the next poll
+        self.enqueue.assert_called_once()
+
+    def test_stale_indexing_session_is_queued_again(self):
+        session = ChatSession.objects.create(
+            ingestion_status="INDEXING", ingestion_heartbeat=timezone.now() - timedelta(hours=1)
+        )
+        self.assertEqual(self.status_of(session).data["status"], "PENDING")
+        self.enqueue.assert_called_once_with(session.id)
+
+    def test_running_and_finished_sessions_are_left_alone(self):
+        for status_value in ("INDEXING", "READY", "FAILED"):
+            session = ChatSession.objects.create(ingestion_status=status_value, ingestion_heartbeat=timezone.now())
+            self.assertEqual(self.status_of(session).data["status"], status_value)
+        ready = ChatSession.objects.create(ingestion_status="READY")
+        self.status_of(ready)
+        self.enqueue.assert_not_called()
+
+    def test_unknown_session(self):
+        self.assertEqual(self.client.get(reverse("pdf-status", args=["not-a-uuid"])).status_code, 404)
+
+
+class IngestionJobTests(TestCase):
+    def setUp(self):
+        self.session = ChatSession.objects.create(ingestion_heartbeat=timezone.now())
+        self.pdf = UploadedPDF.objects.create(session=self.session, file="pdfs/report.pdf")
+        # The job manages its own connection; inside a test transaction it mustn't.
+        for name in ("close_old_connections", "connection"):
+            patch = mock.patch.object(ingestion, name)
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def set_status(self, status_value, age=timedelta()):
+        ChatSession.objects.filter(id=self.session.id).update(
+            ingestion_status=status_value, ingestion_heartbeat=timezone.now() - age
+        )
+
+    def test_claim(self):
+        self.assertTrue(ingestion._claim(self.session.id))
+        self.assertFalse(ingestion._claim(self.session.id))  # Running elsewhere
+        self.set_status("INDEXING", age=timedelta(hours=1))
+        self.assertTrue(ingestion._claim(self.session.id))
+        for status_value in ("READY", "FAILED"):
+            self.set_status(status_value)
+            self.assertFalse(ingestion._claim(self.session.id))
+
+    def test_successful_run_marks_the_session_ready(self):
+        def process(session_id, progress):
+            progress(50)
+            self.assertEqual(ChatSession.objects.get(id=session_id).ingestion_progress, 50)
+            UploadedPDF.objects.filter(session_id=session_id).update(ingested_at=timezone.now())
+
+        with mock.patch.object(rag_pipeline, "process_pdfs_for_session", side_effect=process) as run:
+            ingestion.run_ingestion(str(self.session.id))
+        run.assert_called_once()
+        self.session.refresh_from_db()
+        self.assertEqual((self.session.ingestion_status, self.session.ingestion_progress), ("READY", 100))
+
+    def test_pdf_added_during_a_pass_is_indexed_too(self):
+        added = []
+
+        def process(session_id, progress):
+            UploadedPDF.objects.filter(session_id=session_id).update(ingested_at=timezone.now())
+            if not added:
+                added.append(UploadedPDF.objects.create(session_id=session_id, file="pdfs/late.pdf"))
+
+        with mock.patch.object(rag_pipeline, "process_pdfs_for_session", side_effect=process) as run:
+            ingestion.run_ingestion(str(self.session.id))
+        self.assertEqual(run.call_count, 2)
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.ingestion_status, "READY")
+
+    def test_failed_run_records_the_error(self):
+        with mock.patch.object(rag_pipeline, "process_pdfs_for_session", side_effect=ValueError("bad pdf")):
+            ingestion.run_ingestion(str(self.session.id))
+        self.session.refresh_from_db()
+        self.assertEqual((self.session.ingestion_status, self.session.ingestion_error), ("FAILED", "bad pdf"))
+
+    def test_session_owned_by_another_job_is_skipped(self):
+        self.set_status("INDEXING")
+        with mock.patch.object(rag_pipeline, "process_pdfs_for_session") as run:
+            ingestion.run_ingestion(str(self.session.id))
+        run.assert_not_called()
+
+    def test_ask_waits_for_ingestion(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user("asker", password="secret"))
+        url = reverse("pdf-ask", args=[self.session.id])
+        for status_value, expected in (("PENDING", 202), ("INDEXING", 202), ("FAILED", 409)):
+            self.set_status(status_value)
+            response = client.post(url, {"question": "What is it about?"}, format="json")
+            self.assertEqual(response.status_code, expected)
+            self.assertEqual(response.data["status"], status_value)
+        self.assertEqual(client.post(url, {}, format="json").status_code, 400)
+
+
+class ChainCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 0.0
+        clock = mock.patch.object(chain_cache, "time", mock.Mock(monotonic=lambda: self.now))
+        clock.start()
+        self.addCleanup(clock.stop)
+        self.name = f"test_chains_{id(self)}"  # Counters are per process
+        self.cache = ChainCache(self.name, max_entries=2, idle_seconds=60)
+
+    def counters(self):
+        counters = metrics.snapshot()
+        return {kind: counters.get(f"{self.name}_{kind}", 0) for kind in ("hits", "misses", "evictions")}
+
+    def test_values_are_built_once(self):
+        factory = mock.Mock(side_effect=lambda: object())
+        first = self.cache.get_or_create("a", factory)
+        self.assertIs(self.cache.get_or_create("a", factory), first)
+        factory.assert_called_once()
+        self.assertEqual(self.counters(), {"hits": 1, "misses": 1, "evictions": 0})
+
+    def test_least_recently_used_entry_is_evicted(self):
+        self.cache.get_or_create("a", lambda: "A")
+        self.cache.get_or_create("b", lambda: "B")
+        self.cache.get_or_create("a", lambda: "A2")  # b is now the oldest
+        self.cache.get_or_create("c", lambda: "C")
+        self.assertEqual(len(self.cache), 2)
+        self.assertEqual(self.cache.get_or_create("a", lambda: "A3"), "A")
+        self.assertEqual(self.cache.get_or_create("b", lambda: "B2"), "B2")
+        self.assertEqual(self.counters()["evictions"], 2)
+
+    def test_idle_entries_expire(self):
+        self.cache.get_or_create("a", lambda: "A")
+        self.now = 30.0
+        self.cache.get_or_create("b", lambda: "B")
+        self.now = 61.0
+        self.assertEqual(self.cache.get_or_create("b", lambda: "B2"), "B")
+        self.assertEqual(len(self.cache), 1)
+        self.assertEqual(self.cache.get_or_create("a", lambda: "A2"), "A2")
+        self.assertEqual(self.counters()["evictions"], 1)
+
+    def test_discard(self):
+        self.cache.get_or_create("a", lambda: "A")
+        self.cache.discard("a")
+        self.cache.discard("missing")
+        self.assertEqual(self.cache.get_or_create("a", lambda: "A2"), "A2")
+
+
+class AskStreamViewTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user("streamer", password="secret"))
+        self.session = ChatSession.objects.create(ingestion_status="READY", ingestion_heartbeat=timezone.now())
+        self.url = reverse("pdf-ask-stream", args=[self.session.id])
+
+    def stream(self, answer):
+        with mock.patch.object(views, "stream_answer_from_rag", side_effect=answer):
+            response = self.client.post(self.url, {"question": "What is it about?"}, format="json")
+            body = b"".join(response.streaming_content).decode()
+        events = []
+        for message in body.strip().split("\n\n"):
+            event, data = message.split("\n")
+            events.append((event[len("event: "):], json.loads(data[len("data: "):])))
+        return response, events
+
+    def test_answer_is_streamed_as_events(self):
+        def answer(session_id, question):
+            self.assertEqual((session_id, question), (str(self.session.id), "What is it about?"))
+            yield "sources", [{"id": "a:0", "file": "a.pdf", "page": 0, "snippet": "Intro"}]
+            yield "token", "It is "
+            yield "token", "a report."
+            yield "done", {"cached": False}
+
+        response, events = self.stream(answer)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertEqual(response["Cache-Control"], "no-cache")
+        self.assertEqual([event for event, _ in events], ["sources", "token", "token", "done"])
+        self.assertEqual("".join(data for event, data in events if event == "token"), "It is a report.")
+
+    def test_failure_mid_stream_ends_with_an_error_event(self):
+        def answer(session_id, question):
+            yield "token", "It is "
+            raise RuntimeError("LLM unavailable")
+
+        _, events = self.stream(answer)
+        self.assertEqual(events[-1], ("error", {"error": "An error occurred: LLM unavailable"}))
+
+    def test_nothing_is_streamed_before_ingestion_is_done(self):
+        ChatSession.objects.filter(id=self.session.id).update(ingestion_status="INDEXING")
+        with mock.patch.object(views, "stream_answer_from_rag") as answer:
+            response = self.client.post(
+                self.url, {"question": "What is it about?"}, format="json", HTTP_ACCEPT="text/event-stream"
+            )
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(json.loads(response.content)["status"], "INDEXING")
+        answer.assert_not_called()
+
+
+class AnswerCacheTests(TestCase):
+    def setUp(self):
+        self.session = ChatSession.objects.create()
+
+    def store(self, question, vector, session=None):
+        answer_cache.store((session or self.session).id, question, np.array(vector), f"answer to {question}", [])
+
+    def test_lookup_needs_a_similar_question(self):
+        self.assertIsNone(answer_cache.lookup(self.session.id, [1.0, 0.0, 0.0]))
+        self.store("first", [1.0, 0.0, 0.0])
+        self.store("second", [0.0, 1.0, 0.0])
+
+        self.assertEqual(answer_cache.lookup(self.session.id, [2.0, 0.1, 0.0]).answer, "answer to first")
+        self.assertEqual(answer_cache.lookup(self.session.id, [0.1, 1.0, 0.0]).answer, "answer to second")
+        self.assertIsNone(answer_cache.lookup(self.session.id, [1.0, 1.0, 0.0]))  # cos 0.71
+        self.assertIsNone(answer_cache.lookup(ChatSession.objects.create().id, [1.0, 0.0, 0.0]))
+
+    @override_settings(RAG_ANSWER_CACHE_SIZE=2)
+    def test_store_keeps_the_newest_answers(self):
+        other = ChatSession.objects.create()
+        self.store("other", [0.0, 0.0, 1.0], session=other)
+        for n, vector in enumerate(([1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0])):
+            self.store(f"q{n}", vector)
+        self.assertEqual(sorted(self.session.cached_answers.values_list("question", flat=True)), ["q1", "q2"])
+        self.assertEqual(other.cached_answers.count(), 1)
+
+    def test_pdf_set_changes_invalidate_answers(self):
+        pdf = UploadedPDF.objects.create(session=self.session, file="pdfs/a.pdf")
+        self.store("first", [1.0, 0.0, 0.0])
+
+        pdf.sha256 = "0" * 64
+        pdf.save()  # An edit keeps the PDF set
+        self.assertEqual(self.session.cached_answers.count(), 1)
+
+        UploadedPDF.objects.create(session=self.session, file="pdfs/b.pdf")
+        self.assertEqual(self.session.cached_answers.count(), 0)
+
+        self.store("second", [1.0, 0.0, 0.0])
+        pdf.delete()
+        self.assertEqual(self.session.cached_answers.count(), 0)
+
+
+class ContextBudgetTests(SimpleTestCase):
+    @staticmethod
+    def document(tokens, page=0):
+        return Document(page_content="x" * (4 * tokens), metadata={"source": "/media/pdfs/report.pdf", "page": page})
+
+    def test_estimate_tokens(self):
+        self.assertEqual(rag_pipeline.estimate_tokens(""), 1)
+        self.assertEqual(rag_pipeline.estimate_tokens("x" * 400), 100)
+
+    def test_pack_context_keeps_the_leading_documents_within_budget(self):
+        documents = [self.document(tokens, page) for page, tokens in enumerate((40, 50, 30, 5))]
+        self.assertEqual(rag_pipeline.pack_context(documents, 100), documents[:2])
+        self.assertEqual(rag_pipeline.pack_context(documents, 1000), documents)
+        self.assertEqual(rag_pipeline.pack_context(documents, 10), documents[:1])  # Never empty
+        self.assertEqual(rag_pipeline.pack_context([], 100), [])
+
+    def test_saved_tokens_are_counted(self):
+        documents = [self.document(tokens) for tokens in (40, 50, 30)]
+        before = metrics.snapshot()
+        with mock.patch.object(rag_pipeline, "_seconds_per_prompt_token", None):
+            rag_pipeline._log_context_budget("x" * 40, documents, documents[:2], 0.5)
+        after = metrics.snapshot()
+        self.assertEqual(after["rag_context_tokens_sent"] - before.get("rag_context_tokens_sent", 0), 100)
+        self.assertEqual(after["rag_context_tokens_saved"] - before.get("rag_context_tokens_saved", 0), 30)
+
+    def test_describe_sources(self):
+        document = Document(
+            page_content="y" * 300, metadata={"source": "/media/pdfs/report.pdf", "page": 3}, id="pdf:7"
+        )
+        self.assertEqual(
+            rag_pipeline.describe_sources([document]),
+            [{"id": "pdf:7", "file": "report.pdf", "page": 3, "snippet": "y" * 200}],
+        )
+
+
+class AnswerQuestionTests(TestCase):
+    def setUp(self):
+        self.session = ChatSession.objects.create(ingestion_status="READY")
+        self.session_id = str(self.session.id)
+        self.context = [
+            Document(page_content="The report covers Q3.", metadata={"source": "a.pdf", "page": 0}, id="a:0")
+        ]
+        self.chain = mock.Mock()
+        self.chain.invoke.side_effect = lambda inputs: {
+            "input": inputs["input"],
+            "candidates": self.context,
+            "context": self.context,
+            "retrieved_at": time.perf_counter(),
+            "answer": "Q3 results.",
+        }
+        self.chain.stream.side_effect = lambda inputs: iter(
+            [{"input": inputs["input"]}, {"candidates": self.context}, {"context": self.context}]
+            + [{"answer": token} for token in ("Q3 ", "results.")]
+        )
+        self.build = mock.Mock(return_value=self.chain)
+        patches = (
+            mock.patch.object(rag_pipeline, "get_embedding_model", return_value=FakeEmbeddings()),
+            mock.patch.object(rag_pipeline, "build_rag_chain", self.build),
+            mock.patch.object(rag_pipeline, "chain_cache", ChainCache("test_rag_chain_cache")),
+        )
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_repeated_question_is_answered_from_the_cache(self):
+        first = rag_pipeline.answer_question(self.session_id, "What does the report cover?")
+        self.assertEqual(first["answer"], "Q3 results.")
+        self.assertFalse(first["cached"])
+        self.assertEqual(first["sources"], rag_pipeline.describe_sources(self.context))
+
+        again = rag_pipeline.answer_question(self.session_id, "What does the report cover?")
+        self.assertEqual(again, {**first, "cached": True})
+        self.chain.invoke.assert_called_once()
+
+        rag_pipeline.answer_question(self.session_id, "Who wrote it?")
+        self.assertEqual(self.chain.invoke.call_count, 2)
+        self.build.assert_called_once_with(self.session_id)  # The chain is reused
+
+    def test_streamed_answer_is_cached(self):
+        events = list(rag_pipeline.stream_answer_from_rag(self.session_id, "What does the report cover?"))
+        self.assertEqual([kind for kind, _ in events], ["sources", "token", "token", "done"])
+        self.assertEqual(events[-1], ("done", {"cached": False}))
+
+        cached = list(rag_pipeline.stream_answer_from_rag(self.session_id, "What does the report cover?"))
+        self.assertEqual(cached[1:], [("token", "Q3 results."), ("done", {"cached": True})])
+        self.assertTrue(rag_pipeline.answer_question(self.session_id, "What does the report cover?")["cached"])
+        self.chain.stream.assert_called_once()
+        self.chain.invoke.assert_not_called()
+
+    @override_settings(RAG_ANSWER_CACHE=False)
+    def test_cache_can_be_turned_off(self):
+        for _ in range(2):
+            self.assertFalse(rag_pipeline.answer_question(self.session_id, "What does the report cover?")["cached"])
+        self.assertEqual(self.chain.invoke.call_count, 2)
+        self.assertFalse(self.session.cached_answers.exists())
+
+    def test_ask_view_returns_the_answer(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user("asker", password="secret"))
+        url = reverse("pdf-ask", args=[self.session.id])
+        responses = [client.post(url, {"question": "What does the report cover?"}, format="json") for _ in range(2)]
+        self.assertEqual([response.status_code for response in responses], [200, 200])
+        self.assertEqual(
+            [response.data for response in responses],
+            [{"answer": "Q3 results.", "cached": False}, {"answer": "Q3 results.", "cached": True}],
+        )
+
+
+class TeamEmbeddingStoreTests(RecommendationTestCase):
+    def setUp(self):
+        super().setUp()
+        self.teams = [
+            self.make_team("Pixel", "designer", "react frontend"),
+            self.make_team("Tensor", "data scientist", "pandas pytorch"),
+            self.make_team("Ledger", "backend developer", "django postgresql"),
+        ]
+
+    def test_teams_are_embedded_once(self):
+        index = recommendations.get_team_index(self.model)
+        self.assertEqual(sorted(index.ids()), sorted(team.id for team in self.teams))
+        self.assertEqual(self.model.embedded, 3)
+        recommendations.get_team_index(self.model)
+        self.assertEqual(self.model.embedded, 3)
+
+    def test_only_text_edits_are_embedded_again(self):
+        recommendations.get_team_index(self.model)
+        self.teams[0].description = "vue frontend"
+        self.teams[0].save()
+        self.teams[1].members_limit = 8
+        self.teams[1].save()
+
+        recommendations.get_team_index(self.model)
+        self.assertEqual(self.model.embedded, 4)
+        stored = TeamEmbedding.objects.get(team=self.teams[1])
+        self.assertGreaterEqual(stored.updated, Team.objects.get(pk=self.teams[1].pk).updated)
+        self.assertEqual(stored.content_hash, recommendations.content_hash(recommendations.team_text(self.teams[1])))
+
+    def test_recommend_teams_embeds_only_the_user(self):
+        user = self.make_user("ada", role="data scientist", skills=["pandas", "pytorch"])
+        self.client.force_authenticate(user)
+        response = self.client.get(reverse("recommend-teams"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["recommended_teams"][0]["id"], self.teams[1].id)
+        self.assertEqual(self.model.embedded, 4)
+
+        caches["recommendations"].clear()
+        self.client.get(reverse("recommend-teams"))
+        self.assertEqual(self.model.embedded, 5)
+
+
+class ProfileEmbeddingTests(RecommendationTestCase):
+    def setUp(self):
+        super().setUp()
+        self.users = [
+            self.make_user("ada", role="data scientist", skills=["pandas"]),
+            self.make_user("linus", role="backend developer", skills=["django"]),
+            self.make_user("grace", role="designer", skills=["figma"]),
+        ]
+        recommendations.get_profile_index(self.model)
+
+    def embedding_of(self, user):
+        return ProfileEmbedding.objects.get(user_profile__user=user)
+
+    def test_skill_changes_mark_the_profile_stale(self):
+        skill = UserSkill.objects.create(user_profile=self.users[0].profile, skill_name="pytorch")
+        self.assertTrue(self.embedding_of(self.users[0]).stale)
+        recommendations.get_profile_index(self.model)
+        self.assertEqual(self.embedding_of(self.users[0]).text, "data scientist pandas pytorch")
+
+        skill.delete()
+        self.assertTrue(self.embedding_of(self.users[0]).stale)
+
+    def test_only_role_edits_mark_the_profile_stale(self):
+        profile = self.users[1].profile
+        profile.bio = "Writes APIs"
+        profile.save()
+        self.assertFalse(self.embedding_of(self.users[1]).stale)
+        profile.role = "devops engineer"
+        profile.save()
+        self.assertTrue(self.embedding_of(self.users[1]).stale)
+
+    def test_skills_added_through_the_serializer_mark_the_profile_stale(self):
+        serializer = UserProfileSerializer(
+            self.users[2].profile, data={"skills": [{"skill_name": "illustrator"}]}, partial=True
+        )
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+        self.assertTrue(self.embedding_of(self.users[2]).stale)
+
+    def test_stale_profiles_are_refreshed_in_one_batch(self):
+        for user in self.users[:2]:
+            UserSkill.objects.create(user_profile=user.profile, skill_name="sql")
+        embedded = self.model.embedded
+        with mock.patch.object(self.model, "embed_documents", wraps=self.model.embed_documents) as embed:
+            recommendations.get_profile_index(self.model)
+        embed.assert_called_once()
+        self.assertEqual(self.model.embedded - embedded, 2)
+
+    def test_recommend_users_ranks_by_team_needs(self):
+        team = self.make_team("Tensor", "data scientist", "pandas")
+        self.client.force_authenticate(self.users[1])
+        response = self.client.get(reverse("recommend-users", args=[team.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["recommended_users"][0]["id"], self.users[0].profile.id)
+
+
+class VectorIndexTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        # Clustered data, as embeddings are, so the IVF probe has structure to exploit.
+        centers = rng.standard_normal((20, 16))
+        self.vectors = normalize(centers[rng.integers(0, 20, 2000)] + 0.3 * rng.standard_normal((2000, 16)))
+        self.ids = list(range(1000, 3000))
+        self.queries = normalize(centers[:10] + 0.3 * rng.standard_normal((10, 16)))
+
+    def build(self, mode, **options):
+        index = VectorIndex(mode=mode, **options)
+        index.add(self.ids, self.vectors)
+        return index
+
+    def test_exact_search_matches_brute_force(self):
+        index = self.build("exact")
+        for query in self.queries:
+            expected = np.argsort(-(self.vectors @ query))[:10]
+            self.assertEqual([object_id for object_id, _ in index.search(query, 10)], [self.ids[i] for i in expected])
+
+    def test_ivf_probing_every_cluster_is_exact(self):
+        exact, ivf = self.build("exact"), self.build("ivf", nprobe=10000)
+        for query in self.queries:
+            self.assertEqual(
+                [object_id for object_id, _ in ivf.search(query, 10)],
+                [object_id for object_id, _ in exact.search(query, 10)],
+            )
+
+    def test_ivf_recall(self):
+        exact, ivf = self.build("exact"), self.build("ivf", nprobe=8)
+        hits = sum(
+            len({i for i, _ in ivf.search(query, 10)} & {i for i, _ in exact.search(query, 10)})
+            for query in self.queries
+        )
+        self.assertGreaterEqual(hits / (10 * len(self.queries)), 0.9)
+
+    def test_auto_mode_switches_at_the_threshold(self):
+        self.assertFalse(self.build("auto", ann_threshold=5000)._use_ann())
+        self.assertTrue(self.build("auto", ann_threshold=1000)._use_ann())
+
+    def test_search_many_matches_search(self):
+        index = self.build("exact")
+        for query, results in zip(self.queries, index.search_many(self.queries, 5)):
+            expected = index.search(query, 5)
+            self.assertEqual([i for i, _ in results], [i for i, _ in expected])
+            np.testing.assert_allclose([score for _, score in results], [score for _, score in expected], rtol=1e-5)
+
+    def test_add_replaces_and_remove_deletes(self):
+        index = self.build("exact")
+        index.add([1500], [self.queries[0]], versions=["v2"])
+        self.assertEqual(len(index), 2000)
+        self.assertEqual(index.search(self.queries[0], 1)[0][0], 1500)
+        self.assertEqual(index.version(1500), "v2")
+
+        index.remove([1500, 1000, 42])
+        self.assertEqual(len(index), 1998)
+        self.assertNotIn(1500, index)
+        self.assertNotIn(1500, [object_id for object_id, _ in index.search(self.queries[0], 50)])
+        self.assertEqual(index.search(self.vectors[-1], 1)[0][0], self.ids[-1])  # The row moved into the gap
+
+    def test_mapped_matrix_is_copied_on_first_write(self):
+        matrix = self.vectors.astype(np.float16)
+        matrix.flags.writeable = False
+        index = VectorIndex.from_matrix(self.ids, matrix, mode="exact")
+        reference = self.build("exact")
+        for query in self.queries:
+            scores = [score for _, score in index.search(query, 5)]
+            expected = [score for _, score in reference.search(query, 5)]
+            np.testing.assert_allclose(scores, expected, atol=2e-3)
+
+        index.add([5000], [self.queries[0]])
+        self.assertIsNot(index._matrix, matrix)
+        self.assertEqual(matrix.shape, (2000, 16))
+        self.assertIn(5000, index)
+
+    def test_dimension_mismatch_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.build("exact").add([1], [np.ones(4)])
+
+
+class CachedEmbeddingsTests(SimpleTestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.path = os.path.join(temp_dir.name, "embeddings.sqlite3")
+        self.model = FakeEmbeddings()
+
+    def test_repeated_and_equivalent_texts_are_embedded_once(self):
+        cached = embeddings.CachedEmbeddings(self.model, "fake")
+        first = cached.embed_documents(["react  developer", "react developer\n", "django"])
+        self.assertEqual(self.model.embedded, 2)
+        self.assertEqual(first[0], first[1])
+        self.assertEqual(cached.embed_query("django"), first[2])
+        self.assertEqual(self.model.embedded, 2)
+
+    def test_least_recently_used_entries_leave_memory(self):
+        cached = embeddings.CachedEmbeddings(self.model, "fake", max_entries=2)
+        cached.embed_documents(["a", "b"])
+        cached.embed_query("a")
+        cached.embed_query("c")  # Evicts "b"
+        cached.embed_documents(["a", "c"])
+        self.assertEqual(self.model.embedded, 3)
+        cached.embed_query("b")
+        self.assertEqual(self.model.embedded, 4)
+
+    def test_disk_cache_is_shared_by_instances_of_one_model(self):
+        vector = embeddings.CachedEmbeddings(
+            self.model, "fake", disk_cache=embeddings.DiskEmbeddingCache(self.path)
+        ).embed_query("figma")
+        other_process = embeddings.CachedEmbeddings(
+            self.model, "fake", disk_cache=embeddings.DiskEmbeddingCache(self.path)
+        )
+        np.testing.assert_allclose(other_process.embed_query("figma"), vector, rtol=1e-6)
+        self.assertEqual(self.model.embedded, 1)
+
+        other_model = embeddings.CachedEmbeddings(
+            self.model, "fake-int8", disk_cache=embeddings.DiskEmbeddingCache(self.path)
+        )
+        other_model.embed_query("figma")
+        self.assertEqual(self.model.embedded, 2)
+
+    def test_uncached_embedding_bypasses_both_caches(self):
+        cached = embeddings.CachedEmbeddings(self.model, "fake", disk_cache=embeddings.DiskEmbeddingCache(self.path))
+        cached.embed_documents_uncached(["chunk one", "chunk two"])
+        self.assertEqual(len(cached._memory), 0)
+        self.assertEqual(cached.disk_cache.get_many([cached._key("chunk one")]), {})
+
+
+class RecordingEmbeddings(FakeEmbeddings):
+    def __init__(self, fail_on=None):
+        super().__init__()
+        self.batches = []
+        self.fail_on = fail_on
+
+    def embed_documents(self, texts):
+        self.batches.append(len(texts))
+        if self.fail_on in texts:
+            raise RuntimeError("model crashed")
+        return super().embed_documents(texts)
+
+
+class BatchingEmbedderTests(SimpleTestCase):
+    def test_concurrent_calls_share_batches(self):
+        model = RecordingEmbeddings()
+        batcher = BatchingEmbedder(model, max_batch_size=4, max_wait_ms=200)
+        texts = [f"text {n}" for n in range(8)]
+        futures = [batcher.submit([text]) for text in texts]
+
+        for text, future in zip(texts, futures):
+            self.assertEqual(future.result(timeout=5), FakeEmbeddings().embed_documents([text]))
+        self.assertLess(len(model.batches), len(texts))
+        self.assertLessEqual(max(model.batches), 4)
+        self.assertEqual(sum(model.batches), len(texts))
+
+    def test_model_errors_reach_every_caller_of_the_batch(self):
+        batcher = BatchingEmbedder(RecordingEmbeddings(fail_on="bad"), max_wait_ms=200)
+        futures = [batcher.submit(["bad"]), batcher.submit(["good"])]
+        for future in futures:
+            with self.assertRaises(RuntimeError):
+                future.result(timeout=5)
+        self.assertEqual(len(batcher.embed_query("good")), 16)  # The worker survives
+
+    def test_empty_call_does_not_reach_the_model(self):
+        model = RecordingEmbeddings()
+        self.assertEqual(BatchingEmbedder(model).embed_documents([]), [])
+        self.assertEqual(model.batches, [])
+
+
+class BatchRecommendationTests(RecommendationTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = self.make_user("admin")
+        self.ada = self.make_user("ada", role="data scientist", skills=["pandas"]).profile
+        self.linus = self.make_user("linus", role="backend developer", skills=["django"]).profile
+        self.data_team = self.make_team("Tensor", "data scientist", "pandas", admin=self.admin)
+        self.web_team = self.make_team("Ledger", "backend developer", "django", admin=self.admin)
+        self.other_team = self.make_team("Pixel", "designer", "figma")
+        self.client.force_authenticate(self.admin)
+
+    def batch(self, **params):
+        return self.client.get(reverse("recommend-users-batch"), params)
+
+    def test_all_administered_teams_are_ranked_in_one_call(self):
+        with mock.patch("api.views.rank_many", wraps=recommendations.rank_many) as rank_many:
+            response = self.batch()
+        self.assertEqual(response.status_code, 200)
+        results = response.data["recommended_users"]
+        self.assertEqual(set(results), {str(self.data_team.id), str(self.web_team.id)})
+        self.assertEqual(results[str(self.data_team.id)][0]["id"], self.ada.id)
+        self.assertEqual(results[str(self.web_team.id)][0]["id"], self.linus.id)
+        rank_many.assert_called_once()
+        self.assertEqual(len(rank_many.call_args.args[3]), 2)
+
+    def test_selected_teams_and_k(self):
+        results = self.batch(team_ids=f"{self.other_team.id}", k=1).data["recommended_users"]
+        self.assertEqual(list(results), [str(self.other_team.id)])
+        self.assertEqual(len(results[str(self.other_team.id)]), 1)
+
+    def test_teams_cached_by_the_single_team_endpoint_are_not_scored_again(self):
+        self.client.get(reverse("recommend-users", args=[self.data_team.id]))
+        with mock.patch("api.views.rank_many", wraps=recommendations.rank_many) as rank_many:
+            results = self.batch().data["recommended_users"]
+        self.assertEqual(rank_many.call_args.args[3], [recommendations.team_text(self.web_team)])
+        self.assertEqual(results[str(self.data_team.id)][0]["id"], self.ada.id)
+
+    def test_malformed_team_ids(self):
+        self.assertEqual(self.batch(team_ids="1,two").status_code, 400)
+
+
+class RecommendationCacheTests(RecommendationTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.make_user("ada", role="data scientist", skills=["pandas"])
+        self.team = self.make_team("Tensor", "data scientist", "pandas")
+        self.client.force_authenticate(self.user)
+
+    def recommended_ids(self):
+        return [team["id"] for team in self.client.get(reverse("recommend-teams")).data["recommended_teams"]]
+
+    def test_repeat_requests_are_served_from_cache(self):
+        self.recommended_ids()
+        embedded, hits = self.model.embedded, metrics.snapshot().get("recommendation_cache_hits", 0)
+        self.assertEqual(self.recommended_ids(), [self.team.id])
+        self.assertEqual(self.model.embedded, embedded)
+        self.assertEqual(metrics.snapshot()["recommendation_cache_hits"], hits + 1)
+
+    def test_changes_start_a_new_epoch(self):
+        changes = (
+            lambda: self.make_team("Pandas", "data scientist", "pandas"),
+            lambda: self.team.save(),
+            lambda: self.team.members.add(self.make_user("linus")),
+            lambda: UserSkill.objects.create(user_profile=self.user.profile, skill_name="sql"),
+            lambda: UserProfile.objects.get(user__username="linus").delete(),
+        )
+        for change in changes:
+            epoch = recommendation_cache.get_epoch()
+            change()
+            self.assertNotEqual(recommendation_cache.get_epoch(), epoch)
+
+    def test_new_team_is_recommended_after_invalidation(self):
+        self.recommended_ids()
+        newcomer = self.make_team("Pandas", "data scientist pandas", "pandas")
+        self.assertIn(newcomer.id, self.recommended_ids())
+
+    def test_metrics_endpoint_reports_hit_rates(self):
+        self.recommended_ids()
+        self.recommended_ids()
+        self.client.force_authenticate(User.objects.create_user("staff", password="secret", is_staff=True))
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("recommendation_cache_hit_rate", response.data["metrics"])
+
+
+class LexicalIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.index = BM25Index()
+        self.index.add(1, tokenize("React frontend developer"))
+        self.index.add(2, tokenize("Backend developer: Django, PostgreSQL"))
+        self.index.add(3, tokenize("C++ and C# game developer, Node.js tooling"))
+
+    def test_tokenize_keeps_language_names(self):
+        self.assertEqual(tokenize("Looking for a C++, C# and Node.js dev."), ["c++", "c#", "node.js", "dev"])
+
+    def test_only_documents_sharing_a_token_match(self):
+        self.assertEqual([doc_id for doc_id, _ in self.index.search(tokenize("django api"))], [2])
+        self.assertEqual(self.index.search(tokenize("figma")), [])
+
+    def test_rare_tokens_weigh_more(self):
+        ranked = self.index.search(tokenize("developer react"))
+        self.assertEqual(ranked[0][0], 1)
+        self.assertEqual(len(ranked), 3)
+        self.assertEqual(len(self.index.search(tokenize("developer"), limit=2)), 2)
+
+    def test_replace_and_remove(self):
+        self.index.add(1, tokenize("vue frontend"), version="v2")
+        self.assertEqual(self.index.search(tokenize("react")), [])
+        self.assertEqual(self.index.version(1), "v2")
+        self.index.remove([1, 99])
+        self.assertEqual(self.index.search(tokenize("vue")), [])
+        self.assertEqual(len(self.index), 2)
+
+
+class HybridRankingTests(SimpleTestCase):
+    def setUp(self):
+        model = KeywordEmbeddings()
+        self.texts = {
+            1: "react frontend developer",
+            2: "django backend developer",
+            3: "pandas data scientist",
+            4: "figma designer",
+        }
+        self.index = VectorIndex(mode="exact")
+        self.index.add(list(self.texts), model.embed_documents(list(self.texts.values())))
+        self.lexical_index = BM25Index()
+        for doc_id, text in self.texts.items():
+            self.lexical_index.add(doc_id, tokenize(text))
+        self.query = "react developer"
+        self.query_vector = model.embed_query(self.query)
+
+    def rank(self, k):
+        return recommendations.hybrid_rank_many(
+            self.index, self.lexical_index, [self.query_vector], [self.query], k=k
+        )[0]
+
+    def test_only_the_shortlist_is_scored(self):
+        with override_settings(RECOMMENDATION_SHORTLIST_SIZE=2), mock.patch.object(
+            self.index, "score_ids", wraps=self.index.score_ids
+        ) as score_ids:
+            ranked = self.rank(k=2)
+        self.assertEqual(len(score_ids.call_args.args[0]), 2)
+        self.assertEqual(ranked[0][0], 1)
+
+    def test_too_few_keyword_matches_are_topped_up(self):
+        ranked = self.rank(k=4)
+        self.assertEqual(sorted(doc_id for doc_id, _ in ranked), [1, 2, 3, 4])
+        self.assertEqual({doc_id for doc_id, _ in ranked[:2]}, {1, 2})
+
+    @override_settings(RECOMMENDATION_DENSE_WEIGHT=0.0, RECOMMENDATION_LEXICAL_WEIGHT=1.0)
+    def test_blend_weights_are_configurable(self):
+        ranked = self.rank(k=2)
+        self.assertEqual([doc_id for doc_id, _ in ranked], [1, 2])
+        self.assertAlmostEqual(ranked[0][1], 1.0)
+
+
+class RecommendTeamsViewTests(RecommendationTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.make_user("ada", role="data scientist", skills=["pandas"])
+        self.client.force_authenticate(self.user)
+
+    def get(self, **params):
+        return self.client.get(reverse("recommend-teams"), params)
+
+    def ids(self, response):
+        return [team["id"] for team in response.data["recommended_teams"]]
+
+    def test_only_joinable_teams_are_recommended(self):
+        joinable = self.make_team("Open", "data scientist", "pandas")
+        full = self.make_team("Full", "data scientist", "pandas", members_limit=1)
+        full.members.add(self.make_user("linus"))
+        joined = self.make_team("Joined", "data scientist", "pandas")
+        joined.members.add(self.user)
+        self.make_team("Own", "data scientist", "pandas", admin=self.user)
+        private = self.make_team("Hidden", "data scientist", "pandas", team_type="PRIVATE")
+
+        self.assertEqual(self.ids(self.get()), [joinable.id])
+        self.assertEqual(sorted(self.ids(self.get(include_private="true"))), sorted([joinable.id, private.id]))
+
+    def test_pages_follow_the_cursor(self):
+        teams = [self.make_team(f"Team {n}", "data scientist", "pandas " * (n + 1)) for n in range(5)]
+        seen, cursor = [], None
+        while True:
+            response = self.get(limit=2, **({"cursor": cursor} if cursor else {}))
+            self.assertLessEqual(len(response.data["recommended_teams"]), 2)
+            seen += self.ids(response)
+            cursor = response.data["next_cursor"]
+            if cursor is None:
+                break
+        self.assertEqual(sorted(seen), sorted(team.id for team in teams))
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(self.model.embedded, 6)  # Later pages come from the cached ranking
+
+    def test_invalid_paging_parameters(self):
+        self.make_team("Open", "data scientist", "pandas")
+        self.assertEqual(self.get(limit=0).status_code, 400)
+        self.assertEqual(self.get(limit="many").status_code, 400)
+        self.assertEqual(self.get(cursor="not a cursor").status_code, 400)
+
+
+class LocalVectorStoreTests(SimpleTestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.directory = temp_dir.name
+        self.model = KeywordEmbeddings()
+        self.store = LocalVectorBackend(self.directory).store("session", self.model)
+        self.store.add_texts(
+            ["react hooks tutorial", "react hooks guide", "django orm queries", "pandas dataframes"],
+            metadatas=[{"page": page, "file": "ab"[(page - 1) // 2]} for page in range(1, 5)],
+            ids=["a:0", "a:1", "b:0", "b:1"],
+        )
+
+    def test_search_returns_the_closest_chunks(self):
+        results = self.store.similarity_search_with_score("django queries", k=2)
+        self.assertEqual(results[0][0].id, "b:0")
+        self.assertGreater(results[0][1], results[1][1])
+        relevance = self.store.similarity_search_with_relevance_scores("django queries", k=4)
+        self.assertTrue(all(0.0 <= score <= 1.0 for _, score in relevance))
+
+    def test_metadata_filters(self):
+        def ids(**kwargs):
+            return [doc.id for doc in self.store.similarity_search("react django pandas", k=4, **kwargs)]
+
+        self.assertEqual(sorted(ids(filter={"file": "b"})), ["b:0", "b:1"])
+        self.assertEqual(sorted(ids(filter={"page": {"$in": [1, 4]}})), ["a:0", "b:1"])
+        self.assertEqual(ids(filter={"file": {"$eq": "c"}}), [])
+        with self.assertRaises(ValueError):
+            ids(filter={"page": {"$gt": 1}})
+
+    def test_mmr_prefers_diverse_chunks(self):
+        similar = [doc.id for doc in self.store.similarity_search("react hooks django", k=2)]
+        diverse = [doc.id for doc in self.store.max_marginal_relevance_search("react hooks django", k=2, fetch_k=4)]
+        self.assertEqual(sorted(similar), ["a:0", "a:1"])
+        self.assertIn("b:0", diverse)
+
+    def test_other_backends_on_the_directory_see_writes(self):
+        other = LocalVectorBackend(self.directory)
+        self.assertEqual(other.vector_count("session"), 4)
+        self.assertEqual(other.fetch_ids("session", ["a:0", "z:9"]), {"a:0"})
+
+        self.store.delete(["a:0"])
+        self.assertEqual(other.fetch_ids("session", ["a:0", "a:1"]), {"a:1"})
+        other.delete_namespace("session")
+        self.assertEqual(self.store.similarity_search("react", k=4), [])
+
+    def test_bulk_writes_are_published_once(self):
+        backend = LocalVectorBackend(self.directory)
+        namespace = backend._namespace("bulk")
+        with mock.patch.object(namespace, "_publish", wraps=namespace._publish) as publish:
+            with backend.bulk("bulk"):
+                for n in range(3):
+                    backend.upsert("bulk", [f"c:{n}"], [np.ones(4) * (n + 1)], [f"chunk {n}"], [{}])
+                self.assertEqual(backend.vector_count("bulk"), 0)
+        publish.assert_called_once()
+        self.assertEqual(backend.vector_count("bulk"), 3)
@@ -15,10 +15,15 @@ from .views import (
     JoinRequestViewSet,
     recommend_teams,
     recommend_users,
+    recommend_users_batch,
+    get_metrics,
     UserProjectViewSet,
     upload_and_process_pdfs,
     ask_question,
+    ask_question_stream,
     get_session_pdfs,
+    delete_session_pdf,
+    get_ingestion_status,
 )
 
 
@@ -47,10 +52,15 @@ urlpatterns = [
     path("teams/<int:team_id>/kick/", kick_member_from_team, name="kick-member"),
     path("recommend-teams/", recommend_teams, name="recommend-teams"),
     path("recommend-users/<int:team_id>/", recommend_users, name="recommend-users"),
+    path("recommend-users/batch/", recommend_users_batch, name="recommend-users-batch"),
+    path("metrics/", get_metrics, name="metrics"),
     path(
         "token/refresh/", TokenRefreshView.as_view(), name="token_refresh"
     ),  #  (to refresh JWT tokens)
     path("pdf-chat/upload/", upload_and_process_pdfs, name="pdf-upload"),
     path("pdf-chat/<str:session_id>/ask/", ask_question, name="pdf-ask"),
+    path("pdf-chat/<str:session_id>/ask/stream/", ask_question_stream, name="pdf-ask-stream"),
     path("pdf-chat/<str:session_id>/files/", get_session_pdfs, name="pdf-files"),
+    path("pdf-chat/<str:session_id>/files/<int:pdf_id>/", delete_session_pdf, name="pdf-file-delete"),
+    path("pdf-chat/<str:session_id>/status/", get_ingestion_status, name="pdf-status"),
 ]
@@ -0,0 +1,258 @@
+# api/vector_index.py
+
+import threading
+
+import numpy as np
+
+
+def top_k(scores, k):
+    """Indexes of the `k` highest scores, best first, without sorting everything."""
+    n = len(scores)
+    if k <= 0 or n == 0:
+        return np.zeros(0, dtype=np.int64)
+    if k >= n:
+        return np.argsort(-scores, kind="stable")
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+class VectorIndex:
+    """
+    In-process cosine-similarity index over L2-normalized float32 vectors.
+
+    Vectors live in one contiguous matrix (grown by doubling) with an ID map
+    in both directions, so inserts and deletes are incremental: a delete moves
+    the last row into the freed slot. Searches are exact by default. In
+    "ivf" mode (or "auto" once the index holds `ann_threshold` vectors) rows
+    are clustered with k-means and only the `nprobe` closest clusters are
+    scored, trading a little recall for latency on very large candidate sets.
+    """
+
+    def __init__(self, mode="auto", ann_threshold=50000, nprobe=8):
+        if mode not in ("exact", "ivf", "auto"):
+            raise ValueError(f"Unknown index mode '{mode}'.")
+        self.mode = mode
+        self.ann_threshold = ann_threshold
+        self.nprobe = nprobe
+
+        self._lock = threading.RLock()
+        self._matrix = None
+        self._size = 0
+        self._ids = []  # row -> object id
+        self._rows = {}  # object id -> row
+        self._versions = {}  # object id -> caller supplied version (e.g. timestamp)
+
+        # IVF state
+        self._centroids = None
+        self._assign = None  # row -> cluster
+        self._trained_size = 0
+
+    @classmethod
+    def from_matrix(cls, ids, matrix, **kwargs):
+        """
+        Wraps an existing matrix of normalized row vectors without copying it,
+        e.g. a read-only memory map shared between processes. The first
+        add/remove makes a private float32 copy.
+        """
+        index = cls(**kwargs)
+        index._matrix = matrix
+        index._size = len(matrix)
+        index._ids = [int(object_id) for object_id in ids]
+        index._rows = {object_id: row for row, object_id in enumerate(index._ids)}
+        index._assign = np.full(len(matrix), -1, dtype=np.int32)
+        return index
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, object_id):
+        return object_id in self._rows
+
+    def ids(self):
+        with self._lock:
+            return list(self._ids)
+
+    def version(self, object_id):
+        return self._versions.get(object_id)
+
+    def add(self, ids, vectors, versions=None):
+        """Inserts vectors, replacing the stored vector of IDs already present."""
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        vectors = vectors / norms
+        if versions is None:
+            versions = [None] * len(ids)
+
+        with self._lock:
+            if self._matrix is None:
+                self._matrix = np.empty((max(len(ids), 16), vectors.shape[1]), dtype=np.float32)
+                self._assign = np.full(len(self._matrix), -1, dtype=np.int32)
+            else:
+                self._make_writable()
+            if vectors.shape[1] != self._matrix.shape[1]:
+                raise ValueError(
+                    f"Vector dimension {vectors.shape[1]} does not match index dimension {self._matrix.shape[1]}."
+                )
+
+            for object_id, vector, version in zip(ids, vectors, versions):
+                row = self._rows.get(object_id)
+                if row is None:
+                    row = self._size
+                    self._grow(row + 1)
+                    self._rows[object_id] = row
+                    self._ids.append(object_id)
+                    self._size += 1
+                self._matrix[row] = vector
+                self._versions[object_id] = version
+                if self._centroids is not None:
+                    self._assign[row] = int(np.argmax(self._centroids @ vector))
+
+    def remove(self, ids):
+        """Deletes vectors by ID; unknown IDs are ignored."""
+        with self._lock:
+            if self._matrix is not None:
+                self._make_writable()
+            for object_id in ids:
+                row = self._rows.pop(object_id, None)
+                if row is None:
+                    continue
+                self._versions.pop(object_id, None)
+                last = self._size - 1
+                if row != last:
+                    moved_id = self._ids[last]
+                    self._matrix[row] = self._matrix[last]
+                    self._assign[row] = self._assign[last]
+                    self._ids[row] = moved_id
+                    self._rows[moved_id] = row
+                self._ids.pop()
+                self._size -= 1
+
+    def search(self, query, k=5, allowed=None):
+        """
+        Returns up to `k` (object id, cosine score) pairs, best first. With
+        `allowed`, only those IDs are scored (exactly, as they are a subset).
+        """
+        query = np.asarray(query, dtype=np.float32).ravel()
+        query_norm = np.linalg.norm(query)
+        if query_norm:
+            query = query / query_norm
+
+        with self._lock:
+            if self._size == 0:
+                return []
+            matrix = self._matrix[: self._size]
+            if allowed is not None:
+                rows = self._rows_of(allowed)
+            elif self._use_ann():
+                probe = top_k(self._centroids @ query, self.nprobe)
+                rows = np.flatnonzero(np.isin(self._assign[: self._size], probe))
+            else:
+                rows = None
+
+            if rows is None:
+                scores = self._scores(matrix, query)
+                best = top_k(scores, k)
+                best_scores = scores[best]
+            else:
+                scores = self._scores(matrix[rows], query)
+                order = top_k(scores, k)
+                best, best_scores = rows[order], scores[order]
+            return [(self._ids[row], float(score)) for row, score in zip(best, best_scores)]
+
+    def score_ids(self, ids, queries):
+        """
+        Cosine scores of the given IDs against one or more query rows, as a
+        (len(ids), n_queries) array. `queries` are expected to be normalized.
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        with self._lock:
+            return self._scores(self._matrix[self._rows_of(ids)], queries.T)
+
+    def search_many(self, queries, k=5, allowed=None):
+        """
+        Batched `search`: one list of (object id, score) pairs per query row.
+        In exact mode all queries are scored with a single matrix product.
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        queries = queries / norms
+
+        with self._lock:
+            if self._size == 0:
+                return [[] for _ in queries]
+            if allowed is None and self._use_ann():
+                return [self.search(query, k) for query in queries]
+            if allowed is None:
+                rows = np.arange(self._size)
+                scores = self._scores(self._matrix[: self._size], queries.T)  # (rows, queries)
+            else:
+                rows = self._rows_of(allowed)
+                scores = self._scores(self._matrix[rows], queries.T)
+            results = []
+            for column in scores.T:
+                best = top_k(column, k)
+                results.append([(self._ids[rows[i]], float(column[i])) for i in best])
+            return results
+
+    def _rows_of(self, ids):
+        return np.fromiter(
+            (self._rows[object_id] for object_id in ids if object_id in self._rows), dtype=np.int64
+        )
+
+    @staticmethod
+    def _scores(matrix, query, block_rows=65536):
+        """`matrix @ query` for a query vector or a (dim, n_queries) query matrix."""
+        if matrix.dtype == np.float32:
+            return matrix @ query
+        # float16 snapshots are upcast block by block, never as a whole copy.
+        scores = np.empty((len(matrix),) + query.shape[1:], dtype=np.float32)
+        for start in range(0, len(matrix), block_rows):
+            block = matrix[start:start + block_rows]
+            scores[start:start + len(block)] = block.astype(np.float32) @ query
+        return scores
+
+    def _make_writable(self):
+        if self._matrix.dtype != np.float32 or not self._matrix.flags.writeable:
+            self._matrix = np.array(self._matrix, dtype=np.float32)
+
+    def _grow(self, needed):
+        capacity = len(self._matrix)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        matrix = np.empty((capacity, self._matrix.shape[1]), dtype=np.float32)
+        matrix[: self._size] = self._matrix[: self._size]
+        assign = np.full(capacity, -1, dtype=np.int32)
+        assign[: self._size] = self._assign[: self._size]
+        self._matrix, self._assign = matrix, assign
+
+    def _use_ann(self):
+        if self.mode == "exact" or (self.mode == "auto" and self._size < self.ann_threshold):
+            return False
+        # (Re)cluster on first use and whenever the index has doubled since.
+        if self._centroids is None or self._size > 2 * self._trained_size:
+            self._train()
+        return True
+
+    def _train(self, iterations=10, sample_size=20000, block_rows=65536):
+        matrix = self._matrix[: self._size]
+        n_clusters = max(1, int(np.sqrt(self._size)))
+        rng = np.random.default_rng(0)
+        sample_rows = np.sort(rng.choice(self._size, min(self._size, sample_size), replace=False))
+        sample = np.asarray(matrix[sample_rows], dtype=np.float32)
+        centroids = sample[rng.choice(len(sample), min(n_clusters, len(sample)), replace=False)]
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(len(centroids)):
+                members = sample[labels == c]
+                if len(members):
+                    centroid = members.mean(axis=0)
+                    centroids[c] = centroid / (np.linalg.norm(centroid) or 1.0)
+        self._centroids = centroids
+        for start in range(0, self._size, block_rows):
+            block = np.asarray(matrix[start:start + block_rows], dtype=np.float32)
+            self._assign[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+        self._trained_size = self._size
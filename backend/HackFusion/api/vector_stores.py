@@ -0,0 +1,464 @@
+# api/vector_stores.py
+
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+from langchain_core.vectorstores.utils import maximal_marginal_relevance
+
+from .file_lock import file_lock
+from .shared_matrix import SharedMatrix
+from .vector_index import VectorIndex
+
+
+class LocalNamespace:
+    """
+    One namespace of the local vector store on disk: a memory-mapped float32
+    matrix of L2-normalized chunk vectors (a `SharedMatrix`) and a JSON file
+    with the chunk IDs, texts and metadata in row order.
+
+    Every write publishes a complete new snapshot, so readers in any process
+    see either the old or the new namespace, never a mix. Writers on the
+    host take turns under a file lock next to the namespace directory.
+    A write rewrites the whole namespace, so bulk loads go through `bulk()`,
+    which publishes once at the end.
+    """
+
+    def __init__(self, directory, index_options=None):
+        self.directory = str(directory)
+        self.index_options = index_options or {}
+        self._matrix = SharedMatrix(self.directory, "vectors", "float32")
+        self._loaded = None  # (version, chunks, matrix, VectorIndex)
+        self._lock = threading.Lock()
+        self._lock_path = os.path.normpath(self.directory) + ".lock"
+        self._buffered = None  # Upserts held back by `bulk()`
+        self._buffered_lock = threading.Lock()
+
+    def _chunks_path(self, version):
+        return os.path.join(self.directory, f"chunks.{version}.json")
+
+    def load(self):
+        """
+        Returns (chunks, matrix, index) of the current snapshot, or
+        (None, None, None) if nothing was stored yet. `matrix` is the
+        read-only memory map and `index` searches it.
+        """
+        for _ in range(3):
+            snapshot = self._matrix.load()
+            if snapshot is None:
+                return None, None, None
+            version, ids, matrix = snapshot
+            with self._lock:
+                if self._loaded is not None and self._loaded[0] == version:
+                    return self._loaded[1:]
+                try:
+                    with open(self._chunks_path(version)) as f:
+                        chunks = json.load(f)
+                except FileNotFoundError:
+                    continue  # Replaced by a concurrent write, re-read the manifest
+                index = VectorIndex.from_matrix(ids, matrix, **self.index_options)
+                self._loaded = (version, chunks, matrix, index)
+                return chunks, matrix, index
+        return None, None, None
+
+    def __len__(self):
+        chunks, _, _ = self.load()
+        return len(chunks["ids"]) if chunks else 0
+
+    def _publish(self, chunks, matrix):
+        # Called under the file lock. The chunk files of the new and the
+        # replaced snapshot stay: a reader may have just read the old manifest.
+        previous = self._matrix.version()
+        version = uuid.uuid4().hex
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._chunks_path(version), "w") as f:
+            json.dump(chunks, f)
+        self._matrix.publish(version, np.arange(len(chunks["ids"])), matrix)
+        keep = {f"chunks.{version}.json", f"chunks.{previous}.json"}
+        for filename in os.listdir(self.directory):
+            if filename.startswith("chunks.") and filename not in keep:
+                try:
+                    os.remove(os.path.join(self.directory, filename))
+                except FileNotFoundError:
+                    pass
+
+    def _current(self):
+        chunks, matrix, _ = self.load()
+        if chunks is None:
+            return {"ids": [], "texts": [], "metadatas": []}, None
+        return chunks, np.asarray(matrix, dtype=np.float32)
+
+    @contextmanager
+    def bulk(self):
+        """
+        Holds back upserts made in the block, from any thread, and publishes
+        them as one snapshot when it exits, so loading N batches costs one
+        rewrite of the namespace instead of N. Nothing is published if the
+        block raises.
+        """
+        with self._buffered_lock:
+            self._buffered = []
+        try:
+            yield
+        except BaseException:
+            with self._buffered_lock:
+                self._buffered = None
+            raise
+        with self._buffered_lock:
+            buffered, self._buffered = self._buffered, None
+        if buffered:
+            self._write(
+                [chunk_id for batch in buffered for chunk_id in batch[0]],
+                [text for batch in buffered for text in batch[1]],
+                [metadata for batch in buffered for metadata in batch[2]],
+                np.vstack([batch[3] for batch in buffered]),
+            )
+
+    def upsert(self, ids, texts, metadatas, vectors):
+        """Adds chunks, replacing stored chunks with the same IDs."""
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        vectors = vectors / norms
+        with self._buffered_lock:
+            if self._buffered is not None:
+                self._buffered.append((list(ids), list(texts), list(metadatas), vectors))
+                return
+        self._write(list(ids), list(texts), list(metadatas), vectors)
+
+    def _write(self, ids, texts, metadatas, vectors):
+        # The last of repeated IDs wins, as it would with one upsert per call.
+        last = {chunk_id: row for row, chunk_id in enumerate(ids)}
+        if len(last) < len(ids):
+            rows = sorted(last.values())
+            ids, texts, metadatas = [ids[r] for r in rows], [texts[r] for r in rows], [metadatas[r] for r in rows]
+            vectors = vectors[rows]
+        with file_lock(self._lock_path):
+            chunks, matrix = self._current()
+            keep = [row for row, chunk_id in enumerate(chunks["ids"]) if chunk_id not in last]
+            merged = {
+                "ids": [chunks["ids"][row] for row in keep] + ids,
+                "texts": [chunks["texts"][row] for row in keep] + texts,
+                "metadatas": [chunks["metadatas"][row] for row in keep] + metadatas,
+            }
+            if matrix is not None:
+                vectors = np.vstack([matrix[keep], vectors])
+            self._publish(merged, vectors)
+
+    def delete(self, ids):
+        """Removes chunks by ID; unknown IDs are ignored."""
+        removed = set(ids)
+        with file_lock(self._lock_path):
+            chunks, matrix = self._current()
+            keep = [row for row, chunk_id in enumerate(chunks["ids"]) if chunk_id not in removed]
+            if len(keep) == len(chunks["ids"]):
+                return
+            self._publish(
+                {key: [chunks[key][row] for row in keep] for key in ("ids", "texts", "metadatas")},
+                matrix[keep] if keep else np.zeros((0, matrix.shape[1]), dtype=np.float32),
+            )
+
+    def drop(self):
+        with file_lock(self._lock_path):
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class LocalVectorStore(VectorStore):
+    """
+    LangChain vector store over a `LocalNamespace`: a drop-in for
+    `PineconeVectorStore` that searches in-process with no network round
+    trip. Scores are cosine similarities.
+    """
+
+    def __init__(self, embedding, namespace):
+        self._embedding = embedding
+        self.namespace = namespace
+
+    @property
+    def embeddings(self):
+        return self._embedding
+
+    def add_vectors(self, vectors, texts, metadatas=None, ids=None):
+        """Stores chunks whose embeddings were already computed."""
+        texts = list(texts)
+        ids = list(ids) if ids is not None else [str(uuid.uuid4()) for _ in texts]
+        metadatas = list(metadatas) if metadatas is not None else [{} for _ in texts]
+        if texts:
+            self.namespace.upsert(ids, texts, metadatas, vectors)
+        return ids
+
+    def add_texts(self, texts, metadatas=None, *, ids=None, **kwargs):
+        texts = list(texts)
+        if not texts:
+            return []
+        return self.add_vectors(self._embedding.embed_documents(texts), texts, metadatas, ids)
+
+    def delete(self, ids=None, **kwargs):
+        if ids is None:
+            self.namespace.drop()
+        else:
+            self.namespace.delete(ids)
+        return True
+
+    def get_by_ids(self, ids, /):
+        chunks, _, _ = self.namespace.load()
+        if chunks is None:
+            return []
+        rows = {chunk_id: row for row, chunk_id in enumerate(chunks["ids"])}
+        return [self._document(chunks, rows[chunk_id]) for chunk_id in ids if chunk_id in rows]
+
+    @staticmethod
+    def _document(chunks, row):
+        return Document(id=chunks["ids"][row], page_content=chunks["texts"][row], metadata=chunks["metadatas"][row])
+
+    @staticmethod
+    def _allowed_rows(chunks, filter):
+        """
+        Rows whose metadata matches `filter`, a dict of key -> value, or
+        key -> {"$eq": value} / {"$in": [values]} as Pinecone accepts; None
+        without a filter.
+        """
+        if not filter:
+            return None
+        conditions = []
+        for key, condition in filter.items():
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            for operator, value in condition.items():
+                if operator == "$eq":
+                    conditions.append((key, (value,)))
+                elif operator == "$in":
+                    conditions.append((key, tuple(value)))
+                else:
+                    raise ValueError(f"Unsupported filter operator {operator!r} on {key!r}")
+        return [
+            row
+            for row, metadata in enumerate(chunks["metadatas"])
+            if all(key in metadata and metadata[key] in values for key, values in conditions)
+        ]
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        chunks, _, index = self.namespace.load()
+        if chunks is None:
+            return []
+        allowed = self._allowed_rows(chunks, filter)
+        if allowed == []:
+            return []
+        return [(self._document(chunks, row), score) for row, score in index.search(embedding, k, allowed=allowed)]
+
+    def similarity_search_by_vector(self, embedding, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, **kwargs)]
+
+    def similarity_search_with_score(self, query, k=4, **kwargs):
+        return self.similarity_search_with_score_by_vector(self._embedding.embed_query(query), k, **kwargs)
+
+    def similarity_search(self, query, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    def _select_relevance_score_fn(self):
+        # Scores are already cosine similarities; negative ones count as irrelevant.
+        return lambda score: max(0.0, min(1.0, score))
+
+    def max_marginal_relevance_search_by_vector(
+        self, embedding, k=4, fetch_k=20, lambda_mult=0.5, filter=None, **kwargs
+    ):
+        chunks, matrix, index = self.namespace.load()
+        if chunks is None:
+            return []
+        allowed = self._allowed_rows(chunks, filter)
+        if allowed == []:
+            return []
+        candidates = [row for row, _ in index.search(embedding, fetch_k, allowed=allowed)]
+        if not candidates:
+            return []
+        candidate_vectors = np.asarray(matrix[candidates], dtype=np.float32)
+        selected = maximal_marginal_relevance(
+            np.asarray(embedding, dtype=np.float32), candidate_vectors, lambda_mult=lambda_mult, k=k
+        )
+        return [self._document(chunks, candidates[i]) for i in selected]
+
+    def max_marginal_relevance_search(self, query, k=4, fetch_k=20, lambda_mult=0.5, **kwargs):
+        return self.max_marginal_relevance_search_by_vector(
+            self._embedding.embed_query(query), k, fetch_k, lambda_mult, **kwargs
+        )
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, *, ids=None, namespace=None, **kwargs):
+        store = cls(embedding, namespace)
+        store.add_texts(texts, metadatas, ids=ids)
+        return store
+
+
+class LocalVectorBackend:
+    """Keeps every namespace under `directory`, one sub-directory each."""
+
+    def __init__(self, directory, index_options=None):
+        self.directory = str(directory)
+        self.index_options = index_options or {}
+        self._namespaces = {}
+        self._lock = threading.Lock()
+
+    def _namespace(self, namespace):
+        with self._lock:
+            local = self._namespaces.get(namespace)
+            if local is None:
+                local = LocalNamespace(os.path.join(self.directory, namespace), self.index_options)
+                self._namespaces[namespace] = local
+            return local
+
+    def store(self, namespace, embedding):
+        return LocalVectorStore(embedding, self._namespace(namespace))
+
+    def vector_count(self, namespace):
+        return len(self._namespace(namespace))
+
+    def upsert(self, namespace, ids, vectors, texts, metadatas):
+        """Stores precomputed vectors with their chunk texts and metadata."""
+        if ids:
+            self._namespace(namespace).upsert(ids, texts, metadatas, vectors)
+
+    def fetch_ids(self, namespace, ids):
+        """The subset of `ids` stored in the namespace."""
+        chunks, _, _ = self._namespace(namespace).load()
+        if chunks is None:
+            return set()
+        return set(ids) & set(chunks["ids"])
+
+    def delete(self, namespace, ids):
+        """Removes vectors by ID; unknown IDs are ignored."""
+        if ids:
+            self._namespace(namespace).delete(ids)
+
+    def delete_namespace(self, namespace):
+        self._namespace(namespace).drop()
+
+    def bulk(self, namespace):
+        """Context in which upserts into `namespace` are published together when it exits."""
+        return self._namespace(namespace).bulk()
+
+
+class PineconeVectorBackend:
+    """Namespaces of one Pinecone index, accessed through `langchain_pinecone`."""
+
+    def __init__(self, index_factory):
+        self._index_factory = index_factory
+
+    def store(self, namespace, embedding):
+        from langchain_pinecone import PineconeVectorStore
+
+        return PineconeVectorStore(index=self._index_factory(), embedding=embedding, namespace=namespace)
+
+    def vector_count(self, namespace):
+        # Index-wide stats: a slow call, kept off the question path.
+        stats = self._index_factory().describe_index_stats()
+        return stats.get("namespaces", {}).get(namespace, {}).get("vector_count", 0)
+
+    def upsert(self, namespace, ids, vectors, texts, metadatas, batch_size=100):
+        """
+        Stores precomputed vectors. The chunk text goes into the "text"
+        metadata key, where `PineconeVectorStore` reads it back from.
+        """
+        index = self._index_factory()
+        for start in range(0, len(ids), batch_size):
+            stop = start + batch_size
+            index.upsert(
+                vectors=[
+                    {"id": vector_id, "values": [float(x) for x in vector], "metadata": {**metadata, "text": text}}
+                    for vector_id, vector, text, metadata in zip(
+                        ids[start:stop], vectors[start:stop], texts[start:stop], metadatas[start:stop]
+                    )
+                ],
+                namespace=namespace,
+            )
+
+    def fetch_ids(self, namespace, ids):
+        """The subset of `ids` stored (and visible to reads) in the namespace."""
+        response = self._index_factory().fetch(ids=list(ids), namespace=namespace)
+        return set(response.vectors)
+
+    def delete(self, namespace, ids, batch_size=1000):
+        """Removes vectors by ID; unknown IDs are ignored."""
+        index = self._index_factory()
+        ids = list(ids)
+        for start in range(0, len(ids), batch_size):
+            index.delete(ids=ids[start:start + batch_size], namespace=namespace)
+
+    def delete_namespace(self, namespace):
+        self._index_factory().delete(namespace=namespace, delete_all=True)
+
+    def bulk(self, namespace):
+        """Pinecone takes each upsert as it comes."""
+        return nullcontext()
+
+
+class BatchUpserter:
+    """
+    Upserts batches into a backend namespace on up to `concurrency` threads,
+    so the caller can embed the next batch while earlier ones upload. At most
+    `concurrency` batches are in flight; `submit` waits for the oldest beyond
+    that. A failed batch is retried `retries` times, `retry_delay` seconds
+    apart, doubled after each attempt; the last failure is raised by
+    `submit` or `close`.
+
+    Use as a context manager; leaving the block waits for every batch.
+    """
+
+    def __init__(self, backend, namespace, concurrency=2, retries=3, retry_delay=0.5):
+        self.backend = backend
+        self.namespace = namespace
+        self.concurrency = max(1, concurrency)
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.seconds = 0.0  # Summed time of successful upsert calls
+        self.retried = 0
+        self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="upsert")
+        self._in_flight = deque()
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+
+    def submit(self, ids, vectors, texts, metadatas):
+        while len(self._in_flight) >= self.concurrency:
+            self._in_flight.popleft().result()
+        self._in_flight.append(self._pool.submit(self._upsert, ids, vectors, texts, metadatas))
+
+    def close(self):
+        try:
+            while self._in_flight:
+                self._in_flight.popleft().result()
+        finally:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+
+    def _upsert(self, ids, vectors, texts, metadatas):
+        for attempt in range(self.retries + 1):
+            start = time.perf_counter()
+            try:
+                self.backend.upsert(self.namespace, ids, vectors, texts, metadatas)
+            except Exception as e:
+                if attempt == self.retries:
+                    raise
+                delay = self.retry_delay * 2**attempt
+                print(f"Upsert of {len(ids)} vectors into '{self.namespace}' failed ({e}); retrying in {delay:g} s.")
+                with self._lock:
+                    self.retried += 1
+                time.sleep(delay)
+            else:
+                with self._lock:
+                    self.seconds += time.perf_counter() - start
+                return
@@ -0,0 +1,19 @@
+# api/vector_utils.py
+
+import numpy as np
+
+
+def normalize(vectors):
+    """L2-normalize a vector or a matrix of row vectors as float32."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def vector_to_bytes(vector):
+    return np.asarray(vector, dtype=np.float32).tobytes()
+
+
+def vector_from_bytes(data):
+    return np.frombuffer(bytes(data), dtype=np.float32)
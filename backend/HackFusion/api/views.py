@@ -1,7 +1,14 @@
+import json
+import os
+
+from django.conf import settings
 from django.shortcuts import render
-from rest_framework.decorators import api_view, permission_classes
+from django.utils import timezone
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
 from rest_framework.permissions import AllowAny
+from rest_framework.renderers import BaseRenderer, JSONRenderer
 from rest_framework.response import Response
+from rest_framework.utils import encoders
 from rest_framework import viewsets, permissions
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework import status
@@ -11,8 +18,8 @@ from rest_framework.decorators import action
 from django.shortcuts import get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.csrf import csrf_exempt
-from django.http import JsonResponse
-from django.core.exceptions import ObjectDoesNotExist
+from django.http import JsonResponse, StreamingHttpResponse
+from django.core.exceptions import ObjectDoesNotExist, ValidationError
 from .models import (
     UserProfile,
     Team,
@@ -38,15 +45,25 @@ from .serializers import (
     CreateJoinRequestSerializer,
 )
 from .models import ChatSession, UploadedPDF
-import numpy as np
-from numpy.linalg import norm
-from langchain_huggingface import HuggingFaceEmbeddings
-from .rag_pipeline import process_pdfs_for_session, get_answer_from_rag
-
-
-# Initialize the embedding model globally (or within the functions, but globally is more efficient)
-embedding_model = HuggingFaceEmbeddings(
-    model_name="sentence-transformers/all-MiniLM-L6-v2"
+from .embeddings import get_embedding_model
+from . import metrics, recommendation_cache
+from .chunk_store import file_sha256
+from .ingestion import enqueue_ingestion, resume_stalled_ingestion, schedule_ingestion
+from .rag_pipeline import answer_question, stream_answer_from_rag
+from .recommendations import (
+    decode_cursor,
+    eligible_team_ids,
+    encode_cursor,
+    get_profile_index,
+    get_profile_lexical_index,
+    get_team_index,
+    get_team_lexical_index,
+    get_team_vectors,
+    hybrid_enabled,
+    rank,
+    rank_filtered,
+    rank_many,
+    team_text,
 )
 
 # Create your views here.
@@ -580,57 +597,92 @@ def kick_member_from_team(request, team_id):
 @api_view(["GET"])
 @permission_classes([permissions.IsAuthenticated]) # Ensure authentication is required
 def recommend_teams(request):
-    """API endpoint to recommend teams based on user profile's skills and role."""
+    """
+    API endpoint to recommend teams based on user profile's skills and role.
+
+    Only teams the user can join are returned (see `eligible_teams_for`). The
+    ranking is cached as a list of team IDs, so `?limit=` / `?cursor=` pages
+    are sliced from it without re-scoring. Pass `?include_private=true` to
+    also rank private teams.
+    """
     user = request.user
     try:
-        user_profile = UserProfile.objects.get(user=user)
-    except UserProfile.DoesNotExist:
-        return Response({"error": "User profile not found"}, status=status.HTTP_404_NOT_FOUND)
-
-    # 1. Prepare user data
-    user_skills = " ".join([skill.skill_name.lower() for skill in user_profile.skills.all()])
-    user_role = (user_profile.role or "").lower()
-    user_data = user_skills + " " + user_role
-    
-    # Check if user data is sufficient
-    if not user_data.strip():
-        return Response({"recommended_teams": []})
-
-    # 2. Get all teams
-    teams = Team.objects.all()
-    if not teams.exists():
-        return Response({"error": "No teams found"}, status=status.HTTP_404_NOT_FOUND)
-
-    # 3. Prepare team data for embedding
-    team_data = [
-        (team.looking_for or "").lower() + " " + (team.description or "").lower()
-        for team in teams
-    ]
-
-    # 4. Generate embeddings (User and Teams)
-    user_embedding = embedding_model.embed_documents([user_data])[0]
-    team_embeddings = embedding_model.embed_documents(team_data)
-
-    # 5. Calculate Cosine Similarity (using numpy)
-    # Cosine similarity between A and B = dot(A, B) / (norm(A) * norm(B))
-    similarities = np.dot(team_embeddings, user_embedding) / (norm(team_embeddings, axis=1) * norm(user_embedding))
+        limit = int(request.query_params.get("limit", 5))
+        offset = decode_cursor(request.query_params.get("cursor"))
+    except ValueError:
+        return Response({"error": "Invalid limit or cursor"}, status=status.HTTP_400_BAD_REQUEST)
+    if not 1 <= limit <= 50:
+        return Response({"error": "limit must be between 1 and 50"}, status=status.HTTP_400_BAD_REQUEST)
+    include_private = request.query_params.get("include_private", "").lower() in ("1", "true")
+
+    # Served from cache until a team, profile, skill or membership changes
+    max_results = getattr(settings, "RECOMMENDATION_MAX_RESULTS", 100)
+    cache_key = recommendation_cache.make_key(
+        "team_ranking_for_user", f"{user.id}:{int(include_private)}", k=max_results
+    )
+    ranked_ids = recommendation_cache.get(cache_key)
 
-    # 6. Sort teams based on similarity scores
-    team_scores = list(zip(teams, similarities))
-    team_scores.sort(key=lambda x: x[1], reverse=True)
+    if ranked_ids is None:
+        try:
+            user_profile = UserProfile.objects.get(user=user)
+        except UserProfile.DoesNotExist:
+            return Response({"error": "User profile not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        # 1. Prepare user data
+        user_skills = " ".join([skill.skill_name.lower() for skill in user_profile.skills.all()])
+        user_role = (user_profile.role or "").lower()
+        user_data = user_skills + " " + user_role
+
+        # Check if user data is sufficient
+        if not user_data.strip():
+            return Response({"recommended_teams": [], "next_cursor": None})
+
+        # 2. Check there are teams at all
+        if not Team.objects.exists():
+            return Response({"error": "No teams found"}, status=status.HTTP_404_NOT_FOUND)
+
+        # 3. Sync the team index (only new or edited teams are read and re-embedded)
+        embedding_model = get_embedding_model()
+        index = get_team_index(embedding_model)
+
+        # 4. Embed the user text only
+        user_embedding = embedding_model.embed_documents([user_data])[0]
+
+        # 5. Rank teams (skill/role keyword shortlist, then cosine similarity on it),
+        #    keeping only the ones the user can join
+        lexical_index = get_team_lexical_index() if hybrid_enabled() else None
+        team_scores = rank_filtered(
+            index,
+            lexical_index,
+            user_embedding,
+            user_data,
+            k=max_results,
+            keep_ids=lambda team_ids: eligible_team_ids(user, team_ids, include_private),
+        )
+        ranked_ids = [team_id for team_id, score in team_scores if score > 0]
+        recommendation_cache.set(cache_key, ranked_ids)
 
-    # 7. Serialize top 5 recommended teams (only if similarity > 0)
+    # 6. Serialize the requested page of recommended teams, in rank order
+    page_ids = ranked_ids[offset:offset + limit]
+    teams_by_id = Team.objects.in_bulk(page_ids)
     recommended_teams = TeamSerializer(
-        [team for team, score in team_scores[:5] if score > 0], many=True
+        [teams_by_id[team_id] for team_id in page_ids if team_id in teams_by_id], many=True
     ).data
+    next_cursor = encode_cursor(offset + limit) if offset + limit < len(ranked_ids) else None
 
-    return Response({"recommended_teams": recommended_teams})
+    return Response({"recommended_teams": recommended_teams, "next_cursor": next_cursor})
 
 
 @api_view(["GET"])
 @permission_classes([permissions.IsAuthenticated]) # Ensure authentication is required
 def recommend_users(request, team_id):
     """API endpoint to recommend users based on a team's needs."""
+    # Served from cache until a team, profile, skill or membership changes
+    cache_key = recommendation_cache.make_key("users_for_team", team_id)
+    cached = recommendation_cache.get(cache_key)
+    if cached is not None:
+        return Response({"recommended_users": cached})
+
     try:
         team = Team.objects.get(id=team_id)
     except Team.DoesNotExist:
@@ -642,39 +694,112 @@ def recommend_users(request, team_id):
     if not team_data.strip():
         return Response({"recommended_users": []})
 
-    # 2. Get all user profiles
-    users = UserProfile.objects.all()
-    if not users.exists():
+    # 2. Check there are profiles at all
+    if not UserProfile.objects.exists():
         return Response({"error": "No users found"}, status=status.HTTP_404_NOT_FOUND)
 
-    # 3. Prepare user profile data for embedding
-    user_data = [
-        (user.role or "").lower()
-        + " "
-        + " ".join([skill.skill_name.lower() for skill in user.skills.all()])
-        for user in users
-    ]
+    # 3. Sync the profile index (stale profiles are refreshed in one batch)
+    embedding_model = get_embedding_model()
+    index = get_profile_index(embedding_model)
 
-    # 4. Generate embeddings (Team and Users)
+    # 4. Embed the team text only
     team_embedding = embedding_model.embed_documents([team_data])[0]
-    user_embeddings = embedding_model.embed_documents(user_data)
 
-    # 5. Calculate Cosine Similarity
-    similarities = np.dot(user_embeddings, team_embedding) / (norm(user_embeddings, axis=1) * norm(team_embedding))
+    # 5. Top 5 users: skill/role keyword shortlist, then cosine similarity on it
+    lexical_index = get_profile_lexical_index() if hybrid_enabled() else None
+    user_scores = rank(index, lexical_index, team_embedding, team_data, k=5)
 
-    # 6. Sort users based on similarity scores
-    user_scores = list(zip(users, similarities))
-    user_scores.sort(key=lambda x: x[1], reverse=True)
-
-    # 7. Serialize top 5 recommended users (only if similarity > 0)
+    # 6. Serialize top 5 recommended users (only if similarity > 0)
+    user_ids = [user_id for user_id, score in user_scores if score > 0]
+    users_by_id = UserProfile.objects.in_bulk(user_ids)
     recommended_users = [
-        UserProfileSerializer(user).data
-        for user, score in user_scores[:5]
-        if score > 0
+        UserProfileSerializer(users_by_id[user_id]).data for user_id in user_ids if user_id in users_by_id
     ]
+    recommendation_cache.set(cache_key, recommended_users)
+
+    return Response({"recommended_users": recommended_users})
+
+
+@api_view(["GET"])
+@permission_classes([permissions.IsAuthenticated]) # Ensure authentication is required
+def recommend_users_batch(request):
+    """
+    API endpoint to recommend users for several teams in one call.
+    `?team_ids=1,2,3` selects the teams; without it, all teams the user administers.
+    `?k=` sets the number of users per team (default 5).
+    """
+    try:
+        k = min(max(int(request.query_params.get("k", 5)), 1), 50)
+        team_ids = [
+            int(team_id)
+            for team_id in request.query_params.get("team_ids", "").split(",")
+            if team_id.strip()
+        ]
+    except ValueError:
+        return Response(
+            {"error": "team_ids must be a comma-separated list of integers and k an integer."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    # 1. Get the requested teams with their stored embeddings
+    teams = Team.objects.select_related("embedding").defer("embedding__vector")
+    teams = teams.filter(id__in=team_ids) if team_ids else teams.filter(admin=request.user)
+    teams = [team for team in teams if team_text(team).strip()]
+    if not teams:
+        return Response({"recommended_users": {}})
+
+    # Teams cached by this or the single-team endpoint are not scored again
+    epoch = recommendation_cache.get_epoch()
+    cache_keys = {
+        team.id: recommendation_cache.make_key("users_for_team", team.id, k, epoch) for team in teams
+    }
+    cached = recommendation_cache.get_many(list(cache_keys.values()))
+    recommended_users = {
+        str(team.id): cached[cache_keys[team.id]] for team in teams if cache_keys[team.id] in cached
+    }
+    teams = [team for team in teams if cache_keys[team.id] not in cached]
+    if not teams:
+        return Response({"recommended_users": recommended_users})
+
+    # 2. Check there are profiles at all
+    if not UserProfile.objects.exists():
+        return Response({"error": "No users found"}, status=status.HTTP_404_NOT_FOUND)
+
+    # 3. Team vectors come from the team embedding store, no per-request embedding
+    embedding_model = get_embedding_model()
+    team_embeddings = get_team_vectors(teams, embedding_model)
+    index = get_profile_index(embedding_model)
+
+    # 4. Score every team against its shortlisted profiles in one matrix product
+    lexical_index = get_profile_lexical_index() if hybrid_enabled() else None
+    results = rank_many(index, lexical_index, team_embeddings, [team_text(team) for team in teams], k=k)
+
+    # 5. Serialize each recommended profile once, even if several teams share it
+    users_by_id = UserProfile.objects.in_bulk(
+        {user_id for user_scores in results for user_id, score in user_scores if score > 0}
+    )
+    serialized = {}
+    for team, user_scores in zip(teams, results):
+        recommended_users[str(team.id)] = []
+        for user_id, score in user_scores:
+            if score <= 0 or user_id not in users_by_id:
+                continue
+            if user_id not in serialized:
+                serialized[user_id] = UserProfileSerializer(users_by_id[user_id]).data
+            recommended_users[str(team.id)].append(serialized[user_id])
+    recommendation_cache.set_many(
+        {cache_keys[team.id]: recommended_users[str(team.id)] for team in teams}
+    )
 
     return Response({"recommended_users": recommended_users})
 
+
+@api_view(["GET"])
+@permission_classes([permissions.IsAdminUser])
+def get_metrics(request):
+    """Returns this worker process's counters and cache hit rates."""
+    return Response({"pid": os.getpid(), "metrics": metrics.snapshot()})
+
 ################################# PDF CHAT ###############
 
 @api_view(['POST'])
@@ -682,37 +807,94 @@ def recommend_users(request, team_id):
 def upload_and_process_pdfs(request):
     """
     Handles uploading multiple PDFs and creates a chat session.
-    Processing is now deferred until the first question.
+    Ingestion (parsing, chunking, embedding) starts right away in the
+    background; poll the status endpoint until it is READY.
     """
     files = request.FILES.getlist('files')
     if not files:
         return Response({"error": "No files provided"}, status=status.HTTP_400_BAD_REQUEST)
 
-    session = ChatSession.objects.create()
+    session = ChatSession.objects.create(ingestion_heartbeat=timezone.now())
     for f in files:
-        UploadedPDF.objects.create(session=session, file=f)
-    
-    # Just return the session ID. The client will use this for the chat.
-    return Response({"session_id": str(session.id)}, status=status.HTTP_201_CREATED)
+        UploadedPDF.objects.create(session=session, file=f, sha256=file_sha256(f))
+    enqueue_ingestion(session.id)
+
+    # The client uses the session ID for the chat and to poll ingestion status.
+    return Response(
+        {"session_id": str(session.id), "ingestion_status": session.ingestion_status},
+        status=status.HTTP_201_CREATED,
+    )
+
+
+def _ingestion_state(session):
+    return {
+        "session_id": str(session.id),
+        "status": session.ingestion_status,
+        "progress": session.ingestion_progress,
+        "error": session.ingestion_error or None,
+        "chunk_count": session.chunk_count,
+        "vector_count": session.vector_count,
+        "completed_at": session.ingestion_completed_at,
+    }
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def get_ingestion_status(request, session_id):
+    """
+    Reports how far the background ingestion of a session's PDFs has got.
+    A session whose ingestion stalled (see `resume_stalled_ingestion`) is
+    queued again, since this is the endpoint clients poll while waiting.
+    """
+    try:
+        session = ChatSession.objects.get(id=session_id)
+    except (ChatSession.DoesNotExist, ValidationError):
+        return Response({"error": "Session not found"}, status=status.HTTP_404_NOT_FOUND)
+    resume_stalled_ingestion(session)
+    return Response(_ingestion_state(session))
+
+def _not_ready_response(session):
+    if session.ingestion_status == "FAILED":
+        return Response(_ingestion_state(session), status=status.HTTP_409_CONFLICT)
+    if session.ingestion_status != "READY":
+        return Response(_ingestion_state(session), status=status.HTTP_202_ACCEPTED)
+    return None
+
+
+def _check_session_ready(session_id):
+    """
+    Returns None if the session's PDFs are ingested, else the response to
+    send instead: 404, 202 with the ingestion state while ingestion is
+    pending or running, or 409 if it failed.
+    """
+    try:
+        session = ChatSession.objects.get(id=session_id)
+    except (ChatSession.DoesNotExist, ValidationError):
+        return Response({"error": "Session not found"}, status=status.HTTP_404_NOT_FOUND)
+    resume_stalled_ingestion(session)
+    return _not_ready_response(session)
+
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def ask_question(request, session_id):
     """
-    Takes a question, ensures PDFs are processed, gets the RAG answer.
+    Takes a question and gets the RAG answer once the session's PDFs are
+    ingested. While ingestion is pending or running it answers 202 with the
+    ingestion state; if ingestion failed it answers 409.
     """
     question = request.data.get("question")
     if not question:
         return Response({"error": "Question not provided"}, status=status.HTTP_400_BAD_REQUEST)
-    
+    not_ready = _check_session_ready(session_id)
+    if not_ready is not None:
+        return not_ready
+
     try:
-        # Step 1: Ensure documents are processed. This is idempotent.
-        process_pdfs_for_session(session_id)
-        
-        # Step 2: Get the answer using the robust RAG function.
-        answer = get_answer_from_rag(session_id, question)
-        
-        return Response({"answer": answer})
+        # Get the answer using the robust RAG function (or the session's answer cache).
+        result = answer_question(session_id, question)
+
+        return Response({"answer": result["answer"], "cached": result["cached"]})
 
     except Exception as e:
         error_message = f"An error occurred: {e}"
@@ -720,21 +902,99 @@ def ask_question(request, session_id):
         return Response({"error": error_message}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class EventStreamRenderer(BaseRenderer):
+    """
+    Lets clients send `Accept: text/event-stream`. Streams bypass renderers;
+    this only renders the JSON error/status responses sent before a stream.
+    """
+
+    media_type = "text/event-stream"
+    format = "event-stream"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, cls=encoders.JSONEncoder).encode()
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+@renderer_classes([JSONRenderer, EventStreamRenderer])
+def ask_question_stream(request, session_id):
+    """
+    Streaming variant of `ask_question`, as server-sent events: a `sources`
+    event with the retrieved chunks first, then one `token` event per piece
+    of the answer, then `done` with the `cached` flag (or `error`). The same
+    400/404/202/409 responses as `ask_question` are returned before
+    streaming starts.
+    """
+    question = request.data.get("question")
+    if not question:
+        return Response({"error": "Question not provided"}, status=status.HTTP_400_BAD_REQUEST)
+    not_ready = _check_session_ready(session_id)
+    if not_ready is not None:
+        return not_ready
+
+    def events():
+        try:
+            for kind, payload in stream_answer_from_rag(session_id, question):
+                yield _sse(kind, payload)
+        except Exception as e:
+            print(f"Error in ask_question_stream view for session {session_id}: {e}")
+            yield _sse("error", {"error": f"An error occurred: {e}"})
+
+    response = StreamingHttpResponse(events(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # Don't let nginx buffer the stream
+    return response
+
+
 
 # Add this new view function anywhere in the file
-@api_view(['GET'])
+@api_view(['GET', 'POST'])
 @permission_classes([permissions.IsAuthenticated])
 def get_session_pdfs(request, session_id):
     """
-    Retrieves the list of PDF files for a given chat session.
+    GET lists the PDF files of a chat session. POST adds more files to it;
+    only the new files are ingested, in the background as on upload.
     """
     try:
         session = ChatSession.objects.get(id=session_id)
+    except (ChatSession.DoesNotExist, ValidationError):
+        return Response({"error": "Session not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    if request.method == 'POST':
+        files = request.FILES.getlist('files')
+        if not files:
+            return Response({"error": "No files provided"}, status=status.HTTP_400_BAD_REQUEST)
+        for f in files:
+            UploadedPDF.objects.create(session=session, file=f, sha256=file_sha256(f))
+        schedule_ingestion(session)
+        session.refresh_from_db()
+        return Response(_ingestion_state(session), status=status.HTTP_202_ACCEPTED)
+
+    try:
         pdfs = session.pdfs.all()
         # Pass the request context to the serializer to build full URLs
         serializer = PDFSerializer(pdfs, many=True, context={'request': request})
         return Response(serializer.data)
-    except ChatSession.DoesNotExist:
-        return Response({"error": "Session not found"}, status=status.HTTP_404_NOT_FOUND)
     except Exception as e:
-        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['DELETE'])
+@permission_classes([permissions.IsAuthenticated])
+def delete_session_pdf(request, session_id, pdf_id):
+    """Removes one PDF from a chat session, along with its vectors."""
+    try:
+        pdf = UploadedPDF.objects.select_related("session").get(id=pdf_id, session_id=session_id)
+    except (UploadedPDF.DoesNotExist, ValidationError):
+        return Response({"error": "File not found"}, status=status.HTTP_404_NOT_FOUND)
+    session = pdf.session
+    pdf.delete()  # Its vectors go with it, see signals.remove_vectors_on_pdf_delete
+    # Sessions ingested before per-file manifests (or whose last upload
+    # failed) are indexed again from their remaining files.
+    schedule_ingestion(session)
+    return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,40 @@
+# api/warmup.py
+
+import time
+from importlib import import_module
+
+
+def warmup(include_rag=True):
+    """
+    Loads the heavy resources that are otherwise created on first use.
+
+    Returns a list of (step, seconds) pairs so callers can report cold-start
+    cost. Safe to call more than once: already loaded resources are reused.
+    """
+    timings = []
+
+    def timed(step, func):
+        start = time.perf_counter()
+        func()
+        timings.append((step, time.perf_counter() - start))
+
+    # Importing the URLconf imports every view module, which is what a worker
+    # pays at boot; it should be cheap now that nothing heavy loads at import.
+    timed("import api.urls", lambda: import_module("api.urls"))
+
+    from .embeddings import get_embedding_model
+
+    # Embedding a string also initializes the tokenizer and model weights.
+    timed("embedding model", lambda: get_embedding_model().model.embed_query("warmup"))
+
+    if include_rag:
+        from django.conf import settings
+
+        from .rag_pipeline import get_llm, get_pinecone, get_vector_backend
+
+        if getattr(settings, "RAG_VECTOR_STORE", "pinecone") == "pinecone":
+            timed("pinecone client", get_pinecone)
+        timed("vector store", get_vector_backend)
+        timed("gemini client", get_llm)
+
+    return timings
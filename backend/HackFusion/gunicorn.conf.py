@@ -0,0 +1,16 @@
+# gunicorn.conf.py
+#
+# Picked up automatically by `gunicorn HackFusion.wsgi` when started from this
+# directory. Set WARMUP_ON_BOOT=1 to load the embedding model and RAG clients
+# in each worker before it accepts requests, instead of on the first request.
+
+import os
+
+
+def post_worker_init(worker):
+    if os.environ.get("WARMUP_ON_BOOT") != "1":
+        return
+    from api.warmup import warmup
+
+    for step, seconds in warmup():
+        worker.log.info("warmup: %s took %.1f ms", step, seconds * 1000)
@@ -21,6 +21,35 @@ const PDFChat = () => {
   const [isSidebarOpen, setIsSidebarOpen] = useState(true);
   const toggleSidebar = () => setIsSidebarOpen(!isSidebarOpen);
 
+  // PDFs are indexed in the background after upload; questions wait for READY
+  const [ingestion, setIngestion] = useState({ status: "PENDING", progress: 0 });
+  const isIndexing = ingestion.status !== "READY";
+
+  useEffect(() => {
+    let timer;
+    let cancelled = false;
+    const pollStatus = async () => {
+      try {
+        const token = localStorage.getItem("access");
+        const response = await axios.get(`/api/pdf-chat/${sessionId}/status/`, {
+          headers: { Authorization: `Bearer ${token}` },
+        });
+        if (cancelled) return;
+        setIngestion(response.data);
+        if (response.data.status === "READY" || response.data.status === "FAILED") return;
+      } catch (error) {
+        console.error("Failed to fetch ingestion status:", error);
+      }
+      if (!cancelled) timer = setTimeout(pollStatus, 1500);
+    };
+
+    pollStatus();
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [sessionId]);
+
   // Fetch the list of PDFs for this session
   useEffect(() => {
     const fetchPdfs = async () => {
@@ -57,7 +86,7 @@ const PDFChat = () => {
 
   const handleSendMessage = async (e) => {
     e.preventDefault();
-    if (!input.trim() || isLoading) return;
+    if (!input.trim() || isLoading || isIndexing) return;
 
     const userMessage = { sender: "user", text: input };
     setMessages((prev) => [...prev, userMessage]);
@@ -66,17 +95,51 @@ const PDFChat = () => {
 
     try {
       const token = localStorage.getItem("access");
-      const response = await axios.post(
-        `/api/pdf-chat/${sessionId}/ask/`,
-        {
-          question: input,
+      const response = await fetch(`/api/pdf-chat/${sessionId}/ask/stream/`, {
+        method: "POST",
+        headers: {
+          "Content-Type": "application/json",
+          Accept: "text/event-stream",
+          Authorization: `Bearer ${token}`,
         },
-        {
-          headers: { Authorization: `Bearer ${token}` },
+        body: JSON.stringify({ question: input }),
+      });
+      // 202: the documents are still being indexed
+      if (response.status === 202) {
+        setMessages((prev) => [
+          ...prev,
+          { sender: "ai", text: "Your documents are still being processed. Please try again in a moment." },
+        ]);
+        return;
+      }
+      if (!response.ok) throw new Error(`Request failed with status ${response.status}`);
+
+      // Server-sent events: the sources first, then the answer token by token
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      let answer = null;
+      for (;;) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split("\n\n");
+        buffer = events.pop();
+        for (const rawEvent of events) {
+          const event = rawEvent.match(/^event: (.*)$/m)?.[1];
+          const data = JSON.parse(rawEvent.match(/^data: (.*)$/m)?.[1] ?? "null");
+          if (event === "error") throw new Error(data.error);
+          if (event !== "token") continue;
+          if (answer === null) {
+            answer = data;
+            setMessages((prev) => [...prev, { sender: "ai", text: answer }]);
+          } else {
+            answer += data;
+            const text = answer;
+            setMessages((prev) => [...prev.slice(0, -1), { sender: "ai", text }]);
+          }
         }
-      );
-      const aiMessage = { sender: "ai", text: response.data.answer };
-      setMessages((prev) => [...prev, aiMessage]);
+      }
     } catch (error) {
       console.error("Error asking question:", error);
       const errorMessage = {
@@ -119,6 +182,17 @@ const PDFChat = () => {
           <div className="flex flex-col flex-1 bg-[#0a0a0a]">
             <header className="bg-[#141414]/80 backdrop-blur-sm border-b border-gray-700 p-4 text-center sticky top-0 z-10">
               <h1 className="text-xl font-bold text-white">Document Chat</h1>
+              {ingestion.status === "FAILED" ? (
+                <p className="text-sm text-red-400 mt-1">
+                  Processing your documents failed: {ingestion.error}
+                </p>
+              ) : (
+                isIndexing && (
+                  <p className="text-sm text-gray-400 mt-1 flex items-center justify-center gap-2">
+                    <Loader2 size={14} className="animate-spin" /> Processing documents... {ingestion.progress}%
+                  </p>
+                )
+              )}
             </header>
 
             <main className="flex-1 overflow-y-auto p-4 md:p-6">
@@ -153,7 +227,7 @@ const PDFChat = () => {
                     )}
                   </div>
                 ))}
-                {isLoading && <TypingIndicator />}
+                {isLoading && messages[messages.length - 1]?.sender === "user" && <TypingIndicator />}
                 <div ref={messagesEndRef} />
               </div>
             </main>
@@ -165,13 +239,17 @@ const PDFChat = () => {
                     type="text"
                     value={input}
                     onChange={(e) => setInput(e.target.value)}
-                    placeholder="Ask a question about your documents..."
-                    disabled={isLoading}
+                    placeholder={
+                      isIndexing
+                        ? "Waiting for your documents to be processed..."
+                        : "Ask a question about your documents..."
+                    }
+                    disabled={isLoading || isIndexing}
                     className="w-full bg-[#0a0a0a] border border-gray-600 rounded-lg py-3 pl-4 pr-14 text-white focus:outline-none focus:ring-2 focus:ring-purple-500 transition-all"
                   />
                   <button
                     type="submit"
-                    disabled={isLoading || !input.trim()}
+                    disabled={isLoading || isIndexing || !input.trim()}
                     className="absolute right-2.5 top-1/2 -translate-y-1/2 p-2 rounded-md bg-indigo-600 hover:bg-indigo-700 disabled:bg-gray-600 disabled:cursor-not-allowed transition-colors"
                   >
                     <SendHorizonal size={20} className="text-white" />
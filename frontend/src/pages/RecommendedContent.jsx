@@ -8,6 +8,7 @@ const RecommendedContent = () => {
   const [selectedOption, setSelectedOption] = useState("teams"); // Default to "teams"
   const [recommendedTeams, setRecommendedTeams] = useState([]);
   const [recommendedUsers, setRecommendedUsers] = useState([]);
+  const [recommendedUsersByTeam, setRecommendedUsersByTeam] = useState(null); // { teamId: [users] } from one batch call
   const [userTeams, setUserTeams] = useState([]); // Teams the user is part of
   const [selectedTeam, setSelectedTeam] = useState(""); // Currently selected team for recommendations
   const [loading, setLoading] = useState(false);
@@ -97,18 +98,29 @@ const RecommendedContent = () => {
     setRecommendedUsers([]);
     if (!teamId) return;
 
+    // Recommendations for all of the user's teams are fetched once and reused
+    if (recommendedUsersByTeam) {
+      setRecommendedUsers(recommendedUsersByTeam[teamId] || []);
+      return;
+    }
+
     setLoading(true);
     setError(null);
     const token = localStorage.getItem("access");
 
     try {
-      const response = await axios.get(`/api/recommend-users/${teamId}/`, {
+      const teamIds = userTeams.map((team) => team.id);
+      if (!teamIds.includes(Number(teamId))) teamIds.push(teamId);
+      const response = await axios.get("/api/recommend-users/batch/", {
+        params: { team_ids: teamIds.join(",") },
         headers: {
           Authorization: `Bearer ${token}`,
           "Content-Type": "application/json",
         },
       });
-      setRecommendedUsers(response.data.recommended_users || []);
+      const usersByTeam = response.data.recommended_users || {};
+      setRecommendedUsersByTeam(usersByTeam);
+      setRecommendedUsers(usersByTeam[teamId] || []);
     } catch (err) {
       console.error("Failed to fetch recommended users:", err);
       setError("Failed to load user recommendations.");